@@ -8,6 +8,19 @@ import numpy as np
 import random as rnd
 import matplotlib as mpl
 
+#==============================================================================
+# Parameters of the initial risk perception distribution
+#==============================================================================
+
+# covariance matrix of risk, benefit, fear
+rbtf_cov_mat = [[0.6933637,-0.3912554,0.3871803],
+                [-0.3912554,0.6219291,-0.2147406],
+                [0.3871803,-0.2147406,0.7555526]]
+
+rbtf_means = [3.143534,         # mean risk score, rescaled
+              2.465156,         # mean benefit scores, rescaled
+              3.025205]         # mean techn. fear, rescaled
+
 #==============================================================================
 # Classes
 #==============================================================================
@@ -27,19 +40,9 @@ class Agent:
         # randomly determined rate of media consumption
         self.media_consumption = rnd.random()
                 
-        # covariance matrix of risk, benefit, fear
-        cov_mat = np.mat([[0.6933637,-0.3912554,0.3871803],
-                   [-0.3912554,0.6219291,-0.2147406],
-                   [0.3871803,-0.2147406,0.7555526]])
-
-        risk_mean = 3.143534            # mean risk score, rescaled
-        benefit_mean = 2.465156         # mean benefit scores, rescaled
-        techn_fear_mean = 3.025205      # mean techn. fear, rescaled
-        
         # drawing from multivar. joint normal prob. distribution
-        rbtf = np.random.multivariate_normal([risk_mean, benefit_mean,
-                                           techn_fear_mean],
-                                           cov_mat)
+        rbtf = np.random.multivariate_normal(rbtf_means, 
+                                             np.mat(rbtf_cov_mat))
         
         risk = rbtf[0]
         benefit = rbtf[1]
@@ -108,9 +111,11 @@ class Agent:
     def init_neighbors(self, social_network):
         """
         Initializes and stores the neighbours of the agent in the 
-        social network
+        social network, ordered by name so that the neighbours sampled
+        with a given seed do not depend on memory addresses
         """
-        self.neighbors = social_network.neighbors(self)
+        self.neighbors = sorted(social_network.neighbors(self),
+                                key = lambda neighbor: neighbor.get_name())
             
     def get_name(self):
         return self.name
@@ -146,7 +151,8 @@ class Agent:
     def get_rs_end_state(self):
         return (self.rs_sent_overall, self.rs_received)        
     
-    def tick_behaviour(self, The_Media, The_Government, The_Hazard):
+    def tick_behaviour(self, The_Media, The_Government, The_Hazard,
+                       streams = None):
         """
         Overview
         ---------------
@@ -157,6 +163,8 @@ class Agent:
         The_Media: an instance of object type Media
         The_Government: an instance of object type Government
         The_Hazard: an instance of object type Hazard
+        streams: optional RandomStreams instance whose media and neighbour
+                 streams are used instead of the random module
         
         Output
         ---------------
@@ -169,8 +177,14 @@ class Agent:
         rs: risk signal(s)
         rp: risk perception
         """
-        if rnd.random() < self.media_consumption:
-            if rnd.random() < The_Media.get_intensity():
+        if streams is None:
+            media_random = neighbour_random = rnd
+        else:
+            media_random = streams.media
+            neighbour_random = streams.neighbour
+            
+        if media_random.random() < self.media_consumption:
+            if media_random.random() < The_Media.get_intensity():
                 if The_Media.reports:
                     rs_to_pass_on = The_Media.get_rp_multiplier() * \
                                     The_Hazard.get_rp_multiplier()
@@ -211,7 +225,8 @@ class Agent:
             # the higher the agent's own risk perception, the higher
             # the chance that it will share its risk perceptions
             # with a random subset of its network neighbours
-            if self.rescale(rnd.random(), 0, 1, 5, 1) <= self.risk_perception:
+            if self.rescale(neighbour_random.random(), 0, 1, 5, 1) <= \
+               self.risk_perception:
                 rp_to_pass_on = self.rescale(self.get_risk_perception(), 
                                              1, 5, 2, 0.1) * \
                                              The_Hazard.get_rp_multiplier()
@@ -222,9 +237,9 @@ class Agent:
                     rp_to_pass_on = .1
                 try:
                     # sending new risk signals to neighbours
-                    send_signal_to = rnd.sample(self.neighbors, 
-                                                rnd.randint(1, \
-                                                len(self.neighbors)/2))
+                    send_signal_to = neighbour_random.sample(self.neighbors, 
+                                        neighbour_random.randint(1, \
+                                        len(self.neighbors)/2))
                     for neighbor in send_signal_to:
                         neighbor.add_risk_signal(RiskSignal("neighbour", 
                                                             rp_to_pass_on))
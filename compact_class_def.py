@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import numpy as np
+from agent_class_def import *
+
+#==============================================================================
+# Classes
+#==============================================================================
+
+class CompactNetwork:
+    """
+    Overview
+    ---------------
+    Undirected network stored as adjacency arrays in compressed sparse row
+    form instead of a networkx graph of Agent objects: node i is
+    represented by index i, its neighbours are
+    indices[indptr[i]:indptr[i + 1]]
+    """
+    def __init__(self, indptr, indices, node_ids = None):
+        """
+        indptr: array of length num_nodes + 1 with offsets into indices
+        indices: array with the neighbours of all nodes, each undirected
+                 edge appears twice
+        node_ids: original ids of the nodes, e.g. from an edge list file
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.node_ids = node_ids
+
+    @classmethod
+    def from_edges(cls, sources, targets, num_nodes, node_ids = None):
+        """
+        Overview
+        ---------------
+        Creates the adjacency arrays from two arrays of node indices
+        between 0 and num_nodes - 1; edges are symmetrized, duplicate
+        edges and self loops are removed
+
+        Input
+        ---------------
+        sources: array of node indices, one per edge
+        targets: array of node indices, one per edge
+        num_nodes: number of nodes, also counting nodes without edges
+        node_ids: see __init__()
+        """
+        return cls.from_edge_keys(edge_keys(sources, targets, num_nodes),
+                                  num_nodes, node_ids)
+
+    @classmethod
+    def from_edge_keys(cls, keys, num_nodes, node_ids = None):
+        """
+        Creates the adjacency arrays from a sorted array of unique edge
+        keys as returned by edge_keys()
+        """
+        index_dtype = np.int32 if num_nodes < 2**31 else np.int64
+
+        # both directions of every edge as keys source * num_nodes + target;
+        # sorting them in place orders the neighbours of each node
+        directed = np.concatenate([keys, (keys % num_nodes) * num_nodes +
+                                         keys // num_nodes])
+        directed.sort()
+        indptr = np.searchsorted(directed, np.arange(num_nodes + 1,
+                                 dtype = np.int64) * num_nodes)
+        indices = (directed % num_nodes).astype(index_dtype)
+        return cls(indptr, indices, node_ids)
+
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    def num_edges(self):
+        """
+        Returns the number of undirected edges
+        """
+        return len(self.indices) // 2
+
+    def degree(self):
+        """
+        Returns array with the degree of every node
+        """
+        return np.diff(self.indptr)
+
+    def nbytes(self):
+        """
+        Returns the number of bytes used by the adjacency arrays
+        """
+        return self.indptr.nbytes + self.indices.nbytes
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def edges(self):
+        """
+        Returns arrays (sources, targets) with every undirected edge once,
+        sources < targets
+        """
+        sources = np.repeat(np.arange(self.num_nodes(),
+                                      dtype = self.indices.dtype),
+                            self.degree())
+        once = sources < self.indices
+        return sources[once], self.indices[once]
+
+    def random_neighbour_subsets(self, nodes, random_state = np.random):
+        """
+        Overview
+        ---------------
+        Draws for every node a random subset of between 1 and degree / 2
+        of its neighbours, like rnd.sample(neighbors, rnd.randint(1,
+        len(neighbors) / 2)) in Agent.tick_behaviour(), for all nodes at
+        once: every edge slot of the nodes gets a random key, the slots
+        are sorted by node and key in one argsort and the first slots of every node are
+        kept. Nodes with fewer than two neighbours get an empty subset
+        (Agent.tick_behaviour() swallows the ValueError of rnd.randint)
+
+        Input
+        ---------------
+        nodes: array of node indices without duplicates
+        random_state: numpy RandomState the subsets are drawn from
+
+        Output
+        ---------------
+        Tuple (sizes, targets): the size of the subset of every node and
+        the concatenated subsets in the order of the nodes
+        """
+        nodes = np.asarray(nodes, dtype = np.int64)
+        starts = self.indptr[nodes]
+        degree = self.indptr[nodes + 1] - starts
+        half = degree // 2
+        sizes = np.zeros(len(nodes), dtype = np.int64)
+        sampled = half >= 1
+        sizes[sampled] = 1 + (random_state.random_sample(
+            np.count_nonzero(sampled)) * half[sampled]).astype(np.int64)
+        degree = degree[sampled]
+        if len(degree) == 0:
+            return sizes, self.indices[:0]
+
+        # position of every edge slot of the sampled nodes in indices and
+        # its rank within the slots of its node
+        segment = np.repeat(np.arange(len(degree)), degree)
+        offsets = np.cumsum(degree) - degree
+        rank = np.arange(len(segment)) - offsets[segment]
+        slots = starts[sampled][segment] + rank
+
+        # sorting keys with the node in the upper and a random number in
+        # the lower 32 bits shuffles the slots of every node in place
+        keys = segment.astype(np.int64) << 32
+        keys |= random_state.randint(0, 2**31, len(segment))
+        order = np.argsort(keys)
+        chosen = order[rank < sizes[sampled][segment]]
+        return sizes, self.indices[slots[chosen]]
+
+
+class AgentPopulation:
+    """
+    Overview
+    ---------------
+    The state of all agents of a network stored as arrays, indexed like
+    the nodes of a CompactNetwork; initialised in one batch with the same
+    distributions as Agent objects
+    """
+    # types of the state arrays, see SinglePrecisionPopulation
+    float_dtype = np.float64
+    count_dtype = np.int64
+    compact_counters = False
+
+    def __init__(self, num_agents, seed = None):
+        """
+        num_agents: number of agents
+        seed: seed of the random numbers used for the initialisation
+        """
+        random_state = np.random.RandomState(seed)
+        self.num_agents = num_agents
+
+        # counters of risk signals per tick (sent, received from
+        # neighbours), from the government, grid and media, and over the
+        # whole run; narrowed by fit_counters()
+        self.tick_count_dtype = self.count_dtype
+        self.other_count_dtype = self.count_dtype
+        self.total_count_dtype = self.count_dtype
+
+        # randomly determined rate of media consumption
+        self.media_consumption = np.asarray(
+            random_state.random_sample(num_agents), dtype = self.float_dtype)
+
+        # drawing from multivar. joint normal prob. distribution; risk,
+        # benefit and techn. fear are bounded 1.0 <= rbtf <= 5.0
+        rbtf = random_state.multivariate_normal(rbtf_means, rbtf_cov_mat,
+                                                num_agents)
+        np.clip(rbtf, 1, 5, out = rbtf)
+
+        self.original_rp = rbtf[:, 0].astype(self.float_dtype)
+        # multipliers are bounded 0.1 <= mult <= 2.0
+        self.benefit_multiplier = np.asarray(
+            self.rescale(rbtf[:, 1], 1., 5., 1., .1), dtype = self.float_dtype)
+        self.techn_fear_multiplier = np.asarray(
+            self.rescale(rbtf[:, 2], 1., 5., 2., 1.), dtype = self.float_dtype)
+        del rbtf
+
+        self.re_initialise()
+
+    def re_initialise(self):
+        """
+        Resets all agents into their original, pre-simulation state, see
+        Agent.re_initialise()
+        """
+        self.risk_perception = self.original_rp.copy()
+        self.rs_sent = np.zeros(self.num_agents,
+                                dtype = self.tick_count_dtype)
+        self.rs_sent_overall = np.zeros(self.num_agents,
+                                        dtype = self.total_count_dtype)
+        self.rs_received = np.zeros(self.num_agents,
+                                    dtype = self.total_count_dtype)
+
+        # risk signals received but not yet processed: sum and number of
+        # magnitudes from the government, grid and media, and from
+        # neighbours, whose magnitudes are averaged before being used
+        self.other_rs_sum = np.zeros(self.num_agents,
+                                     dtype = self.float_dtype)
+        self.other_rs_count = np.zeros(self.num_agents,
+                                       dtype = self.other_count_dtype)
+        self.neighbour_rs_sum = np.zeros(self.num_agents,
+                                         dtype = self.float_dtype)
+        self.neighbour_rs_count = np.zeros(self.num_agents,
+                                           dtype = self.tick_count_dtype)
+
+    def fit_counters(self, max_degree, num_ticks):
+        """
+        Overview
+        ---------------
+        Narrows the counters to the smallest unsigned integer types that
+        cannot overflow in a run of num_ticks ticks if compact_counters is
+        set: per tick an agent sends at most max_degree / 2 and receives
+        at most max_degree risk signals from neighbours and at most 3 from
+        the government, grid and media
+
+        Input
+        ---------------
+        max_degree: largest degree in the network
+        num_ticks: number of ticks of the run
+        """
+        if not self.compact_counters:
+            return
+        self.tick_count_dtype = smallest_uint(max_degree)
+        self.other_count_dtype = smallest_uint(3)
+        self.total_count_dtype = smallest_uint(max_degree * (num_ticks + 1))
+        for name in ["rs_sent", "neighbour_rs_count"]:
+            setattr(self, name, getattr(self, name).astype(
+                                    self.tick_count_dtype))
+        self.other_rs_count = self.other_rs_count.astype(
+                                  self.other_count_dtype)
+        for name in ["rs_sent_overall", "rs_received"]:
+            setattr(self, name, getattr(self, name).astype(
+                                    self.total_count_dtype))
+
+    def bytes_per_agent(self):
+        """
+        Returns the number of bytes per agent actually used by the state
+        arrays
+        """
+        return sum(value.nbytes for value in self.__dict__.values()
+                   if isinstance(value, np.ndarray)) / float(self.num_agents)
+
+    def estimate_bytes_per_agent(self):
+        """
+        Returns the number of bytes per agent expected from the types of
+        the state arrays: seven floats (media consumption, original and
+        current risk perception, two multipliers, two sums of magnitudes)
+        and five counters
+        """
+        return 7 * np.dtype(self.float_dtype).itemsize + \
+               2 * np.dtype(self.tick_count_dtype).itemsize + \
+               np.dtype(self.other_count_dtype).itemsize + \
+               2 * np.dtype(self.total_count_dtype).itemsize
+
+    def rescale(self, oldvalue, oldmin, oldmax, newmax, newmin):
+        """
+        Function to rescale values
+        """
+        return (oldvalue - oldmin) / (oldmax - oldmin) * \
+               (newmax - newmin) + newmin
+
+    def color_codes(self):
+        """
+        Returns array of color categories of all agents: 0 green, 1 yellow,
+        2 orange, 3 red, see Agent.update_color()
+        """
+        return np.searchsorted([2., 3., 4.], self.risk_perception,
+                               side = "right")
+
+
+class SinglePrecisionPopulation(AgentPopulation):
+    """
+    Overview
+    ---------------
+    AgentPopulation that needs less memory, for very large populations:
+    risk perceptions, multipliers, media consumption and the sums of
+    received magnitudes are stored as float32, counters as uint32 until
+    ArraySimulation narrows them with fit_counters(). Initialised from
+    the same random numbers as AgentPopulation with the same seed
+    """
+    float_dtype = np.float32
+    count_dtype = np.uint32
+    compact_counters = True
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def smallest_uint(max_value):
+    """
+    Returns the smallest unsigned integer type that holds max_value
+    """
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+def edge_keys(sources, targets, num_nodes):
+    """
+    Overview
+    ---------------
+    Encodes undirected edges as sorted, unique int64 keys
+    lower * num_nodes + upper with lower < upper; self loops are removed
+
+    Input
+    ---------------
+    sources: array of node indices, one per edge
+    targets: array of node indices, one per edge
+    num_nodes: number of nodes
+    """
+    sources = np.asarray(sources, dtype = np.int64)
+    targets = np.asarray(targets, dtype = np.int64)
+    lower = np.minimum(sources, targets)
+    upper = np.maximum(sources, targets)
+    keep = lower != upper
+    return np.unique(lower[keep] * num_nodes + upper[keep])
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import math
+import time
+import numpy as np
+from replicate_runner import *
+
+#==============================================================================
+# Two-sample tests
+#==============================================================================
+
+def kolmogorov_pvalue(d, n, m):
+    """
+    Returns the asymptotic p-value of the two-sample Kolmogorov-Smirnov
+    statistic d for samples of sizes n and m (Stephens 1970 correction,
+    as in Press et al., Numerical Recipes)
+    """
+    en = np.sqrt(n * m / float(n + m))
+    lam = (en + .12 + .11 / en) * d
+    if lam < .2:
+        # the series does not converge, the p-value is 1 to many digits
+        return 1.
+    j = np.arange(1, 101)
+    p = 2 * np.sum((-1.) ** (j - 1) * np.exp(-2 * j ** 2 * lam ** 2))
+    return float(min(max(p, 0.), 1.))
+
+def ks_2samp(x, y):
+    """
+    Overview
+    ---------------
+    Two-sample Kolmogorov-Smirnov test of whether x and y are drawn from
+    the same distribution
+
+    Output
+    ---------------
+    Tuple (statistic, p-value): the largest difference between the two
+    empirical distribution functions and its asymptotic p-value
+    """
+    x = np.sort(np.asarray(x, dtype = float))
+    y = np.sort(np.asarray(y, dtype = float))
+    values = np.concatenate([x, y])
+    cdf_x = np.searchsorted(x, values, side = "right") / float(len(x))
+    cdf_y = np.searchsorted(y, values, side = "right") / float(len(y))
+    d = np.max(np.abs(cdf_x - cdf_y))
+    return d, kolmogorov_pvalue(d, len(x), len(y))
+
+def normal_quantile(p):
+    """
+    Returns the p-quantile of the standard normal distribution, by
+    bisection of its distribution function
+    """
+    low, high = -40., 40.
+    for i in range(100):
+        middle = (low + high) / 2.
+        if .5 * (1 + math.erf(middle / math.sqrt(2))) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.
+
+#==============================================================================
+# Comparing engines
+#==============================================================================
+
+# alternative engines compared with the object-based Simulation by
+# default, as scenario parameters that select them in run_replicate()
+default_engines = {"array": {"engine": "array"},
+                   "array_single": {"engine": "array",
+                                    "precision": "single"},
+                   "sequential": {"engine": "sequential"}}
+
+# variables compared by default
+compared_variables = ["avg_rp", "green", "yellow", "orange", "red", 
+                      "gov_rs", "media_rs", "grid_rs", "neighbour_rs"]
+
+def default_engine_tolerances(reference_runs, margin = .5):
+    """
+    Overview
+    ---------------
+    Default tolerance bands for the per-tick means of an alternative
+    engine: margin times the largest standard deviation over the ticks of
+    the replicates of the reference. Replicates of the reference itself 
+    differ by about one standard deviation (e.g. around .5 for avg_rp in 
+    the default scenario), so a difference of the means below half of it,
+    a medium effect in the sense of Cohen (1988), does not change the 
+    conclusions drawn from a run. Absolute bands such as .05 for avg_rp 
+    would need thousands of runs per engine, whereas these can be shown
+    with equivalence_runs() runs. Variables that do not vary between the
+    replicates of the reference, such as gov_rs and grid_rs, get a 
+    tolerance of 0: their means have to agree exactly
+    
+    Input
+    ---------------
+    reference_runs: list of dictionaries as returned by run_replicates()
+    margin: tolerance in standard deviations of the reference
+    
+    Output
+    ---------------
+    Dictionary with the tolerance of every variable in compared_variables
+    """
+    tolerances = {}
+    for var in compared_variables:
+        reference = np.array([run[var] for run in reference_runs],
+                             dtype = float)
+        tolerances[var] = margin * np.sqrt(np.max(reference.var(axis = 0, 
+                                                                ddof = 1)))
+    return tolerances
+
+def equivalence_runs(num_ticks, margin = .5, alpha = .01, power = .8,
+                     num_variables = len(compared_variables)):
+    """
+    Returns the number of runs per engine with which the equivalence 
+    tests of compare_runs() pass for all num_variables variables with 
+    probability power if the engines agree and the tolerances are margin
+    standard deviations, see default_engine_tolerances(); num_ticks is
+    the number of recorded ticks including the initial state
+    """
+    z_alpha = normal_quantile(1 - alpha / num_ticks)
+    # Bonferroni bound over all ticks of all variables
+    z_power = normal_quantile(1 - (1 - power) / 
+                                  (2. * num_ticks * num_variables))
+    return int(math.ceil(2 * (z_alpha + z_power) ** 2 / margin ** 2))
+
+def compare_runs(reference_runs, runs, alpha = .01, tolerances = None,
+                 power = .8):
+    """
+    Overview
+    ---------------
+    Compares two sets of runs of the same scenario variable by variable:
+    the per-tick distributions over the replicates with the two-sample
+    Kolmogorov-Smirnov test and the per-tick means with an equivalence
+    test (two one-sided tests, TOST): a tick is equivalent if the
+    1 - 2 * alpha confidence interval of the difference of the means lies
+    within plus or minus the tolerance. Both tests are Bonferroni
+    corrected over the ticks, and the confidence intervals use the normal
+    approximation, so at least 20 runs per engine are advisable
+
+    Input
+    ---------------
+    reference_runs: list of dictionaries as returned by run_replicates()
+    runs: list of dictionaries of the engine compared to the reference
+    alpha: significance level of the tests of each variable
+    tolerances: dictionary with the largest allowed difference between
+                the per-tick means of each variable
+    power: probability with which the equivalence tests of all ticks
+           pass with runs_needed runs per engine if the engines agree
+
+    Output
+    ---------------
+    Dictionary with one dictionary per variable containing the largest
+    difference of the means, the largest bound of their confidence
+    intervals, the smallest p-value of the Kolmogorov-Smirnov tests, the
+    numbers of ticks in which that test rejects equality and in which
+    equivalence is not shown, the number of runs per engine needed to
+    show equivalence for the tolerance (None if the tolerance is 0 but 
+    the variable varies) and whether the variable passed
+    """
+    results = {}
+    for var in tolerances:
+        reference = np.array([run[var] for run in reference_runs],
+                             dtype = float)
+        data = np.array([run[var] for run in runs], dtype = float)
+        num_ticks = reference.shape[1]
+        p_values = np.array([ks_2samp(reference[:, tick], data[:, tick])[1]
+                             for tick in range(num_ticks)])
+        rejected = int(np.sum(p_values < alpha / num_ticks))
+
+        difference = np.abs(data.mean(axis = 0) - reference.mean(axis = 0))
+        variance = reference.var(axis = 0, ddof = 1) / len(reference) + \
+                   data.var(axis = 0, ddof = 1) / len(data)
+        z_alpha = normal_quantile(1 - alpha / num_ticks)
+        ci_bound = difference + z_alpha * np.sqrt(variance)
+        not_equivalent = int(np.sum(ci_bound > tolerances[var]))
+
+        # runs per engine for which the confidence intervals of all ticks
+        # are narrower than the tolerance with probability power if the
+        # means agree (Bonferroni bound over the ticks)
+        spread = reference.var(axis = 0, ddof = 1) + \
+                 data.var(axis = 0, ddof = 1)
+        z_power = normal_quantile(1 - (1 - power) / (2. * num_ticks))
+        if np.max(spread) == 0:
+            # deterministic in both engines, e.g. gov_rs
+            runs_needed = 2
+        elif tolerances[var] == 0:
+            # no number of runs shows equivalence
+            runs_needed = None
+        else:
+            runs_needed = max(int(np.ceil(np.max(spread) * 
+                                          (z_alpha + z_power) ** 2 / 
+                                          tolerances[var] ** 2)), 2)
+
+        results[var] = {"max_mean_difference": difference.max(),
+                        "tolerance": tolerances[var],
+                        "max_ci_bound": ci_bound.max(),
+                        "min_p_value": p_values.min(),
+                        "ticks_rejected": rejected,
+                        "ticks_not_equivalent": not_equivalent,
+                        "runs_needed": runs_needed,
+                        "passed": rejected == 0 and not_equivalent == 0}
+    return results
+
+def compare_engines(parameters, engines = None, num_runs = None, 
+                    alpha = .01, tolerances = None, margin = .5, 
+                    power = .8, processes = 1, seed = None,
+                    report_file = "engine_validation.csv",
+                    verbose = False):
+    """
+    Overview
+    ---------------
+    Validation harness for faster implementations of the simulation: runs
+    replicates of a scenario with the object-based Simulation (reference)
+    and with every alternative engine, compares them with compare_runs()
+    and reports the speedup of every engine. Exact agreement cannot be
+    expected, since every engine draws its random numbers differently
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    engines: dictionary mapping engine names to the parameters selecting
+             the engine in run_replicate(), defaults to default_engines
+    num_runs: number of replicates per engine, defaults to 
+              equivalence_runs(), e.g. 400 for 51 ticks; with fewer runs
+              equivalence may not be shown even if the engines agree,
+              see runs_needed in the results of compare_runs()
+    alpha: significance level of the tests of each variable
+    tolerances: see compare_runs(), defaults to
+                default_engine_tolerances() of the reference runs
+    margin: see default_engine_tolerances()
+    power: probability with which an engine that agrees with the 
+           reference passes the equivalence tests of all variables with 
+           the default num_runs and tolerances
+    processes: number of worker processes
+    seed: makes the seeds of the replicates reproducible
+    report_file: name of the report file, None if no report is written
+
+    Output
+    ---------------
+    Dictionary mapping engine names to dictionaries with the results of
+    compare_runs(), the speedup over the reference and whether all
+    variables passed
+    """
+    if engines is None:
+        engines = default_engines
+    if num_runs is None:
+        num_runs = equivalence_runs(parameters["num_ticks"] + 1, margin,
+                                    alpha, power, 
+                                    len(tolerances or compared_variables))
+    seeds = draw_seeds(num_runs, seed)
+
+    start = time.time()
+    reference_runs = run_replicates(dict(parameters, engine = "object"),
+                                    seeds, processes)
+    reference_time = time.time() - start
+    if tolerances is None:
+        tolerances = default_engine_tolerances(reference_runs, margin)
+
+    summary = {}
+    for name in sorted(engines):
+        start = time.time()
+        runs = run_replicates(dict(parameters, **engines[name]), seeds,
+                              processes)
+        engine_time = time.time() - start
+        variables_results = compare_runs(reference_runs, runs, alpha,
+                                         tolerances, 1 - (1 - power) /
+                                         float(len(tolerances)))
+        summary[name] = {"variables": variables_results,
+                         "speedup": reference_time / engine_time,
+                         "passed": all(result["passed"] for result
+                                       in variables_results.values())}
+        if verbose:
+            print "%s: speedup %.1f, %s" % (name, summary[name]["speedup"],
+                  "passed" if summary[name]["passed"] else "failed")
+            for var in sorted(variables_results):
+                if not variables_results[var]["passed"]:
+                    print "    %s: %s" % (var, variables_results[var])
+
+    if report_file is not None:
+        outfile = open(report_file, "w")
+        outfile.write("engine, speedup, engine_passed, variable, "
+                      "max_mean_difference, tolerance, max_ci_bound, "
+                      "min_p_value, ticks_rejected, ticks_not_equivalent, "
+                      "runs_needed, passed\n")
+        for name in sorted(summary):
+            for var in sorted(tolerances):
+                result = summary[name]["variables"][var]
+                outfile.write(', '.join([name] + [str(value) for value in
+                              [summary[name]["speedup"],
+                               summary[name]["passed"], var,
+                               result["max_mean_difference"],
+                               result["tolerance"], result["max_ci_bound"],
+                               result["min_p_value"],
+                               result["ticks_rejected"],
+                               result["ticks_not_equivalent"],
+                               result["runs_needed"],
+                               result["passed"]]]) + '\n')
+        outfile.close()
+
+    return summary
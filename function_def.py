@@ -5,15 +5,21 @@
 #==============================================================================
 
 import random as rnd
+import itertools
 import networkx as nx
+import numpy as np
+import os
 import matplotlib as mpl
+import matplotlib.image
 from agent_class_def import *
+from compact_class_def import *
 
 #==============================================================================
 # Functions - plotting
 #==============================================================================
 
-def network_plot(H, random = True, save = False, diff_color = True):                 
+def network_plot(H, random = True, save = False, diff_color = True,
+                 raster = False, layout_file = None):                 
     """
     Overview
     -----------------
@@ -30,7 +36,30 @@ def network_plot(H, random = True, save = False, diff_color = True):
     
     diff_color designates whether the plot should include different colors
     of agents or not
+    
+    raster designates whether to use the rendering mode for large graphs,
+    see raster_network_plot(); the plot is always saved and not shown, 
+    layout_file is where the layout is cached
     """    
+    if raster:
+        nodes = H.nodes()
+        index = dict((node, i) for i, node in enumerate(nodes))
+        edges = np.array([(index[u], index[v]) for u, v in H.edges()],
+                         dtype = np.int64).reshape(-1, 2)
+        network = CompactNetwork.from_edges(edges[:, 0], edges[:, 1],
+                                            len(nodes))
+        color_codes = np.array([["green", "yellow", "orange", 
+                                 "red"].index(node.get_color()) 
+                                for node in nodes])
+        if not diff_color:
+            color_codes[:] = 0
+        layout = network_layout(network, method = "random" if random else
+                                "spectral", layout_file = layout_file)
+        raster_network_plot(color_codes, layout, 
+                            "social_network_graph.png",
+                            edge_layer = raster_edges(network, layout))
+        return
+    
     color_array = []
     label_dict = {}
     
@@ -53,10 +82,155 @@ def network_plot(H, random = True, save = False, diff_color = True):
     mpl.pyplot.show()
 
 
-def plot_lines(green, yellow, orange, red, xlim, ylim, save = False):
+def network_layout(network, method = "spectral", iterations = 50, 
+                   seed = None, layout_file = None):
+    """
+    Overview
+    -----------------
+    Computes node positions for large networks with array operations only;
+    the layout is cached in layout_file (numpy .npy file) and loaded from
+    there if the file exists, so it is computed once per network
+    
+    Input
+    -----------------
+    network: CompactNetwork
+    method: "random" places nodes uniformly at random (as draw_random), 
+            "spectral" approximates the two leading non-trivial 
+            eigenvectors of the random walk matrix by power iteration,
+            which places connected nodes close to each other
+    iterations: number of power iterations, each costs O(edges)
+    seed: seed of the initial random positions
+    layout_file: file name of the cache, None for no cache
+    
+    Output
+    -----------------
+    Array of shape (num_nodes, 2) with positions in [0, 1]
+    """
+    if layout_file is not None and os.path.exists(layout_file):
+        return np.load(layout_file)
+    
+    rs = np.random.RandomState(seed)
+    n = network.num_nodes()
+    pos = rs.random_sample((n, 2))
+    if method == "spectral":
+        degree = np.maximum(network.degree(), 1).astype(float)
+        sources = np.repeat(np.arange(n), network.degree())
+        for iteration in range(iterations):
+            for dim in range(2):
+                neighbour_mean = np.bincount(sources, 
+                                     weights = pos[network.indices, dim],
+                                     minlength = n) / degree
+                pos[:, dim] = .5 * pos[:, dim] + .5 * neighbour_mean
+            # remove the trivial constant eigenvector, keep the second 
+            # coordinate orthogonal to the first and rescale
+            pos -= pos.mean(axis = 0)
+            pos[:, 1] -= np.dot(pos[:, 0], pos[:, 1]) / \
+                         max(np.dot(pos[:, 0], pos[:, 0]), 1e-300) * pos[:, 0]
+            pos /= np.maximum(pos.std(axis = 0), 1e-300)
+        # a few outlying nodes would otherwise squeeze all others into
+        # the centre of the image
+        low, high = np.percentile(pos, [1, 99], axis = 0)
+        pos = np.clip((pos - low) / np.maximum(high - low, 1e-300), 0, 1)
+    elif method != "random":
+        raise ValueError("unknown layout method: %s" % method)
+    
+    if layout_file is not None:
+        np.save(layout_file, pos)
+    return pos
+
+def _pixel_index(layout, resolution):
+    """
+    Returns the flat pixel index of every position in a square image with
+    resolution x resolution pixels; y grows upwards
+    """
+    pixel = (layout * resolution).astype(np.int64)
+    np.clip(pixel, 0, resolution - 1, out = pixel)
+    return (resolution - 1 - pixel[:, 1]) * resolution + pixel[:, 0]
+
+def raster_edges(network, layout, resolution = 1000, num_edges = 20000,
+                 points_per_edge = 50, seed = None):
+    """
+    Overview
+    -----------------
+    Rasterizes a random sample of num_edges edges into an image layer by
+    counting sampled points along each edge per pixel; the layer does not
+    change between ticks and can be computed once per layout
+    
+    Output
+    -----------------
+    Array of shape (resolution, resolution) with values in [0, 1]
+    """
+    rs = np.random.RandomState(seed)
+    sources, targets = network.edges()
+    if len(sources) > num_edges:
+        sample = rs.choice(len(sources), num_edges, replace = False)
+        sources = sources[sample]
+        targets = targets[sample]
+    share = np.linspace(0, 1, points_per_edge)[None, :, None]
+    points = layout[sources][:, None, :] * (1 - share) + \
+             layout[targets][:, None, :] * share
+    counts = np.bincount(_pixel_index(points.reshape(-1, 2), resolution),
+                         minlength = resolution**2).astype(float)
+    layer = np.log1p(counts) / max(np.log1p(counts.max()), 1e-300)
+    return layer.reshape(resolution, resolution)
+
+def raster_network_plot(color_codes, layout, filename, resolution = 1000,
+                        edge_layer = None):
+    """
+    Overview
+    -----------------
+    Renders a large network headlessly: nodes are binned into pixels with
+    a single bincount over (color category, pixel); every pixel shows the
+    dominant color category of its nodes, with more nodes giving stronger
+    colors, on top of an optional edge layer from raster_edges(). Writes a
+    PNG file without using pyplot, so it works in batch jobs
+    
+    Input
+    -----------------
+    color_codes: color category of every node (0 green, 1 yellow, 
+                 2 orange, 3 red), e.g. AgentPopulation.color_codes()
+    layout: node positions from network_layout()
+    filename: name of the PNG file
+    resolution: width and height of the image in pixels
+    edge_layer: array from raster_edges() with the same resolution
+    """
+    num_pixels = resolution**2
+    counts = np.bincount(np.asarray(color_codes, dtype = np.int64) * 
+                         num_pixels + _pixel_index(layout, resolution),
+                         minlength = 4 * num_pixels).reshape(4, num_pixels)
+    density = counts.sum(axis = 0)
+    dominant = counts.argmax(axis = 0)
+    
+    palette = np.array([mpl.colors.to_rgb(color) for color in 
+                        ["green", "yellow", "orange", "red"]])
+    image = np.ones((num_pixels, 3))
+    if edge_layer is not None:
+        image -= .5 * edge_layer.reshape(num_pixels, 1)
+    occupied = density > 0
+    strength = .35 + .65 * np.log1p(density[occupied]) / \
+               np.log1p(density.max())
+    image[occupied] = image[occupied] * (1 - strength[:, None]) + \
+                      palette[dominant[occupied]] * strength[:, None]
+    mpl.image.imsave(filename, image.reshape(resolution, resolution, 3))
+
+def _finish_plot(save, show, filename):
+    """
+    Saves the current figure if save is True and shows it if show is 
+    True; otherwise closes it, e.g. when plotting in batch jobs
+    """
+    if save:
+        mpl.pyplot.savefig(filename)
+    if show:
+        mpl.pyplot.show()
+    else:
+        mpl.pyplot.close()
+
+def plot_lines(green, yellow, orange, red, xlim, ylim, save = False,
+               show = True, filename = "lineplot.png"):
     """
     This plots the changes in numbers according to level
-    of risk perception over time
+    of risk perception over time; show = False closes the figure instead
+    of showing it
     """    
     x = [i for i in range(len(green))]
     
@@ -69,14 +243,16 @@ def plot_lines(green, yellow, orange, red, xlim, ylim, save = False):
     ax1.set_xlabel("time steps")
     ax1.set_ylabel("number of agents")
     ax1.set_title("risk perception over time")
-    mpl.pyplot.show()
+    _finish_plot(save, show, filename)
                     
-def plot_stack(green, yellow, orange, red, xlim, ylim, save = False):
+def plot_stack(green, yellow, orange, red, xlim, ylim, save = False,
+               show = True, filename = "stackplot.png"):
     """
     Does the same as plot_data() but produces stackplot instead
     """    
     x = [i for i in range(len(green))]
     
+    mpl.pyplot.figure()
     mpl.pyplot.xlim(0, xlim)
     mpl.pyplot.ylim(0, ylim)
     mpl.pyplot.stackplot(x, green, yellow, orange, red, colors = ["green",\
@@ -94,12 +270,11 @@ def plot_stack(green, yellow, orange, red, xlim, ylim, save = False):
     mpl.pyplot.xlabel("time steps")
     mpl.pyplot.ylabel("number of agents")
     mpl.pyplot.title("risk perception over time, stackplot")
-    if save:
-        mpl.pyplot.savefig("stackplot.png")
-    mpl.pyplot.show()
+    _finish_plot(save, show, filename)
     
 def plot_rs_sent(gov_rs, media_rs, neighbour_rs, grid_rs, 
-                 avg_rp, xlim, save = False):
+                 avg_rp, xlim, save = False, show = True,
+                 filename = "rs_sent.png"):
     """
     Plots the risk signals sent out by different sources
     together with the average risk perception
@@ -122,22 +297,20 @@ def plot_rs_sent(gov_rs, media_rs, neighbour_rs, grid_rs,
     ax2 = ax1.twinx()
     ax2.plot(x, avg_rp, "black")
     ax2.set_ylabel("risk perception")
-    if save:
-        mpl.pyplot.savefig("rs_sent.png")
-    mpl.pyplot.show()
+    _finish_plot(save, show, filename)
     
 #==============================================================================
 # Functions - graphs
 #==============================================================================
 
-def _random_subset(seq, m):
+def _random_subset(seq, m, random_state = rnd):
     """
     Returns random subset of seq of length m
     Based on function from networkx Python module
     """
     targets = set()
     while len(targets) < m:
-        x = rnd.choice(seq)
+        x = random_state.choice(seq)
         targets.add(x)
     return targets
     
@@ -149,13 +322,27 @@ def barabasi_albert(AgentClass, n, m, seed = None):
     
     AgentClass is assumed to be an object type (not instance) that 
     is supposed to make up the nodes in the network
+    
+    seed: seed or random.Random instance used to draw the edges, which
+    makes the network reproducible independently of the random numbers
+    drawn by AgentClass; the random module is used if None
+    
+    Targets are ordered by name, since the order of a set of agents 
+    depends on their memory addresses
     """
+    if seed is None:
+        random_state = rnd
+    elif isinstance(seed, rnd.Random):
+        random_state = seed
+    else:
+        random_state = rnd.Random(seed)
             
     social_network = nx.Graph()
     for i in range(m):
         social_network.add_node(AgentClass(i))
         
-    targets = social_network.nodes()
+    targets = sorted(social_network.nodes(), 
+                     key = lambda node: node.get_name())
     
     repeated_nodes = []
     
@@ -166,7 +353,472 @@ def barabasi_albert(AgentClass, n, m, seed = None):
         social_network.add_edges_from(zip([local_agent] * m, targets))
         repeated_nodes.extend(targets)
         repeated_nodes.extend([local_agent] * m)
-        targets = _random_subset(repeated_nodes, m)
+        targets = sorted(_random_subset(repeated_nodes, m, random_state),
+                         key = lambda node: node.get_name())
         source += 1
         
-    return social_network
\ No newline at end of file
+    return social_network
+
+def _population_seed(random_state):
+    """
+    Draws the seed of an agent population from the random state used to
+    create its network, so that both are reproducible from one seed
+    """
+    return random_state.randint(0, 2**31 - 1)
+
+def _population(AgentPopulationClass, n, random_state):
+    """
+    Returns the agent population of a generated network, or only its seed
+    if AgentPopulationClass is None
+    """
+    seed = _population_seed(random_state)
+    if AgentPopulationClass is None:
+        return seed
+    return AgentPopulationClass(n, seed)
+
+def barabasi_albert_arrays(AgentPopulationClass, n, m, seed = None):
+    """
+    Overview
+    ---------------
+    Array version of barabasi_albert(): node m links to the initial nodes
+    0 ... m - 1, every further node links to m nodes drawn with 
+    probability proportional to their degree. Instead of growing the
+    list of repeated nodes node by node, all draws are made at once as
+    positions in the final list of edge ends (Batagelj and Brandes 2005)
+    and resolved by pointer jumping; nodes that drew the same target 
+    twice redraw
+    
+    Input
+    ---------------
+    AgentPopulationClass: object type (not instance) holding the state of
+                          the agents, assumed to be AgentPopulation; None
+                          to create the population separately
+    n: number of nodes
+    m: number of edges of every new node
+    seed: seed for network and agent population
+    
+    Output
+    ---------------
+    Tuple (CompactNetwork, agent population); if AgentPopulationClass is
+    None the population's seed instead of the population, which is then
+    created by AgentPopulationClass(n, seed) with the same result
+    """
+    rs = np.random.RandomState(seed)
+    num_pairs = (n - m) * m
+    pair = np.arange(num_pairs, dtype = np.int64)
+    sources = m + pair // m
+    
+    # the edges of node m point to the initial nodes, every later edge to
+    # a random position among the edge ends of all earlier nodes; an end
+    # at even position 2j is the source of edge j, at odd position 2j + 1
+    # its target
+    first = sources == m
+    redraw = ~first
+    position = np.zeros(num_pairs, dtype = np.int64)
+    for attempt in range(100):
+        position[redraw] = (rs.random_sample(np.count_nonzero(redraw)) *
+                            2 * m * (sources[redraw] - m)).astype(np.int64)
+        targets = np.where(first, pair % m, -1)
+        pointer = position.copy()
+        while True:
+            unresolved = np.flatnonzero(targets < 0)
+            if len(unresolved) == 0:
+                break
+            p = pointer[unresolved]
+            even = p % 2 == 0
+            targets[unresolved[even]] = m + (p[even] // 2) // m
+            odd = unresolved[~even]
+            referenced = (pointer[odd] - 1) // 2
+            known = targets[referenced] >= 0
+            targets[odd[known]] = targets[referenced[known]]
+            pointer[odd[~known]] = pointer[referenced[~known]]
+        
+        # targets drawn twice by the same node are drawn again
+        keys = sources * n + targets
+        order = np.argsort(keys, kind = "mergesort")
+        duplicate = np.zeros(num_pairs, dtype = bool)
+        duplicate[order[1:]] = keys[order[1:]] == keys[order[:-1]]
+        if not duplicate.any():
+            break
+        redraw = duplicate
+    
+    network = CompactNetwork.from_edges(sources, targets, n)
+    return network, _population(AgentPopulationClass, n, rs)
+
+def erdos_renyi_arrays(AgentPopulationClass, n, p, seed = None):
+    """
+    Overview
+    ---------------
+    Array version of an Erdos-Renyi G(n, p) random graph: the number of
+    edges is drawn from its binomial distribution, then that many 
+    distinct node pairs are drawn uniformly
+    
+    Input
+    ---------------
+    AgentPopulationClass: see barabasi_albert_arrays()
+    n: number of nodes
+    p: probability of every possible edge
+    seed: seed for network and agent population
+    """
+    rs = np.random.RandomState(seed)
+    num_edges = rs.binomial(n * (n - 1) // 2, p)
+    keys = np.zeros(0, dtype = np.int64)
+    while len(keys) < num_edges:
+        missing = num_edges - len(keys)
+        sources = rs.randint(0, n, size = int(missing * 1.1) + 10)
+        targets = rs.randint(0, n, size = len(sources))
+        new_keys = edge_keys(sources, targets, n)
+        # unique() sorts, so keep a random subset of the new keys
+        new_keys = np.setdiff1d(new_keys, keys, assume_unique = True)
+        new_keys = rs.permutation(new_keys)[:missing]
+        keys = np.union1d(keys, new_keys)
+    network = CompactNetwork.from_edge_keys(keys, n)
+    return network, _population(AgentPopulationClass, n, rs)
+
+def watts_strogatz_arrays(AgentPopulationClass, n, k, p, seed = None):
+    """
+    Overview
+    ---------------
+    Array version of a Watts-Strogatz small-world graph: a ring lattice
+    in which every node is linked to its k / 2 nearest neighbours on each
+    side; every edge (u, v) is rewired to (u, w) with probability p, w
+    drawn uniformly, unless that would create a self loop or an existing
+    edge (as in networkx)
+    
+    Input
+    ---------------
+    AgentPopulationClass: see barabasi_albert_arrays()
+    n: number of nodes
+    k: number of nearest neighbours in the ring lattice, even
+    p: rewiring probability
+    seed: seed for network and agent population
+    """
+    rs = np.random.RandomState(seed)
+    sources = np.tile(np.arange(n, dtype = np.int64), k // 2)
+    targets = (sources + np.repeat(np.arange(1, k // 2 + 1), n)) % n
+    
+    rewire = np.flatnonzero(rs.random_sample(len(sources)) < p)
+    for attempt in range(20):
+        if len(rewire) == 0:
+            break
+        new_targets = rs.randint(0, n, size = len(rewire))
+        current = np.unique(np.minimum(sources, targets) * n +
+                            np.maximum(sources, targets))
+        new_keys = np.minimum(sources[rewire], new_targets) * n + \
+                   np.maximum(sources[rewire], new_targets)
+        valid = (new_targets != sources[rewire]) & \
+                ~np.in1d(new_keys, current)
+        # two rewired edges must not end up as the same edge
+        first_time = np.zeros(len(rewire), dtype = bool)
+        first_time[np.unique(new_keys, return_index = True)[1]] = True
+        valid &= first_time
+        targets[rewire[valid]] = new_targets[valid]
+        rewire = rewire[~valid]
+    
+    network = CompactNetwork.from_edges(sources, targets, n)
+    return network, _population(AgentPopulationClass, n, rs)
+
+def configuration_model_arrays(AgentPopulationClass, degree_sequence,
+                               seed = None):
+    """
+    Overview
+    ---------------
+    Array version of the configuration model: the edge ends (stubs) of 
+    all nodes are shuffled and paired; self loops and multiple edges are
+    removed (erased configuration model), so some nodes end up with a
+    slightly lower degree than given
+    
+    Input
+    ---------------
+    AgentPopulationClass: see barabasi_albert_arrays()
+    degree_sequence: degree of every node, the sum has to be even
+    seed: seed for network and agent population
+    """
+    degree_sequence = np.asarray(degree_sequence, dtype = np.int64)
+    if degree_sequence.sum() % 2 != 0:
+        raise ValueError("sum of the degree sequence has to be even")
+    rs = np.random.RandomState(seed)
+    n = len(degree_sequence)
+    stubs = np.repeat(np.arange(n, dtype = np.int64), degree_sequence)
+    rs.shuffle(stubs)
+    network = CompactNetwork.from_edges(stubs[0::2], stubs[1::2], n)
+    return network, _population(AgentPopulationClass, n, rs)
+
+#==============================================================================
+# Functions - network files
+#==============================================================================
+
+def _is_number(field):
+    try:
+        float(field)
+        return True
+    except ValueError:
+        return False
+
+def read_edge_chunks(filename, chunk_size = 1000000, delimiter = None,
+                     binary_dtype = None, skip_header = None):
+    """
+    Overview
+    ---------------
+    Reads an edge list from disk chunk_size edges at a time and yields 
+    (sources, targets) of the raw node ids of each chunk
+    
+    Input
+    ---------------
+    filename: text file with one edge per line, the first two fields 
+              being the node ids (further fields such as weights are 
+              ignored, lines starting with # or % are skipped), or binary
+              file of consecutive pairs of integer node ids
+    delimiter: None for whitespace separated, "," for csv files
+    binary_dtype: numpy integer type of a binary file, e.g. np.int32; 
+                  None for text files
+    skip_header: True if the first line that is not a comment is a header
+                 such as "source,target", False if it is an edge; None
+                 skips it if its first two fields are not both numbers
+                 but those of the next line are (a header above
+                 non-numeric ids cannot be told apart from an edge)
+    """
+    if binary_dtype is not None:
+        infile = open(filename, "rb")
+        try:
+            while True:
+                chunk = np.fromfile(infile, dtype = binary_dtype,
+                                    count = 2 * chunk_size)
+                if len(chunk) < 2:
+                    break
+                chunk = chunk[:len(chunk) - len(chunk) % 2]
+                yield chunk[0::2], chunk[1::2]
+        finally:
+            infile.close()
+        return
+    
+    def numeric(fields):
+        return _is_number(fields[0]) and _is_number(fields[1])
+    
+    infile = open(filename, "r")
+    # first line that is not a comment, while it is undecided whether it
+    # is a header
+    first_fields = None
+    line_number = 0
+    try:
+        while True:
+            lines = list(itertools.islice(infile, chunk_size))
+            if len(lines) == 0:
+                break
+            sources = []
+            targets = []
+            for line in lines:
+                fields = line.split(delimiter)
+                if len(fields) < 2 or fields[0].startswith(("#", "%")):
+                    continue
+                line_number += 1
+                if line_number == 1:
+                    if skip_header:
+                        continue
+                    if skip_header is None and not numeric(fields):
+                        first_fields = fields
+                        continue
+                elif first_fields is not None:
+                    if not numeric(fields):
+                        sources.append(first_fields[0].strip())
+                        targets.append(first_fields[1].strip())
+                    first_fields = None
+                sources.append(fields[0].strip())
+                targets.append(fields[1].strip())
+            yield sources, targets
+        if first_fields is not None:
+            yield [first_fields[0].strip()], [first_fields[1].strip()]
+    finally:
+        infile.close()
+
+def load_edge_list(AgentPopulationClass, filename, chunk_size = 1000000,
+                   delimiter = None, binary_dtype = None, seed = None,
+                   skip_header = None, integer_ids = None):
+    """
+    Overview
+    ---------------
+    Loads a (possibly very large) empirical network from an edge list 
+    without creating a networkx graph: the file is streamed in chunks,
+    node ids are remapped to 0 ... N - 1, edges are symmetrized and 
+    duplicate edges and self loops removed. Integer node ids are mapped in
+    sorted order, other ids with a dictionary; both take two passes over
+    the file (ids first, then edges)
+    
+    Input
+    ---------------
+    AgentPopulationClass: object type (not instance) that holds the state
+              of the agents, assumed to be AgentPopulation or similar;
+              None returns the seed instead, see barabasi_albert_arrays()
+    filename, chunk_size, delimiter, binary_dtype, skip_header: see 
+              read_edge_chunks()
+    seed: seed for the initialisation of the agent population
+    integer_ids: True if all node ids are integers, False if they are
+              mapped as strings; None decides by the first edge. A node
+              id that is not an integer in a file of integer ids raises
+              ValueError
+    
+    Output
+    ---------------
+    Tuple (CompactNetwork, agent population); the original id of node i
+    is CompactNetwork.node_ids[i]
+    """
+    def chunks():
+        return read_edge_chunks(filename, chunk_size, delimiter, 
+                                binary_dtype, skip_header)
+    
+    def integers(ids):
+        try:
+            return np.asarray(ids, dtype = np.int64)
+        except ValueError:
+            for node in ids:
+                try:
+                    int(node)
+                except ValueError:
+                    raise ValueError("node id %r in %s is not an integer, "
+                                     "see integer_ids" % (node, filename))
+            raise
+    
+    if integer_ids is None:
+        integer_ids = True
+        for sources, targets in chunks():
+            if len(sources) > 0:
+                try:
+                    int(sources[0])
+                    int(targets[0])
+                except ValueError:
+                    integer_ids = False
+                break
+    
+    if integer_ids:
+        node_ids = np.zeros(0, dtype = np.int64)
+        for sources, targets in chunks():
+            node_ids = np.union1d(node_ids, np.concatenate(
+                           [integers(sources), integers(targets)]))
+        def remap(ids):
+            return np.searchsorted(node_ids, integers(ids))
+    else:
+        # ids that are not integers are mapped with a dictionary
+        mapping = {}
+        for sources, targets in chunks():
+            for node in np.unique(np.concatenate([sources, targets])):
+                if node not in mapping:
+                    mapping[node] = len(mapping)
+        node_ids = np.empty(len(mapping), dtype = object)
+        for node, index in mapping.items():
+            node_ids[index] = node
+        def remap(ids):
+            unique_ids, inverse = np.unique(ids, return_inverse = True)
+            return np.array([mapping[node] for node in unique_ids],
+                            dtype = np.int64)[inverse]
+    
+    num_nodes = len(node_ids)
+    keys = [edge_keys(remap(sources), remap(targets), num_nodes)
+            for sources, targets in chunks() if len(sources) > 0]
+    if len(keys) > 0:
+        keys = np.unique(np.concatenate(keys))
+    else:
+        keys = np.zeros(0, dtype = np.int64)
+    
+    network = CompactNetwork.from_edge_keys(keys, num_nodes, node_ids)
+    if AgentPopulationClass is None:
+        return network, seed
+    return network, AgentPopulationClass(num_nodes, seed)
+
+#==============================================================================
+# Functions - agent records
+#==============================================================================
+
+# record of one agent at the end of a run as written by 
+# append_agent_records(); fixed size and byte order so that the records of
+# many runs can be appended to one file per column and read back as arrays
+agent_record_dtype = np.dtype([("run", "<i4"),
+                               ("agent", "<i8"),
+                               ("degree", "<i4"),
+                               ("rs_sent_overall", "<i8"),
+                               ("rs_received", "<i8"),
+                               ("original_rp", "<f8"),
+                               ("rp", "<f8"),
+                               ("media_consumption", "<f8")])
+
+def agent_column_path(directory, name):
+    """
+    Returns the file of column name of the agent records in directory
+    """
+    return os.path.join(directory, name + ".bin")
+
+def num_agent_records(directory):
+    """
+    Returns the number of complete agent records in directory; the run 
+    column is written last, so it counts the records whose columns have 
+    all been written
+    """
+    path = agent_column_path(directory, "run")
+    if not os.path.exists(path):
+        return 0
+    return os.path.getsize(path) // agent_record_dtype["run"].itemsize
+
+def append_agent_records(directory, run, agents):
+    """
+    Overview
+    ---------------
+    Appends the end-of-run state of all agents of a run to the agent 
+    records in directory, one binary file per column of 
+    agent_record_dtype, so that single columns can be read without 
+    reading the others. Values of a run that was interrupted while being
+    appended are overwritten
+    
+    Input
+    ---------------
+    directory: directory of the column files, created if it does not 
+               exist
+    run: number of the run, stored with every record
+    agents: dictionary of arrays as returned by Simulation.report_agents()
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    num_records = num_agent_records(directory)
+    columns = dict(agents, run = np.repeat(run, len(agents["agent"])))
+    for name in agent_record_dtype.names[1:] + ("run",):
+        dtype = agent_record_dtype[name]
+        path = agent_column_path(directory, name)
+        outfile = open(path, "r+b" if os.path.exists(path) else "wb")
+        outfile.truncate(num_records * dtype.itemsize)
+        outfile.seek(0, os.SEEK_END)
+        np.asarray(columns[name], dtype = dtype).tofile(outfile)
+        outfile.close()
+    
+def read_agent_records(directory, runs = None, columns = None):
+    """
+    Overview
+    ---------------
+    Reads the records written by append_agent_records(); only the 
+    requested columns are read, from memory-mapped files, so that a 
+    column of many runs can be analysed without loading the others
+    
+    Input
+    ---------------
+    directory: directory of the column files
+    runs: list of run numbers to read, all runs if None
+    columns: names of the columns to read (see agent_record_dtype), all 
+             columns if None
+    
+    Output
+    ---------------
+    Dictionary of arrays with one entry per agent and run, e.g. 
+    records["degree"]
+    """
+    if columns is None:
+        columns = agent_record_dtype.names
+    num_records = num_agent_records(directory)
+    
+    def column(name):
+        if num_records == 0:
+            return np.zeros(0, dtype = agent_record_dtype[name])
+        return np.memmap(agent_column_path(directory, name), 
+                         dtype = agent_record_dtype[name], mode = "r",
+                         shape = (num_records,))
+    
+    if runs is None:
+        return dict((name, np.array(column(name))) for name in columns)
+    selected = np.in1d(column("run"), runs)
+    return dict((name, column(name)[selected]) for name in columns)
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import numpy as np
+from agent_class_def import *
+from system_class_def import *
+from replicate_runner import *
+
+#==============================================================================
+# Degree distributions
+#==============================================================================
+
+def ba_degree_distribution(n, m):
+    """
+    Returns (degrees, probabilities) of the asymptotic degree distribution
+    P(k) = 2m(m+1) / (k(k+1)(k+2)) of a Barabasi-Albert graph with n nodes
+    and m edges per new node, truncated at the expected maximum degree
+    m * sqrt(n) and renormalised
+    """
+    k_max = max(int(np.ceil(m * np.sqrt(n))), m + 1)
+    degrees = np.arange(m, k_max + 1)
+    probabilities = 2. * m * (m + 1) / (degrees * (degrees + 1.) *
+                                         (degrees + 2.))
+    return degrees, probabilities / probabilities.sum()
+
+def empirical_degree_distribution(degree_sequence):
+    """
+    Returns (degrees, probabilities) of a given degree sequence, e.g. of
+    an existing network
+    """
+    degrees, counts = np.unique(np.asarray(degree_sequence, dtype = int),
+                                return_counts = True)
+    return degrees, counts / float(counts.sum())
+
+#==============================================================================
+# Mean-field model
+#==============================================================================
+
+class MeanFieldModel:
+    """
+    Overview
+    ---------------
+    Degree-based mean-field approximation of the agent-based model. Agents
+    are grouped by degree k and by type j, a representative draw of the
+    initial risk perception, multipliers and media consumption. Each
+    (k, j) cell follows the expected Agent.tick_behaviour() update given
+    the probabilities of receiving risk signals from the government, the
+    grid, the media and its neighbours, where neighbours are assumed to be
+    uncorrelated (degree k' with probability k'P(k')/<k>) and to send the
+    signals of the previous tick. Has the same interface as Simulation, so
+    its reports can be recorded with SystemState
+    """
+    def __init__(self):
+        self.gov_risk_signals = 0
+        self.grid_risk_signals = 0
+        self.HazardHappened = False
+        self.MediaIntensity = 0
+
+        # scales the rate of neighbour risk signals; 1 is the plain
+        # mean-field rate, see calibrate_mean_field()
+        self.neighbour_factor = 1.
+
+    def init_network(self, degrees, probabilities, num_nodes):
+        """
+        Overview
+        ---------------
+        Sets the degree distribution instead of a network graph
+
+        Input
+        ---------------
+        degrees: array of degree classes
+        probabilities: share of agents in each degree class
+        num_nodes: number of agents the shares refer to
+        """
+        self.degrees = np.asarray(degrees, dtype = float)
+        self.degree_probs = np.asarray(probabilities, dtype = float)
+        self.num_nodes = num_nodes
+
+        # degree distribution of a neighbour and the probability that a
+        # sharing agent of degree k sends a signal to a given neighbour,
+        # E[randint(1, k/2)] / k, which is 0 for k < 2 (ValueError in
+        # Agent.tick_behaviour())
+        self.neighbour_probs = self.degrees * self.degree_probs / \
+                               np.sum(self.degrees * self.degree_probs)
+        half = np.floor(self.degrees / 2)
+        self.mean_subset = np.where(half >= 1, (1 + half) / 2., 0)
+        self.edge_share = self.mean_subset / self.degrees
+
+    def init_population(self, AgentPopulationClass = AgentPopulation,
+                        num_types = 500, seed = None):
+        """
+        Draws num_types representative agents as an AgentPopulationClass
+        instance created from seed, so that the types are reproducible,
+        and uses them as equally weighted types in every degree class
+        """
+        agents = AgentPopulationClass(num_types, seed)
+        self.rp = np.tile(np.asarray(agents.risk_perception, dtype = float),
+                          (len(self.degrees), 1))
+        self.benefit_multiplier = np.asarray(agents.benefit_multiplier,
+                                             dtype = float)
+        self.techn_fear_multiplier = np.asarray(
+            agents.techn_fear_multiplier, dtype = float)
+        self.media_consumption = np.asarray(agents.media_consumption,
+                                            dtype = float)
+        # probability of a (k, j) agent having received any risk signal,
+        # hence of being able to share, in the last tick
+        self.p_active = np.zeros(self.rp.shape)
+        self.neighbour_rs_sent = 0.
+        self.media_rs_sent = 0.
+
+    def init_institutions(self,
+                          MediaClass,
+                          GovernmentClass, GovernmentMultiplier,
+                          HazardClass, HazardName, HazardMultiplier):
+        """
+        Same as Simulation.init_institutions()
+        """
+        self.Media = MediaClass("Media")
+        self.Government = GovernmentClass("Government", GovernmentMultiplier)
+        self.Hazard = HazardClass("%s" % HazardName, HazardMultiplier)
+
+    def init_parameters(self, num_ticks, hazard_triggered, num_affected,
+            MediaDelay, MediaMultiplier, MediaReportingIntensity,
+            GovernmentStop, GovernmentDelay, verbose = False):
+        """
+        Same as Simulation.init_parameters()
+        """
+        self.num_ticks = num_ticks
+        self.hazard_triggered = hazard_triggered
+        self.num_affected = num_affected
+        self.MediaDelay = MediaDelay
+        self.MediaMultiplier = MediaMultiplier
+        self.MediaReportingIntensity = MediaReportingIntensity
+        self.GovernmentStop = GovernmentStop
+        self.GovernmentDelay = GovernmentDelay
+
+    def weights(self):
+        """
+        Returns share of the population in each (k, j) cell
+        """
+        return np.outer(self.degree_probs, np.ones(self.rp.shape[1]) /
+                        self.rp.shape[1])
+
+    def report_state(self):
+        """
+        Same as Simulation.report_state(); numbers of agents per color and
+        risk signals are expected values and therefore not integers
+        """
+        w = self.weights() * self.num_nodes
+        rp = self.rp
+        self.curr_avg_rp = np.sum(w * rp) / self.num_nodes
+
+        state = dict([("curr_green", np.sum(w[rp < 2])),
+                      ("curr_yellow", np.sum(w[(rp >= 2) & (rp < 3)])),
+                      ("curr_orange", np.sum(w[(rp >= 3) & (rp < 4)])),
+                      ("curr_red", np.sum(w[rp >= 4])),
+                      ("curr_avg_rp", self.curr_avg_rp),
+                      ("gov_rs_sent", self.gov_risk_signals),
+                      ("media_rs_sent", self.media_rs_sent),
+                      ("neighbour_rs_sent", self.neighbour_rs_sent),
+                      ("grid_rs_sent", self.grid_risk_signals)])
+        self.gov_risk_signals = 0
+        self.grid_risk_signals = 0
+        self.media_rs_sent = 0.
+        self.neighbour_rs_sent = 0.
+        return state
+
+    def clip(self, value):
+        """
+        Risk signals above 2 or below .1 are impossible
+        """
+        return np.minimum(np.maximum(value, .1), 2)
+
+    def tick(self, tick):
+        """
+        Overview
+        ---------------
+        Expected behaviour of all agents at tick/time step tick, in the
+        same order as Simulation.tick()
+        """
+        H = self.Hazard.get_rp_multiplier()
+        w = self.weights()
+
+        # Bernoulli sources: (probability per cell, magnitude)
+        sources = []
+        p_grid = 0.
+        if tick == self.hazard_triggered:
+            self.HazardHappened = True
+            p_grid = min(self.num_affected / float(self.num_nodes), 1.)
+            self.grid_risk_signals += self.num_affected
+        sources.append((np.ones(self.rp.shape) * p_grid, H))
+
+        if tick == self.hazard_triggered + self.MediaDelay:
+            self.Media.start_reporting(self.MediaMultiplier)
+            self.Media.set_intensity(self.MediaReportingIntensity)
+
+        gov = 0
+        if self.GovernmentStop > tick >= self.GovernmentDelay:
+            gov = 1
+            self.gov_risk_signals += self.num_nodes
+        gov_magnitude = self.clip(self.Government.get_risk_signal_magnitude()
+                                  * H)
+
+        if self.Media.reports:
+            self.Media.tick_behaviour(self.curr_avg_rp)
+            self.MediaIntensity = self.Media.get_intensity()
+            p_media = np.tile(self.media_consumption *
+                              self.Media.get_intensity(),
+                              (self.rp.shape[0], 1))
+        else:
+            p_media = np.zeros(self.rp.shape)
+        sources.append((p_media, self.clip(self.Media.get_rp_multiplier()
+                                           * H)))
+        self.media_rs_sent = np.sum(w * p_media) * self.num_nodes
+
+        # neighbour signals sent in the previous tick: probability of a
+        # neighbour sending a signal to the focal agent and its magnitude
+        p_share = (self.rp - 1) / 4.
+        send = self.p_active * p_share * self.edge_share[:, None]
+        magnitude = self.clip(((self.rp - 1) / 4. * 1.9 + .1) * H)
+        type_share = 1. / self.rp.shape[1]
+        rate_per_edge = np.sum(self.neighbour_probs[:, None] * type_share *
+                               send)
+        if rate_per_edge > 0:
+            mean_neighbour = np.sum(self.neighbour_probs[:, None] *
+                                    type_share * send * magnitude) / \
+                             rate_per_edge
+        else:
+            mean_neighbour = 0.
+        rate = self.neighbour_factor * self.degrees * rate_per_edge
+        p_neighbour = np.tile(1 - np.exp(-rate)[:, None],
+                              (1, self.rp.shape[1]))
+        sources.append((p_neighbour, mean_neighbour))
+
+        # expected update over all combinations of signals received
+        base = (self.benefit_multiplier + self.techn_fear_multiplier)[None, :]
+        new_rp = np.zeros(self.rp.shape)
+        p_none = np.zeros(self.rp.shape)
+        for combination in range(2**len(sources)):
+            p = np.ones(self.rp.shape)
+            total = gov * gov_magnitude
+            count = gov
+            for index, (p_source, source_magnitude) in enumerate(sources):
+                if combination & (1 << index):
+                    p = p * p_source
+                    total = total + source_magnitude
+                    count += 1
+                else:
+                    p = p * (1 - p_source)
+            if count == 0:
+                p_none = p
+                new_rp += p * self.rp
+            else:
+                updated = self.rp * (total / float(count) + base) / 3.
+                new_rp += p * np.minimum(np.maximum(updated, 1), 5)
+
+        self.p_active = 1 - p_none
+        self.rp = new_rp
+        self.neighbour_rs_sent = np.sum(w * self.p_active * p_share *
+                                        self.mean_subset[:, None]) * \
+                                 self.num_nodes
+
+#==============================================================================
+# Running, calibrating and validating the surrogate
+#==============================================================================
+
+def run_mean_field(parameters, num_types = 500, neighbour_factor = 1.,
+                   degree_distribution = None, seed = None):
+    """
+    Overview
+    ---------------
+    Runs the mean-field model for a scenario
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    num_types: number of representative agents per degree class
+    neighbour_factor: see MeanFieldModel
+    degree_distribution: (degrees, probabilities), defaults to the
+                         Barabasi-Albert distribution of the scenario
+    seed: seed of the representative agents, see 
+          MeanFieldModel.init_population()
+
+    Output
+    ---------------
+    Dictionary in the same format as SystemState.return_data()
+    """
+    if degree_distribution is None:
+        degree_distribution = ba_degree_distribution(parameters["num_nodes"],
+                                                     parameters["num_edges"])
+    Model = MeanFieldModel()
+    Model.neighbour_factor = neighbour_factor
+    Model.init_network(degree_distribution[0], degree_distribution[1],
+                       parameters["num_nodes"])
+    Model.init_population(AgentPopulation, num_types, seed)
+    Model.init_institutions(Media, Government,
+                            parameters["GovernmentMultiplier"],
+                            Hazard, parameters["HazardName"],
+                            parameters["HazardMultiplier"])
+    Model.init_parameters(parameters["num_ticks"],
+                          parameters["hazard_triggered"],
+                          parameters["num_affected"],
+                          parameters["MediaDelay"],
+                          parameters["MediaMultiplier"],
+                          parameters["MediaReportingIntensity"],
+                          parameters["GovernmentStop"],
+                          parameters["GovernmentDelay"])
+
+    ModelState = SystemState()
+    ModelState.record_data(Model.report_state())
+    for tick in range(parameters["num_ticks"]):
+        Model.tick(tick)
+        ModelState.record_data(Model.report_state())
+    return ModelState.return_data()
+
+def mean_field_errors(surrogate, mean_abm, num_nodes):
+    """
+    Returns dictionary with root mean squared and maximum absolute error
+    over all ticks of avg_rp and of the shares (not numbers) of agents per
+    color between a surrogate run and the mean of ABM runs
+    """
+    errors = {}
+    for var in ["avg_rp", "green", "yellow", "orange", "red"]:
+        scale = 1. if var == "avg_rp" else float(num_nodes)
+        difference = (np.asarray(surrogate[var], dtype = float) -
+                      np.asarray(mean_abm[var], dtype = float)) / scale
+        errors[var] = (np.sqrt(np.mean(difference**2)),
+                       np.max(np.abs(difference)))
+    return errors
+
+def validate_mean_field(scenarios, num_runs = 20, num_types = 500,
+                        neighbour_factor = 1., processes = 1, seed = None,
+                        outfile_name = "mean_field_validation.csv"):
+    """
+    Overview
+    ---------------
+    Compares the mean-field model with the mean of num_runs runs of the
+    agent-based model for each scenario, so it is known for which regions
+    of the parameter space the surrogate can be trusted
+
+    Input
+    ---------------
+    scenarios: dictionary mapping scenario names to parameter dictionaries
+    seed: makes the seeds of the ABM runs and of the representative 
+          agents of the mean-field model reproducible
+    outfile_name: csv file with one line per scenario and variable, None
+                  for no file
+
+    Output
+    ---------------
+    Dictionary mapping scenario names to mean_field_errors() results
+    """
+    results = {}
+    for index, name in enumerate(sorted(scenarios)):
+        parameters = scenarios[name]
+        scenario_seed = None if seed is None else seed + index
+        runs = run_replicates(parameters, draw_seeds(num_runs, scenario_seed),
+                              processes)
+        surrogate = run_mean_field(parameters, num_types, neighbour_factor,
+                                   seed = scenario_seed)
+        results[name] = mean_field_errors(surrogate, mean_results(runs),
+                                          parameters["num_nodes"])
+
+    if outfile_name is not None:
+        outfile = open(outfile_name, "w")
+        outfile.write("scenario, variable, rmse, max_abs_error\n")
+        for name in sorted(results):
+            for var in sorted(results[name]):
+                outfile.write("%s, %s, %s, %s\n" % ((name, var) +
+                                                    results[name][var]))
+        outfile.close()
+
+    return results
+
+def calibrate_mean_field(scenarios, factors = None, num_runs = 20,
+                         num_types = 500, processes = 1, seed = None):
+    """
+    Overview
+    ---------------
+    Chooses the neighbour_factor of the mean-field model that minimises
+    the root mean squared error of avg_rp against ABM runs, averaged over
+    the scenarios; the factor corrects for signals that are passed on
+    within the same tick in the ABM and for degree correlations. All 
+    factors are run with the same representative agents, drawn from seed
+    like in validate_mean_field()
+
+    Output
+    ---------------
+    Tuple (best factor, dictionary mapping factors to mean RMSE)
+    """
+    if factors is None:
+        factors = np.linspace(.5, 3., 11)
+    mean_abm = {}
+    scenario_seeds = {}
+    for index, name in enumerate(sorted(scenarios)):
+        scenario_seed = None if seed is None else seed + index
+        mean_abm[name] = mean_results(run_replicates(scenarios[name],
+                                      draw_seeds(num_runs, scenario_seed),
+                                      processes))
+        # one seed even if seed is None, so that all factors share it
+        scenario_seeds[name] = draw_seeds(1, scenario_seed)[0]
+    rmse = {}
+    for factor in factors:
+        rmse[factor] = np.mean([mean_field_errors(
+                                    run_mean_field(scenarios[name],
+                                                   num_types, factor, 
+                                                   seed = 
+                                                   scenario_seeds[name]),
+                                    mean_abm[name],
+                                    scenarios[name]["num_nodes"])
+                                ["avg_rp"][0] for name in scenarios])
+    best = min(rmse, key = rmse.get)
+    return best, rmse
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import sys
+import time
+import threading
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    # not part of the standard library before Python 3.4
+    tracemalloc = None
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def current_rss():
+    """
+    Returns the resident set size of this process in bytes, or None if
+    it cannot be determined (only available on Linux)
+    """
+    try:
+        infile = open("/proc/self/statm", "r")
+        pages = int(infile.read().split()[1])
+        infile.close()
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        return None
+
+def peak_rss():
+    """
+    Returns the largest resident set size of this process so far in
+    bytes, or None if it cannot be determined
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+#==============================================================================
+# Classes
+#==============================================================================
+
+class MemoryTracker:
+    """
+    Overview
+    ---------------
+    Tracks the peak memory and the time of the phases of a run (e.g.
+    network build, population initialisation, ticks, recording,
+    analysis). A background thread samples the resident set size of the
+    process every interval seconds and attributes it to the current
+    phase; since short peaks can fall between two samples, the peak RSS
+    of the process as reported by the operating system is used as well
+    whenever it grows during a phase. If tracemalloc is available and
+    use_tracemalloc is set, the peak of the memory allocated by Python
+    and numpy is recorded too (this slows down pure Python code)
+    """
+    def __init__(self, interval = .01, use_tracemalloc = False):
+        """
+        interval: seconds between two samples of the resident set size
+        use_tracemalloc: records the peak of traced allocations per phase
+        """
+        self.interval = interval
+        self.use_tracemalloc = use_tracemalloc and tracemalloc is not None
+        self.phases = {}
+        self.order = []
+        self.current = None
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the sampling thread; called by set_phase() if necessary
+        """
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.thread = threading.Thread(target = self.sample_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def sample_loop(self):
+        while not self.stopped:
+            self.sample()
+            time.sleep(self.interval)
+
+    def sample(self):
+        """
+        Attributes the current resident set size to the current phase
+        """
+        phase = self.current
+        rss = current_rss()
+        if phase is not None and rss is not None and \
+           rss > self.phases[phase]["rss_peak"]:
+            self.phases[phase]["rss_peak"] = rss
+
+    def set_phase(self, name):
+        """
+        Ends the current phase and starts (or continues) phase name;
+        phases can be entered repeatedly, e.g. once per tick, and their
+        times add up
+        """
+        if self.thread is None:
+            self.start()
+        self.end_phase()
+        if name not in self.phases:
+            self.phases[name] = {"rss_start": current_rss(),
+                                 "rss_end": None,
+                                 "rss_peak": 0,
+                                 "traced_peak": None,
+                                 "seconds": 0.}
+            self.order.append(name)
+        self.phase_start = time.time()
+        self.phase_peak_rss = peak_rss()
+        if self.use_tracemalloc and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self.current = name
+        self.sample()
+
+    def end_phase(self):
+        """
+        Ends the current phase
+        """
+        name = self.current
+        if name is None:
+            return
+        self.sample()
+        self.current = None
+        phase = self.phases[name]
+        phase["seconds"] += time.time() - self.phase_start
+        phase["rss_end"] = current_rss()
+        peak = peak_rss()
+        if peak is not None and self.phase_peak_rss is not None and \
+           peak > self.phase_peak_rss:
+            # the peak of the whole process was reached in this phase
+            phase["rss_peak"] = max(phase["rss_peak"], peak)
+        if self.use_tracemalloc:
+            traced = tracemalloc.get_traced_memory()[1]
+            phase["traced_peak"] = max(phase["traced_peak"] or 0, traced)
+
+    def stop(self):
+        """
+        Ends the current phase and stops the sampling thread
+        """
+        self.end_phase()
+        self.stopped = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def report(self):
+        """
+        Returns list of (phase name, dictionary) in the order in which
+        the phases were first entered; memory in bytes
+        """
+        return [(name, dict(self.phases[name])) for name in self.order]
+
+    def peak(self):
+        """
+        Returns the largest resident set size over all phases in bytes
+        """
+        return max([phase["rss_peak"] for phase in self.phases.values()] +
+                   [0])
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+# figures are only written to file, so no display is needed
+import matplotlib as mpl
+mpl.use("Agg")
+import matplotlib.pyplot
+
+import os
+import sys
+import json
+import hashlib
+import multiprocessing as mp
+from function_def import *
+from replicate_runner import *
+
+#==============================================================================
+# Plots all scenarios of a sweep
+#==============================================================================
+
+# aggregated results looked for in every scenario directory, binary first
+result_files = ["mean_results.npz", "mean_results.csv"]
+
+# figures rendered per scenario
+figures = ["stackplot.png", "rs_sent.png", "lineplot.png"]
+
+manifest_name = "render_manifest.json"
+
+def find_scenarios(sweep_dir):
+    """
+    Returns sorted list of (scenario directory, results file) for all
+    subdirectories of sweep_dir that contain aggregated results
+    """
+    scenarios = []
+    for name in sorted(os.listdir(sweep_dir)):
+        scenario_dir = os.path.join(sweep_dir, name)
+        if not os.path.isdir(scenario_dir):
+            continue
+        for result_file in result_files:
+            if os.path.exists(os.path.join(scenario_dir, result_file)):
+                scenarios.append((scenario_dir, result_file))
+                break
+    return scenarios
+
+def results_digest(data):
+    """
+    Returns the SHA-1 digest of a dictionary of arrays as returned by
+    load_mean_results(); unlike a digest of the file it does not change
+    when the same results are saved again, since np.savez() stores the
+    time a file was written
+    """
+    digest = hashlib.sha1()
+    for var in sorted(data):
+        values = np.ascontiguousarray(data[var])
+        digest.update(("%s %s %s\n" % (var, values.dtype.str, 
+                                       values.shape)).encode("utf-8"))
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+def plot_scenario(job):
+    """
+    Overview
+    ---------------
+    Renders all figures of one scenario into its directory, skipping
+    figures that exist and whose results have not changed since they were
+    rendered; the digests of the results are kept in a manifest file in
+    the scenario directory, see results_digest()
+
+    Input
+    ---------------
+    job: tuple (scenario directory, results file, force), force renders
+         all figures regardless of the manifest
+
+    Output
+    ---------------
+    Tuple (scenario directory, number of figures rendered)
+    """
+    scenario_dir, result_file, force = job
+    data = load_mean_results(os.path.join(scenario_dir, result_file))
+    digest = results_digest(data)
+    manifest_file = os.path.join(scenario_dir, manifest_name)
+    manifest = {}
+    if os.path.exists(manifest_file):
+        infile = open(manifest_file, "r")
+        manifest = json.load(infile)
+        infile.close()
+
+    todo = [figure for figure in figures if force or
+            manifest.get(figure) != digest or
+            not os.path.exists(os.path.join(scenario_dir, figure))]
+    if len(todo) == 0:
+        return scenario_dir, 0
+
+    num_ticks = len(data["avg_rp"]) - 1
+    num_nodes = data["green"][0] + data["yellow"][0] + \
+                data["orange"][0] + data["red"][0]
+
+    for figure in todo:
+        filename = os.path.join(scenario_dir, figure)
+        if figure == "stackplot.png":
+            plot_stack(data["green"], data["yellow"], data["orange"],
+                       data["red"], num_ticks, num_nodes, True, False,
+                       filename)
+        elif figure == "rs_sent.png":
+            plot_rs_sent(data["gov_rs"], data["media_rs"],
+                         data["neighbour_rs"], data["grid_rs"],
+                         data["avg_rp"], num_ticks, True, False, filename)
+        elif figure == "lineplot.png":
+            plot_lines(data["green"], data["yellow"], data["orange"],
+                       data["red"], num_ticks, num_nodes, True, False,
+                       filename)
+        manifest[figure] = digest
+
+    # write to a temporary file first so that an interrupted run does not
+    # leave a broken manifest
+    outfile = open(manifest_file + ".tmp", "w")
+    json.dump(manifest, outfile)
+    outfile.close()
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+    os.rename(manifest_file + ".tmp", manifest_file)
+    return scenario_dir, len(todo)
+
+def plot_sweep(sweep_dir, processes = None, force = False):
+    """
+    Overview
+    ---------------
+    Renders the figures of every scenario of a sweep in parallel; every
+    scenario is a subdirectory of sweep_dir with a mean_results.npz or
+    mean_results.csv file as written by save_mean_results()
+
+    Input
+    ---------------
+    sweep_dir: directory of the sweep
+    processes: number of worker processes, defaults to number of CPUs
+    force: renders all figures even if their inputs have not changed
+
+    Output
+    ---------------
+    Dictionary mapping scenario directories to numbers of figures rendered
+    """
+    jobs = [(scenario_dir, result_file, force) for scenario_dir, result_file
+            in find_scenarios(sweep_dir)]
+    if processes is None:
+        processes = mp.cpu_count()
+    if processes > 1 and len(jobs) > 1:
+        pool = mp.Pool(processes)
+        try:
+            results = pool.map(plot_scenario, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [plot_scenario(job) for job in jobs]
+    return dict(results)
+
+if __name__ == "__main__":
+    # usage: python plot_sweep_results.py sweep_dir [processes]
+    rendered = plot_sweep(sys.argv[1],
+                          int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    print "%s figures rendered for %s scenarios" % (sum(rendered.values()),
+                                                    len(rendered))
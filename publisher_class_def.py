@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import json
+import socket
+import threading
+import collections
+
+#==============================================================================
+# Classes
+#==============================================================================
+
+class MetricPublisher:
+    """
+    Overview
+    ---------------
+    Publishes the per-tick reports of a running simulation to a
+    monitoring process without slowing the simulation down: publish()
+    only appends the scalar values of a report to a bounded buffer, a
+    background thread sends them as JSON either as UDP datagrams to a
+    local socket or into a queue (e.g. multiprocessing.Queue). If the
+    buffer is full the oldest update is dropped; with buffer_size 1
+    updates are coalesced so that only the latest report is sent
+    """
+    def __init__(self, address = ("127.0.0.1", 9999), queue = None,
+                 buffer_size = 100):
+        """
+        address: (host, port) the UDP datagrams are sent to
+        queue: if given, reports are put into this queue (without
+               blocking) instead of being sent to address
+        buffer_size: number of reports kept while the sending thread
+               lags behind
+        """
+        self.address = address
+        self.queue = queue
+        self.buffer = collections.deque(maxlen = buffer_size)
+        self.dropped = 0
+        self.sent = 0
+        self.new_data = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.socket = None
+
+    def start(self):
+        """
+        Starts the sending thread; called by publish() if necessary
+        """
+        if self.queue is None:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setblocking(False)
+        self.thread = threading.Thread(target = self.send_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def publish(self, tick, data_dict):
+        """
+        Overview
+        ---------------
+        Adds a report to the buffer; never blocks
+
+        Input
+        ---------------
+        tick: tick/time step of the report
+        data_dict: dictionary returned by Simulation.report_state();
+                   arrays such as rp_array are left out
+        """
+        if self.thread is None:
+            self.start()
+        metrics = dict((key, value) for key, value in data_dict.items()
+                       if not hasattr(value, "__len__"))
+        metrics["tick"] = tick
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(metrics)
+        self.new_data.set()
+
+    def send_loop(self):
+        """
+        Sends buffered reports until close() is called
+        """
+        while True:
+            self.new_data.wait()
+            self.new_data.clear()
+            while len(self.buffer) > 0:
+                message = json.dumps(self.buffer.popleft(),
+                                     default = lambda x: x.item())
+                self.send(message)
+            if self.stopped:
+                break
+
+    def send(self, message):
+        """
+        Sends one report; reports that cannot be sent immediately are
+        dropped
+        """
+        try:
+            if self.queue is not None:
+                self.queue.put_nowait(message)
+            else:
+                self.socket.sendto(message.encode("utf-8"), self.address)
+            self.sent += 1
+        except Exception:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Sends the remaining reports and stops the sending thread
+        """
+        if self.thread is not None:
+            self.stopped = True
+            self.new_data.set()
+            self.thread.join()
+            self.thread = None
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def listen_metrics(address = ("127.0.0.1", 9999), timeout = None):
+    """
+    Overview
+    ---------------
+    Generator for the monitoring process: yields the reports sent by a
+    MetricPublisher to address as dictionaries
+
+    Input
+    ---------------
+    address: (host, port) to listen on
+    timeout: seconds without a report after which the generator stops,
+             None to wait forever
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(address)
+    listener.settimeout(timeout)
+    try:
+        while True:
+            try:
+                message = listener.recv(65536)
+            except socket.timeout:
+                break
+            yield json.loads(message.decode("utf-8"))
+    finally:
+        listener.close()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import json
+import pickle
+import socket
+import random as rnd
+
+#==============================================================================
+# Classes
+#==============================================================================
+
+class WorkQueue:
+    """
+    Overview
+    ---------------
+    Queue of jobs (e.g. replicates of the scenarios of a sweep) kept in a
+    directory that all workers can access, possibly from several hosts
+    over a shared file system. Every state change is an atomic rename:
+
+    jobs/<job>.json      waiting to be claimed
+    leases/<job>@<worker>@<claimed>.json
+                         claimed by a worker at time claimed (file system
+                         clock); the worker touches the file regularly,
+                         leases neither claimed nor touched for
+                         lease_seconds are moved back to jobs/ by
+                         recover()
+    results/<job>.pkl    result, written to a temporary file first
+    failed/<job>.json    failed max_attempts times
+
+    Since worker and claim time are part of the name the lease is given by
+    the rename that claims the job, a fresh lease can never be mistaken
+    for an expired one, and workers only ever remove their own leases. A
+    job whose lease expired while its worker was merely slow may run
+    twice; only the first result is kept
+    """
+    def __init__(self, queue_dir, lease_seconds = 600, max_attempts = 3):
+        """
+        queue_dir: directory of the queue, created if necessary
+        lease_seconds: seconds after the last heartbeat after which a
+                       claimed job is given to another worker
+        max_attempts: number of times a job is run before it is moved to
+                      failed/ if the simulation raises an exception
+        """
+        self.queue_dir = queue_dir
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        for name in ["jobs", "leases", "results", "failed"]:
+            path = os.path.join(queue_dir, name)
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    # created by another worker in the meantime
+                    pass
+
+    def path(self, state, job_id):
+        """
+        Returns the file of a job in state jobs, results or failed
+        """
+        extension = ".pkl" if state == "results" else ".json"
+        return os.path.join(self.queue_dir, state, job_id + extension)
+
+    def lease_path(self, job_id, worker, claimed):
+        return os.path.join(self.queue_dir, "leases", "%s@%s@%.3f.json" %
+                            (job_id, worker, claimed))
+
+    def leases(self):
+        """
+        Returns list of (job id, worker, claim time, file) of all leases
+        """
+        leases = []
+        directory = os.path.join(self.queue_dir, "leases")
+        for name in os.listdir(directory):
+            if name.startswith(".") or name.count("@") < 2:
+                continue
+            job_id, worker, claimed = name[:-len(".json")].rsplit("@", 2)
+            leases.append((job_id, worker, float(claimed),
+                           os.path.join(directory, name)))
+        return sorted(leases)
+
+    def job_ids(self, state):
+        """
+        Returns the ids of all jobs in a state (jobs, leases, results or
+        failed)
+        """
+        if state == "leases":
+            return sorted(set(lease[0] for lease in self.leases()))
+        return sorted(name.rsplit(".", 1)[0] for name in
+                      os.listdir(os.path.join(self.queue_dir, state))
+                      if not name.startswith("."))
+
+    def now(self):
+        """
+        Returns the current time of the file system, which all hosts share
+        even if their clocks differ
+        """
+        clock = os.path.join(self.queue_dir, ".clock.%s.%s" %
+                             (socket.gethostname(), os.getpid()))
+        open(clock, "w").close()
+        now = os.path.getmtime(clock)
+        os.remove(clock)
+        return now
+
+    def write_atomic(self, path, data, binary = False):
+        """
+        Writes data to a temporary file and renames it to path, so that
+        readers never see a partially written file
+        """
+        tmp = os.path.join(os.path.dirname(path), ".%s.%s.%s.tmp" %
+                           (os.path.basename(path), socket.gethostname(),
+                            os.getpid()))
+        outfile = open(tmp, "wb" if binary else "w")
+        outfile.write(data)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+        outfile.close()
+        os.rename(tmp, path)
+
+    def submit(self, job_id, parameters, seed, attempts = 0):
+        """
+        Adds a job unless it has already been submitted or completed
+        """
+        if any(os.path.exists(self.path(state, job_id)) for state in
+               ["jobs", "results", "failed"]) or \
+           job_id in self.job_ids("leases"):
+            return False
+        self.write_atomic(self.path("jobs", job_id),
+                          json.dumps({"id": job_id,
+                                      "parameters": parameters,
+                                      "seed": seed,
+                                      "attempts": attempts}))
+        return True
+
+    def claim(self, worker, random_state = rnd):
+        """
+        Overview
+        ---------------
+        Claims a waiting job; the rename from jobs/ to leases/ succeeds
+        for exactly one worker
+
+        Input
+        ---------------
+        worker: id of the worker, unique over all hosts and without @
+        random_state: random.Random instance used to shuffle the jobs
+
+        Output
+        ---------------
+        Dictionary describing the job, with the file of its lease under
+        the key lease; None if no job is waiting
+        """
+        waiting = self.job_ids("jobs")
+        # workers try the jobs in different orders so that they rarely
+        # compete for the same one
+        random_state.shuffle(waiting)
+        for job_id in waiting:
+            lease = self.lease_path(job_id, worker, self.now())
+            try:
+                os.rename(self.path("jobs", job_id), lease)
+                infile = open(lease, "r")
+                job = json.load(infile)
+                infile.close()
+            except (IOError, OSError):
+                # claimed by another worker, or recovered again after
+                # an unusually long delay
+                continue
+            job["lease"] = lease
+            return job
+        return None
+
+    def heartbeat(self, job):
+        """
+        Renews the lease of a job; returns False if the lease was lost
+        """
+        try:
+            os.utime(job["lease"], None)
+            return True
+        except OSError:
+            return False
+
+    def complete(self, job, result):
+        """
+        Saves the result of a job and releases its lease; the result of a
+        job that has already been completed by another worker is dropped
+        """
+        if not os.path.exists(self.path("results", job["id"])):
+            self.write_atomic(self.path("results", job["id"]),
+                              pickle.dumps(result, 2), binary = True)
+        try:
+            os.remove(job["lease"])
+        except OSError:
+            # lease lost, possibly claimed by another worker since
+            pass
+
+    def fail(self, job, error):
+        """
+        Returns a job whose simulation raised an exception to the queue,
+        or moves it to failed/ after max_attempts attempts
+        """
+        try:
+            os.remove(job["lease"])
+        except OSError:
+            # lease lost, the job has been recovered already
+            return
+        job = dict(job, attempts = job["attempts"] + 1, error = error)
+        del job["lease"]
+        state = "failed" if job["attempts"] >= self.max_attempts else "jobs"
+        self.write_atomic(self.path(state, job["id"]), json.dumps(job))
+
+    def recover(self):
+        """
+        Moves jobs whose lease has expired, i.e. that were neither claimed
+        nor renewed for lease_seconds, e.g. because their worker crashed,
+        back to jobs/; returns their ids
+        """
+        now = self.now()
+        recovered = []
+        for job_id, worker, claimed, path in self.leases():
+            try:
+                renewed = max(claimed, os.path.getmtime(path))
+                if now - renewed <= self.lease_seconds:
+                    continue
+                if os.path.exists(self.path("results", job_id)):
+                    # crashed after writing the result
+                    os.remove(path)
+                else:
+                    os.rename(path, self.path("jobs", job_id))
+                    recovered.append(job_id)
+            except OSError:
+                # completed or recovered by another worker in the meantime
+                continue
+        return recovered
+
+    def status(self):
+        """
+        Returns dictionary with the number of jobs in each state
+        """
+        return dict((state, len(self.job_ids(state))) for state in
+                    ["jobs", "leases", "results", "failed"])
+
+    def done(self):
+        """
+        True if no job is waiting or running
+        """
+        status = self.status()
+        return status["jobs"] == 0 and status["leases"] == 0
+
+    def result(self, job_id):
+        infile = open(self.path("results", job_id), "rb")
+        result = pickle.load(infile)
+        infile.close()
+        return result
@@ -0,0 +1,619 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import random as rnd
+import numpy as np
+import multiprocessing as mp
+from system_class_def import *
+from agent_class_def import *
+from function_def import *
+from streams_class_def import *
+
+#==============================================================================
+# Scenario parameters
+#==============================================================================
+
+# the output variables recorded by SystemState, in the order in which
+# SystemState.save_data() writes them to file
+variables = ["green", "yellow", "orange", "red", "gov_rs", "media_rs",
+             "grid_rs", "neighbour_rs", "avg_rp"]
+
+# rescaled first component scores of hazard scenarios
+HazardDict = {"Automation": 1.3,
+              "Meter Reading": 0.89867133572128,
+              "Remote Connect": 1.19725205261451,
+              "Outage Detection": 0.7,
+              "Power Theft": 0.976680716275362,
+              "Pricing": 0.813628981657745,
+              "Customer Information": 0.875750820478405,
+              "Distributed Resources": 0.937800864934615,
+              "Transmissions": 1.10726609072683,
+              "Test Value": 1.0}
+
+def default_parameters():
+    """
+    Returns a dictionary with the parameters of the default scenario in
+    run_sim.py; single entries can be changed to define other scenarios
+    """
+    parameters = {"num_nodes": 100,
+                  "num_edges": 3,
+                  "num_ticks": 50,
+                  "hazard_triggered": 1,
+                  "num_affected": 20,
+                  "HazardName": "Automation",
+                  "HazardMultiplier": HazardDict["Automation"],
+                  "GovernmentMultiplier": .4,
+                  "MediaMultiplier": 1.2,
+                  "MediaDelay": 2,
+                  "converge": False,
+                  "ConvergenceTolerance": 1e-4,
+                  "ConvergenceTicks": 5,
+                  "num_rp_bins": None,
+                  "network_metrics": False,
+                  "agent_records": False,
+                  "engine": "object",
+                  "precision": "double"}
+    parameters["GovernmentDelay"] = parameters["hazard_triggered"] + 2
+    parameters["GovernmentStop"] = parameters["GovernmentDelay"] + 50
+    parameters["MediaReportingIntensity"] = (parameters["num_affected"] /
+                                      float(parameters["num_nodes"])) * 2
+    return parameters
+
+#==============================================================================
+# Running replicates
+#==============================================================================
+
+def run_replicate(parameters, seed = None, common_random_numbers = False,
+                  tracker = None):
+    """
+    Overview
+    ---------------
+    Runs a single replicate of a scenario: creates a new Barabasi-Albert
+    network and runs the simulation on it for num_ticks ticks. If the 
+    parameter engine is "array", the network is a CompactNetwork and the
+    simulation an ArraySimulation, with a SinglePrecisionPopulation if
+    the parameter precision is "single"; if it is "sequential", the
+    simulation is a SequentialSimulation on the same arrays. The array
+    engine updates all agents synchronously, so its results are not 
+    comparable with those of the object engine (see ArraySimulation);
+    the sequential engine keeps the update order of the object engine
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    seed: seeds both random and numpy.random so that replicates are
+          reproducible and differ between worker processes; replicates
+          run with the same seed return identical results with every
+          engine, see test_replicate_runner.py
+    common_random_numbers: draws all random numbers from a RandomStreams
+          instance created from seed instead, so that replicates of
+          different scenarios with the same seed share their network,
+          population and random decisions, see crn_comparison(); for
+          the array engines see ArraySimulation.init_streams()
+    tracker: optional MemoryTracker that records the phases network,
+          population, ticks, recording and analysis of the run; in the
+          object-based engine the agents are created with the network
+
+    Output
+    ---------------
+    Dictionary of recorded data as returned by SystemState.return_data(),
+    including SystemState.return_distribution() if the parameter 
+    num_rp_bins is set and SystemState.return_network_metrics() if the
+    parameter network_metrics is True; if the parameter agent_records is
+    True the end-of-run state of all agents as returned by 
+    Simulation.report_agents() is included under the key agents
+    """
+    def phase(name):
+        if tracker is not None:
+            tracker.set_phase(name)
+
+    streams = RandomStreams(seed) if common_random_numbers else None
+    phase("network")
+    engine = parameters.get("engine", "object")
+    if engine in ["array", "sequential"]:
+        if parameters.get("precision", "double") == "single":
+            PopulationClass = SinglePrecisionPopulation
+        else:
+            PopulationClass = AgentPopulation
+        network_seed, simulation_seed = (None, None) if seed is None else \
+                                        draw_seeds(2, seed)
+        if streams is not None:
+            network_seed = streams.seeds["network"]
+        # the population is created separately from its seed, so that
+        # both phases can be told apart
+        network, population_seed = barabasi_albert_arrays(
+                                       None, parameters["num_nodes"],
+                                       parameters["num_edges"], network_seed)
+        if streams is not None:
+            population_seed = streams.seeds["population"]
+        phase("population")
+        population = PopulationClass(parameters["num_nodes"],
+                                     population_seed)
+        if engine == "sequential":
+            Sim = SequentialSimulation(simulation_seed)
+        else:
+            Sim = ArraySimulation(simulation_seed)
+        Sim.init_network(network, population)
+        if streams is not None:
+            Sim.init_streams(streams)
+    else:
+        if streams is not None:
+            streams.seed_population()
+        elif seed is not None:
+            rnd.seed(seed)
+            np.random.seed(seed)
+
+        social_network = barabasi_albert(Agent, parameters["num_nodes"],
+                                          parameters["num_edges"],
+                                          None if streams is None else
+                                          streams.network)
+        phase("population")
+        for node in social_network.nodes():
+            node.init_neighbors(social_network)
+
+        Sim = Simulation()
+        Sim.init_network(social_network)
+        if streams is not None:
+            Sim.init_streams(streams)
+
+    SimState = SystemState()
+    if parameters.get("num_rp_bins"):
+        SimState.init_distribution(parameters["num_rp_bins"])
+    if parameters.get("network_metrics", False):
+        sources, targets = Sim.network_edges()
+        SimState.init_network_metrics(sources, targets,
+                                      parameters["num_nodes"])
+    if SimState.needs_rp_array():
+        Sim.init_rp_report()
+    Sim.init_institutions(Media, Government,
+                          parameters["GovernmentMultiplier"],
+                          Hazard, parameters["HazardName"],
+                          parameters["HazardMultiplier"])
+    Sim.init_parameters(parameters["num_ticks"],
+                        parameters["hazard_triggered"],
+                        parameters["num_affected"],
+                        parameters["MediaDelay"],
+                        parameters["MediaMultiplier"],
+                        parameters["MediaReportingIntensity"],
+                        parameters["GovernmentStop"],
+                        parameters["GovernmentDelay"],
+                        False)
+    if parameters.get("converge", False):
+        Sim.init_convergence(parameters["ConvergenceTolerance"],
+                             parameters["ConvergenceTicks"])
+
+    phase("ticks")
+    for state in Sim.run():
+        phase("recording")
+        SimState.record_data(state)
+        phase("ticks")
+    phase("analysis")
+    SimState.carry_forward(parameters["num_ticks"] + 1)
+
+    data = SimState.return_data()
+    if parameters.get("num_rp_bins"):
+        data.update(SimState.return_distribution())
+    if parameters.get("network_metrics", False):
+        data.update(SimState.return_network_metrics())
+    if parameters.get("agent_records", False):
+        data["agents"] = Sim.report_agents()
+    if tracker is not None:
+        tracker.end_phase()
+    return data
+
+def _run_replicate_args(args):
+    """
+    Unpacks a (parameters, seed) or (parameters, seed, 
+    common_random_numbers) tuple, needed by multiprocessing.Pool.map
+    """
+    return run_replicate(*args)
+
+def draw_seeds(num_seeds, seed = None):
+    """
+    Returns a list of num_seeds seeds for replicates; reproducible if a
+    seed is given
+    """
+    generator = rnd.Random(seed)
+    return [generator.randint(0, 2**31 - 1) for i in range(num_seeds)]
+
+def run_replicates(parameters, seeds, processes = 1):
+    """
+    Overview
+    ---------------
+    Runs one replicate of the scenario per seed, in parallel if
+    processes > 1
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    seeds: list of seeds, one per replicate, see draw_seeds()
+    processes: number of worker processes
+
+    Output
+    ---------------
+    List of dictionaries as returned by SystemState.return_data()
+    """
+    return run_jobs([(parameters, seed) for seed in seeds], processes)
+
+def run_jobs(jobs, processes = 1):
+    """
+    Overview
+    ---------------
+    Runs a list of replicates, possibly of different scenarios, in 
+    parallel if processes > 1
+
+    Input
+    ---------------
+    jobs: list of (parameters, seed) or (parameters, seed, 
+          common_random_numbers) tuples, see run_replicate()
+    processes: number of worker processes
+
+    Output
+    ---------------
+    List of dictionaries as returned by SystemState.return_data(), in the
+    order of the jobs
+    """
+    if processes > 1 and len(jobs) > 1:
+        pool = mp.Pool(processes)
+        try:
+            results = pool.map(_run_replicate_args, jobs)
+        finally:
+            pool.close()
+            pool.join()
+        return results
+    return [_run_replicate_args(job) for job in jobs]
+
+def mean_results(runs):
+    """
+    Returns dictionary with the per-tick mean of every variable over a
+    list of runs as returned by run_replicates()
+    """
+    return dict((var, np.mean([run[var] for run in runs], axis = 0))
+                for var in variables)
+
+def save_mean_results(mean_dict, filename = "mean_results.csv"):
+    """
+    Saves per-tick means in the format read by plot_avg_results.py, i.e.
+    one line per variable in the order of SystemState.save_data(), or as
+    binary numpy file with one array per variable if filename ends with
+    .npz
+    """
+    if filename.endswith(".npz"):
+        np.savez(filename, **dict((var, np.asarray(mean_dict[var]))
+                                  for var in variables))
+        return
+    outfile = open(filename, "w")
+    for var in variables:
+        outfile.write(', '.join(str(i) for i in mean_dict[var]) + '\n')
+    outfile.close()
+
+def load_mean_results(filename = "mean_results.csv"):
+    """
+    Reads per-tick means saved by save_mean_results() and returns them as
+    dictionary of arrays
+    """
+    if filename.endswith(".npz"):
+        data = np.load(filename)
+        return dict((var, data[var]) for var in variables)
+    infile = open(filename, "r")
+    lines = [line for line in infile if line.strip()]
+    infile.close()
+    return dict((var, np.array([float(i) for i in line.split(',')]))
+                for var, line in zip(variables, lines))
+
+#==============================================================================
+# Adaptive number of replicates
+#==============================================================================
+
+def default_target_widths(parameters):
+    """
+    Default targets for the width of the confidence intervals: .05 on the
+    risk perception scale for avg_rp and 2% of the population for the
+    numbers of red and orange agents
+    """
+    return {"avg_rp": .05,
+            "red": .02 * parameters["num_nodes"],
+            "orange": .02 * parameters["num_nodes"]}
+
+def ci_widths(runs, target_vars, z_value = 1.96):
+    """
+    Overview
+    ---------------
+    Computes the widths of the normal approximation confidence intervals
+    of the per-tick means over a list of runs
+
+    Input
+    ---------------
+    runs: list of dictionaries as returned by run_replicates()
+    target_vars: variables for which widths are computed
+    z_value: quantile of the standard normal distribution, 1.96 for 95%
+
+    Output
+    ---------------
+    Dictionary with the largest width over all ticks for each variable
+    """
+    widths = {}
+    for var in target_vars:
+        data = np.array([run[var] for run in runs], dtype = float)
+        if len(runs) < 2:
+            widths[var] = np.inf
+        else:
+            sd = data.std(axis = 0, ddof = 1)
+            widths[var] = np.max(2 * z_value * sd / np.sqrt(len(runs)))
+    return widths
+
+def adaptive_replicates(parameters, target_widths = None, min_runs = 10,
+                        max_runs = 200, batch_size = None, z_value = 1.96,
+                        processes = 1, seed = None, verbose = False):
+    """
+    Overview
+    ---------------
+    Sequential Monte Carlo controller: keeps running batches of replicates
+    of a scenario until the confidence intervals of the per-tick means of
+    all target variables are narrower than their target widths, or until
+    max_runs replicates have been run
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    target_widths: dictionary with the target CI width of each variable,
+                   defaults to default_target_widths(parameters)
+    min_runs: number of replicates run before the first check
+    max_runs: largest number of replicates run for the scenario
+    batch_size: replicates run between two checks, defaults to the number
+                of processes
+    z_value: quantile of the standard normal distribution, 1.96 for 95%
+    processes: number of worker processes
+    seed: makes the sequence of replicate seeds reproducible
+
+    Output
+    ---------------
+    Dictionary with the runs, the per-tick means, the final CI widths,
+    the number of runs needed and whether the targets were reached
+    """
+    if target_widths is None:
+        target_widths = default_target_widths(parameters)
+    if batch_size is None:
+        batch_size = max(processes, 1)
+
+    seeds = draw_seeds(max_runs, seed)
+    runs = run_replicates(parameters, seeds[:min(min_runs, max_runs)],
+                          processes)
+
+    while True:
+        widths = ci_widths(runs, target_widths.keys(), z_value)
+        converged = all(widths[var] < target_widths[var]
+                        for var in target_widths)
+        if verbose:
+            print "%s runs, CI widths: %s" % (len(runs), widths)
+        if converged or len(runs) >= max_runs:
+            break
+        next_seeds = seeds[len(runs):len(runs) + batch_size]
+        runs.extend(run_replicates(parameters, next_seeds, processes))
+
+    return {"runs": runs,
+            "mean": mean_results(runs),
+            "ci_widths": widths,
+            "num_runs": len(runs),
+            "converged": converged}
+
+def adaptive_sweep(scenarios, target_widths = None, min_runs = 10,
+                   max_runs = 200, batch_size = None, z_value = 1.96,
+                   processes = 1, seed = None,
+                   report_file = "replicate_report.csv"):
+    """
+    Overview
+    ---------------
+    Runs adaptive_replicates() for every scenario and writes a report with
+    the number of runs each scenario needed
+
+    Input
+    ---------------
+    scenarios: dictionary mapping scenario names to parameter dictionaries
+    report_file: name of the report file, None if no report is written;
+                 the other arguments are passed to adaptive_replicates()
+
+    Output
+    ---------------
+    Dictionary mapping scenario names to adaptive_replicates() results
+    """
+    results = {}
+    for index, name in enumerate(sorted(scenarios)):
+        scenario_seed = None if seed is None else seed + index
+        results[name] = adaptive_replicates(scenarios[name], target_widths,
+                                            min_runs, max_runs, batch_size,
+                                            z_value, processes,
+                                            scenario_seed)
+
+    if report_file is not None and results:
+        outfile = open(report_file, "w")
+        target_vars = sorted(results[sorted(results)[0]]["ci_widths"])
+        outfile.write(', '.join(["scenario", "num_runs", "converged"] +
+                      ["ci_width_%s" % var for var in target_vars]) + '\n')
+        for name in sorted(results):
+            outfile.write(', '.join([str(name),
+                          str(results[name]["num_runs"]),
+                          str(results[name]["converged"])] +
+                          [str(results[name]["ci_widths"][var])
+                           for var in target_vars]) + '\n')
+        outfile.close()
+
+    return results
+
+#==============================================================================
+# Common random numbers
+#==============================================================================
+
+def crn_comparison(parameters_a, parameters_b, num_pairs = 50,
+                   target_vars = ["avg_rp", "red", "orange"], processes = 1,
+                   seed = None, report_file = "crn_report.csv"):
+    """
+    Overview
+    ---------------
+    Estimates the per-tick difference between two scenarios (b - a) with
+    common random numbers, i.e. from pairs of replicates run with the
+    same seed, and reports the variance reduction compared to pairs of
+    independent replicates; a variance reduction of 10 means that 10
+    times as many independent pairs would be needed for the same
+    precision
+
+    Input
+    ---------------
+    parameters_a: dictionary of scenario parameters, see 
+                  default_parameters()
+    parameters_b: dictionary of scenario parameters of the scenario 
+                  compared to parameters_a
+    num_pairs: number of pairs of replicates
+    target_vars: variables for which the difference is estimated
+    processes: number of worker processes
+    seed: makes the seeds of the replicates reproducible
+    report_file: name of the report file, None if no report is written
+
+    Output
+    ---------------
+    Dictionary with one dictionary per variable containing the per-tick
+    mean difference and its standard error with common random numbers,
+    the variances of the differences with common random numbers and 
+    with independent pairs (summed over all ticks) and the variance
+    reduction
+    """
+    seeds = draw_seeds(2 * num_pairs, seed)
+    jobs = [(parameters_a, s, True) for s in seeds[:num_pairs]] + \
+           [(parameters_b, s, True) for s in seeds[:num_pairs]] + \
+           [(parameters_b, s, True) for s in seeds[num_pairs:]]
+    runs = run_jobs(jobs, processes)
+    runs_a = runs[:num_pairs]
+    runs_b = runs[num_pairs:2 * num_pairs]
+    runs_b_independent = runs[2 * num_pairs:]
+
+    results = {}
+    for var in target_vars:
+        data_a = np.array([run[var] for run in runs_a], dtype = float)
+        diff = np.array([run[var] for run in runs_b],
+                        dtype = float) - data_a
+        diff_independent = np.array([run[var] for run in runs_b_independent],
+                                    dtype = float) - data_a
+        var_crn = diff.var(axis = 0, ddof = 1).sum()
+        var_independent = diff_independent.var(axis = 0, ddof = 1).sum()
+        results[var] = {"mean_difference": diff.mean(axis = 0),
+                        "standard_error": diff.std(axis = 0, ddof = 1) /
+                                          np.sqrt(num_pairs),
+                        "variance_crn": var_crn,
+                        "variance_independent": var_independent,
+                        "variance_reduction": var_independent / var_crn
+                                              if var_crn > 0 else np.inf}
+
+    if report_file is not None:
+        outfile = open(report_file, "w")
+        outfile.write("variable, final_mean_difference, final_standard_error"
+                      ", variance_crn, variance_independent, "
+                      "variance_reduction\n")
+        for var in target_vars:
+            outfile.write(', '.join([var] + [str(value) for value in
+                          [results[var]["mean_difference"][-1],
+                           results[var]["standard_error"][-1],
+                           results[var]["variance_crn"],
+                           results[var]["variance_independent"],
+                           results[var]["variance_reduction"]]]) + '\n')
+        outfile.close()
+
+    return results
+
+#==============================================================================
+# Numeric precision
+#==============================================================================
+
+def default_precision_tolerances(parameters):
+    """
+    Default tolerances for the per-tick means of single precision runs:
+    .01 on the risk perception scale for avg_rp and 1% of the population
+    for the numbers of agents of each color
+    """
+    tolerances = dict((var, .01 * parameters["num_nodes"])
+                      for var in ["green", "yellow", "orange", "red"])
+    tolerances["avg_rp"] = .01
+    return tolerances
+
+def precision_memory(parameters, precision, seed = None):
+    """
+    Overview
+    ---------------
+    Creates the network and population of a scenario for the array
+    engine and returns the estimated and actual number of bytes per agent
+    of the population, with the counters narrowed as in a run, and the
+    number of bytes per agent of the network
+    """
+    if precision == "single":
+        PopulationClass = SinglePrecisionPopulation
+    else:
+        PopulationClass = AgentPopulation
+    network, population = barabasi_albert_arrays(PopulationClass,
+                                                 parameters["num_nodes"],
+                                                 parameters["num_edges"],
+                                                 seed)
+    population.fit_counters(int(network.degree().max()),
+                            parameters["num_ticks"])
+    return {"estimated": population.estimate_bytes_per_agent(),
+            "actual": population.bytes_per_agent(),
+            "network": network.nbytes() / float(parameters["num_nodes"])}
+
+def validate_precision(parameters, num_runs = 20, tolerances = None,
+                       processes = 1, seed = None, verbose = False):
+    """
+    Overview
+    ---------------
+    Runs replicates of a scenario with the array engine in double and in
+    single precision (same seeds, hence same networks and initial
+    populations) and checks that the per-tick means of the output 
+    variables agree within tolerances; also reports the memory needed
+    per agent in both precisions
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    num_runs: number of replicates per precision
+    tolerances: dictionary with the largest allowed difference of the 
+                per-tick means of each variable, defaults to 
+                default_precision_tolerances(parameters)
+    processes: number of worker processes
+    seed: makes the seeds of the replicates reproducible
+
+    Output
+    ---------------
+    Dictionary with the largest differences of the per-tick means, the
+    tolerances, whether all differences are within them and the bytes
+    per agent of both precisions
+    """
+    if tolerances is None:
+        tolerances = default_precision_tolerances(parameters)
+    double = dict(parameters, engine = "array", precision = "double")
+    single = dict(parameters, engine = "array", precision = "single")
+    seeds = draw_seeds(num_runs, seed)
+    runs = run_jobs([(double, s) for s in seeds] +
+                    [(single, s) for s in seeds], processes)
+    mean_double = mean_results(runs[:num_runs])
+    mean_single = mean_results(runs[num_runs:])
+
+    differences = dict((var, np.max(np.abs(mean_single[var] -
+                                           mean_double[var])))
+                       for var in variables)
+    passed = all(differences[var] <= tolerances[var] for var in tolerances)
+    memory = dict((precision, precision_memory(parameters, precision, seed))
+                  for precision in ["double", "single"])
+    if verbose:
+        for var in sorted(tolerances):
+            print "%s: largest difference %s, tolerance %s" % (var, 
+                  differences[var], tolerances[var])
+        for precision in ["double", "single"]:
+            print "%s precision: %.1f bytes per agent estimated, %.1f " \
+                  "actual, %.1f for the network" % (precision, 
+                  memory[precision]["estimated"], 
+                  memory[precision]["actual"],
+                  memory[precision]["network"])
+    return {"max_difference": differences,
+            "tolerances": tolerances,
+            "passed": passed,
+            "bytes_per_agent": memory}
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import json
+import warnings
+import numpy as np
+import multiprocessing as mp
+from replicate_runner import *
+from memory_class_def import *
+
+#==============================================================================
+# Memory accounting
+#==============================================================================
+
+def profile_replicate(parameters, seed = None, use_tracemalloc = False):
+    """
+    Overview
+    ---------------
+    Runs a single replicate of a scenario with a MemoryTracker and
+    returns peak memory and time of its phases
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    seed: seed of the replicate, see run_replicate()
+    use_tracemalloc: see MemoryTracker
+
+    Output
+    ---------------
+    Dictionary with the report of the MemoryTracker (phases), the peak
+    resident set size in bytes (peak) and the time of the whole run in
+    seconds (seconds)
+    """
+    tracker = MemoryTracker(use_tracemalloc = use_tracemalloc)
+    run_replicate(parameters, seed, tracker = tracker)
+    tracker.stop()
+    phases = tracker.report()
+    return {"phases": phases,
+            "peak": tracker.peak(),
+            "seconds": sum(phase["seconds"] for name, phase in phases)}
+
+def _profile_replicate_args(args):
+    """
+    Unpacks a (parameters, seed) tuple, needed by multiprocessing.Pool.map
+    """
+    return profile_replicate(*args)
+
+def profile_replicates(configurations, seed = None, processes = 1):
+    """
+    Profiles one replicate per configuration, every one in a new worker
+    process so that the peak memory of one run does not hide the peak of
+    the next
+    """
+    seeds = draw_seeds(len(configurations), seed)
+    pool = mp.Pool(processes, maxtasksperchild = 1)
+    try:
+        results = pool.map(_profile_replicate_args,
+                           list(zip(configurations, seeds)), chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def save_memory_report(profile, filename = "memory_report.csv"):
+    """
+    Writes the phases of a profile returned by profile_replicate() to
+    file, one line per phase, memory in megabytes
+    """
+    outfile = open(filename, "w")
+    outfile.write("phase, seconds, rss_start_mb, rss_end_mb, rss_peak_mb, "
+                  "traced_peak_mb\n")
+    for name, phase in profile["phases"]:
+        values = [phase["seconds"]] + \
+                 [None if phase[key] is None else phase[key] / 1e6
+                  for key in ["rss_start", "rss_end", "rss_peak",
+                              "traced_peak"]]
+        outfile.write(', '.join([name] + [str(value) for value in values])
+                      + '\n')
+    outfile.close()
+
+#==============================================================================
+# Pre-run resource estimator
+#==============================================================================
+
+def model_key(parameters):
+    """
+    Returns the name of the engine a scenario runs on; memory and time
+    are modelled separately for every engine
+    """
+    engine = parameters.get("engine", "object")
+    if engine in ["array", "sequential"]:
+        return "%s_%s" % (engine, parameters.get("precision", "double"))
+    return "object"
+
+def memory_features(parameters):
+    """
+    Features of the linear memory model: constant, number of agents,
+    number of edges and number of ticks, since the recorded data grows
+    with every tick
+    """
+    n = float(parameters["num_nodes"])
+    return [1., n, n * parameters["num_edges"], parameters["num_ticks"]]
+
+def setup_features(parameters):
+    """
+    Features of the linear model of the time spent outside the ticks,
+    mostly creating network and population: constant, number of agents
+    and number of edges
+    """
+    n = float(parameters["num_nodes"])
+    return [1., n, n * parameters["num_edges"]]
+
+def tick_features(parameters):
+    """
+    Features of the linear model of the time per tick: constant, number
+    of agents and number of edges, and for the object-based engine the 
+    squared number of agents, since Simulation.tick() removes every 
+    activated agent from a list of all agents
+    """
+    n = float(parameters["num_nodes"])
+    features = [1., n, n * parameters["num_edges"]]
+    if model_key(parameters) == "object":
+        features.append(n * n)
+    return features
+
+def default_calibration(engine = "object", precision = "double"):
+    """
+    Returns the scenarios run to calibrate the estimator: the default
+    scenario on networks of different sizes and densities and for
+    different numbers of ticks; larger networks for the array engines.
+    Estimates are only reliable within the range of these scenarios, see
+    estimate_resources()
+    """
+    if engine == "array":
+        sizes = [10000, 25000, 50000, 100000, 200000]
+    elif engine == "sequential":
+        sizes = [2500, 5000, 10000, 20000, 40000]
+    else:
+        sizes = [100, 250, 500, 1000, 2000]
+    configurations = []
+    for num_nodes in sizes:
+        for num_edges in [2, 4]:
+            for num_ticks in [10, 50]:
+                parameters = default_parameters()
+                parameters.update({"num_nodes": num_nodes,
+                                   "num_edges": num_edges,
+                                   "num_ticks": num_ticks,
+                                   "num_affected": num_nodes // 5,
+                                   "engine": engine,
+                                   "precision": precision})
+                configurations.append(parameters)
+    return configurations
+
+def least_squares(X, y):
+    """
+    Returns the coefficients of the linear model of y on the columns of X
+    with the smallest sum of squared relative errors, so that small 
+    scenarios are predicted as well as large ones; the columns are scaled
+    first since the features differ by many orders of magnitude
+    """
+    # relative to tiny values if a time or memory could not be measured
+    y = np.maximum(np.asarray(y, dtype = float), 1e-9)
+    X = np.asarray(X, dtype = float) / y[:, None]
+    scale = np.abs(X).max(axis = 0)
+    scale[scale == 0] = 1
+    return np.linalg.lstsq(X / scale, np.ones(len(X)), 
+                           rcond = -1)[0] / scale
+
+def fit_resource_model(configurations, profiles):
+    """
+    Overview
+    ---------------
+    Fits, per engine, linear models of peak memory, of the time outside
+    the ticks and of the time per tick to the profiles of calibration 
+    runs; the time per tick is the time of the phases ticks and 
+    recording divided by the number of ticks
+
+    Input
+    ---------------
+    configurations: list of scenario parameter dictionaries
+    profiles: list of the profiles of their replicates, as returned by
+              profile_replicate()
+
+    Output
+    ---------------
+    Dictionary mapping engine names to the coefficients of the models,
+    the smallest peak memory and times seen in the calibration runs, 
+    which are the smallest values ever estimated, the range of num_nodes,
+    num_edges and num_ticks the models were fitted on and their largest
+    relative errors on the calibration runs
+    """
+    model = {}
+    for key in sorted(set(model_key(p) for p in configurations)):
+        runs = [(p, dict(profile["phases"]), profile["peak"]) for p, profile
+                in zip(configurations, profiles) if model_key(p) == key]
+        ticks = np.array([p["num_ticks"] for p, phases, peak in runs],
+                         dtype = float)
+        tick_seconds = np.array([sum(phases[name]["seconds"] for name in
+                                     ["ticks", "recording"] 
+                                     if name in phases)
+                                 for p, phases, peak in runs]) / ticks
+        setup_seconds = np.array([sum(phase["seconds"] for name, phase in
+                                      phases.items() if name not in
+                                      ["ticks", "recording"])
+                                  for p, phases, peak in runs])
+        memory = np.array([peak for p, phases, peak in runs], dtype = float)
+        X_memory = np.array([memory_features(p) for p, phases, peak in runs])
+        X_setup = np.array([setup_features(p) for p, phases, peak in runs])
+        X_tick = np.array([tick_features(p) for p, phases, peak in runs])
+        memory_coef = least_squares(X_memory, memory)
+        setup_coef = least_squares(X_setup, setup_seconds)
+        tick_coef = least_squares(X_tick, tick_seconds)
+        seconds = setup_seconds + ticks * tick_seconds
+        predicted_seconds = np.maximum(X_setup.dot(setup_coef), 
+                                       setup_seconds.min()) + \
+                            ticks * np.maximum(X_tick.dot(tick_coef),
+                                               tick_seconds.min())
+        model[key] = {"memory": memory_coef.tolist(),
+                      "setup_time": setup_coef.tolist(),
+                      "tick_time": tick_coef.tolist(),
+                      "min_memory": float(memory.min()),
+                      "min_setup_time": float(setup_seconds.min()),
+                      "min_tick_time": float(tick_seconds.min()),
+                      "range": dict((name, [min(p[name] for p, phases, 
+                                                peak in runs),
+                                            max(p[name] for p, phases, 
+                                                peak in runs)])
+                                    for name in ["num_nodes", "num_edges",
+                                                 "num_ticks"]),
+                      "memory_error": float(np.max(np.abs(np.maximum(
+                          X_memory.dot(memory_coef), memory.min()) - 
+                          memory) / memory)),
+                      "time_error": float(np.max(np.abs(
+                          predicted_seconds - seconds) / seconds))}
+    return model
+
+def calibrate_estimator(configurations = None, seed = None, processes = 1,
+                        model_file = "resource_model.json",
+                        verbose = False):
+    """
+    Overview
+    ---------------
+    Profiles one replicate per configuration and fits the models used by
+    estimate_resources(), see fit_resource_model()
+
+    Input
+    ---------------
+    configurations: list of scenario parameter dictionaries, defaults to
+                    default_calibration() of the object-based engine and
+                    of the array and sequential engines in both
+                    precisions
+    seed: makes the seeds of the replicates reproducible
+    processes: number of worker processes; run times are only comparable
+               if the workers do not compete for cores
+    model_file: name of the JSON file the model is saved to, None if the
+                model is not saved
+
+    Output
+    ---------------
+    Dictionary returned by fit_resource_model()
+    """
+    if configurations is None:
+        configurations = default_calibration("object") + \
+                         default_calibration("array", "double") + \
+                         default_calibration("array", "single") + \
+                         default_calibration("sequential", "double") + \
+                         default_calibration("sequential", "single")
+    profiles = profile_replicates(configurations, seed, processes)
+    model = fit_resource_model(configurations, profiles)
+    if verbose:
+        for key in sorted(model):
+            print "%s: largest relative error %.2f (memory), %.2f " \
+                  "(time)" % (key, model[key]["memory_error"],
+                              model[key]["time_error"])
+
+    if model_file is not None:
+        outfile = open(model_file, "w")
+        json.dump(model, outfile, indent = 1)
+        outfile.close()
+    return model
+
+def load_resource_model(model_file = "resource_model.json"):
+    """
+    Reads a model saved by calibrate_estimator()
+    """
+    infile = open(model_file, "r")
+    model = json.load(infile)
+    infile.close()
+    return model
+
+def recording_memory(parameters, trajectories = False):
+    """
+    Returns the bytes of the arrays of the optional recorders, which are
+    known from the scenario: the risk perceptions reported every tick if
+    any recorder needs them, histogram, quantiles and variance per tick
+    and two temporary arrays per agent for the distribution, two index
+    arrays per edge and four temporary arrays per edge for the network
+    metrics, one record per agent (see agent_record_dtype) and the 
+    buffered and compressed chunk of a TrajectoryWriter with default 
+    chunks of 16 ticks of 2-byte levels
+    """
+    n = parameters["num_nodes"]
+    edges = n * parameters["num_edges"]
+    num_bins = parameters.get("num_rp_bins")
+    network_metrics = parameters.get("network_metrics", False)
+    memory = 0
+    if num_bins or network_metrics or trajectories:
+        memory += 8 * n
+    if num_bins:
+        # histogram, five quantiles and variance
+        memory += 8 * (num_bins + 6) * (parameters["num_ticks"] + 1) + \
+                  2 * 8 * n
+    if network_metrics:
+        memory += (2 * np.dtype(np.intp).itemsize + 4 * 8) * edges
+    if parameters.get("agent_records", False):
+        memory += agent_record_dtype.itemsize * n
+    if trajectories:
+        memory += 2 * 16 * 2 * n
+    return memory
+
+def estimate_resources(parameters, model, trajectories = False, 
+                       strict = False):
+    """
+    Overview
+    ---------------
+    Predicts peak memory and run time of a replicate of a scenario before
+    running it: the time outside the ticks plus num_ticks times the time
+    per tick, the fitted peak memory plus recording_memory(). Estimates
+    never fall below the smallest memory and times seen in the
+    calibration runs. The linear models are only valid within the range
+    of num_nodes, num_edges and num_ticks they were calibrated on;
+    outside of it a warning is issued
+
+    Input
+    ---------------
+    parameters: dictionary of scenario parameters, see default_parameters()
+    model: dictionary returned by calibrate_estimator()
+    trajectories: True if a TrajectoryWriter records the run, as in 
+                  run_sim.py
+    strict: raises a ValueError instead of warning outside the
+            calibration range
+
+    Output
+    ---------------
+    Dictionary with the predicted peak resident set size in bytes
+    (memory), run time in seconds (seconds) and whether the scenario is
+    within the calibration range (in_range)
+    """
+    key = model_key(parameters)
+    coefficients = model[key]
+    outside = ["%s = %s not in %s" % (name, parameters[name], 
+                                      coefficients["range"][name])
+               for name in sorted(coefficients["range"])
+               if not coefficients["range"][name][0] <= parameters[name] <=
+                      coefficients["range"][name][1]]
+    if outside:
+        message = "scenario outside the calibration range of the %s " \
+                  "model, estimates are extrapolated: %s" % \
+                  (key, ", ".join(outside))
+        if strict:
+            raise ValueError(message)
+        warnings.warn(message)
+
+    memory = max(np.dot(coefficients["memory"], 
+                        memory_features(parameters)),
+                 coefficients["min_memory"])
+    memory += recording_memory(parameters, trajectories)
+    setup = max(np.dot(coefficients["setup_time"], 
+                       setup_features(parameters)),
+                coefficients["min_setup_time"])
+    per_tick = max(np.dot(coefficients["tick_time"], 
+                          tick_features(parameters)),
+                   coefficients["min_tick_time"])
+    return {"memory": float(memory),
+            "seconds": float(setup + parameters["num_ticks"] * per_tick),
+            "in_range": not outside}
+
+def max_processes(parameters, memory_limit, model, safety = 1.2):
+    """
+    Returns the number of replicates of a scenario that can run in
+    parallel on a worker with memory_limit bytes of RAM, keeping a safety
+    margin on the estimated peak memory of each replicate
+    """
+    # at least the smallest peak memory seen in the calibration runs
+    memory = estimate_resources(parameters, model)["memory"] * safety
+    return max(int(memory_limit // memory), 0)
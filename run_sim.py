@@ -8,10 +8,14 @@ import random as rnd
 import networkx as nx
 import matplotlib as mpl
 import sys
+import os
+import shutil
 from system_class_def import *
 from agent_class_def import *
 from function_def import *
 from network_analysis import *
+from publisher_class_def import *
+from trajectory_class_def import *
 
 #==============================================================================
 # Parameters
@@ -48,6 +52,37 @@ MediaMultiplier = 1.2
 MediaDelay = 2
 MediaReportingIntensity = (num_affected/float(num_nodes))*2
 
+# early termination once the run has reached a steady state; remaining
+# ticks are filled with the steady state so output keeps num_ticks+1 entries
+converge = False
+ConvergenceTolerance = 1e-4
+ConvergenceTicks = 5
+
+# records histogram, quantiles and variance of risk perceptions per tick
+record_distribution = False
+num_rp_bins = 40
+
+# records mean neighbour risk perception, differences in risk perception
+# along edges, agreement of colors along edges and color assortativity
+record_network_metrics = False
+
+# appends degree, risk signals sent and received, original and final risk
+# perception and media consumption of every agent after every run to
+# the directory AgentDir, one file per column, see read_agent_records()
+export_agents = False
+AgentDir = "agents"
+
+# stores the risk perceptions of all agents at every tick of every run in
+# TrajectoryFile, quantized to TrajectoryResolution, see TrajectoryReader
+record_trajectories = False
+TrajectoryFile = "trajectories.traj"
+TrajectoryResolution = .001
+
+# sends the report of every tick to a monitoring process listening on
+# PublisherAddress, see listen_metrics()
+publish_metrics = False
+PublisherAddress = ("127.0.0.1", 9999)
+
 #==============================================================================
 # Simulation
 #==============================================================================
@@ -59,6 +94,12 @@ MediaReportingIntensity = (num_affected/float(num_nodes))*2
 #for node in social_network.nodes():
 #    node.init_neighbors(social_network)
 
+# records of earlier simulations would be mixed up with the new runs
+if export_agents and os.path.isdir(AgentDir):
+    shutil.rmtree(AgentDir)
+
+if record_trajectories:
+    Trajectories = TrajectoryWriter(TrajectoryFile, TrajectoryResolution)
 
 for run in range(num_runs):
     
@@ -71,10 +112,20 @@ for run in range(num_runs):
 #    Euclidean distance matrix of differences in risk perceptions
 #    network_analysis(social_network, "before")    
     
+    # the object-based engine; ArraySimulation runs larger networks but
+    # updates all agents synchronously, so its results are not comparable
+    # with the ones of this script, use SequentialSimulation instead
     Sim = Simulation()
     SimState = SystemState()
+    if record_distribution:
+        SimState.init_distribution(num_rp_bins)
     
     Sim.init_network(social_network)
+    if record_network_metrics:
+        sources, targets = Sim.network_edges()
+        SimState.init_network_metrics(sources, targets, num_nodes)
+    if SimState.needs_rp_array() or record_trajectories:
+        Sim.init_rp_report()
     Sim.init_institutions(Media, Government, GovernmentMultiplier,
                           Hazard, HazardName, HazardMultiplier)
     Sim.init_parameters(num_ticks, hazard_triggered, num_affected,
@@ -82,26 +133,48 @@ for run in range(num_runs):
                         MediaReportingIntensity, GovernmentStop,
                         GovernmentDelay, 
                         False)
+    if converge:
+        Sim.init_convergence(ConvergenceTolerance, ConvergenceTicks)
     
-    # record data at beginning of run before any tick behaviour 
-    SimState.record_data(Sim.report_state())
+    if publish_metrics:
+        Publisher = MetricPublisher(PublisherAddress)
+    else:
+        Publisher = None
     
-    for tick in range(num_ticks):
-        Sim.tick(tick)
-        SimState.record_data(Sim.report_state())
+    # records data at beginning of run before any tick behaviour and
+    # after every tick
+    if record_trajectories:
+        Trajectories.start_run(run, num_nodes)
+    for state in Sim.run(Publisher):
+        SimState.record_data(state)
+        if record_trajectories:
+            Trajectories.add(state["rp_array"])
+    SimState.carry_forward(num_ticks + 1)
+    if record_trajectories:
+        Trajectories.end_run(num_ticks + 1)
+    if Publisher is not None:
+        Publisher.close()
     
     # after each run, save data to file named according to run number
     SimState.save_data("%s" % run)
+    if record_distribution:
+        SimState.save_distribution("%s" % run)
+    if record_network_metrics:
+        SimState.save_network_metrics("%s" % run)
+    if export_agents:
+        append_agent_records(AgentDir, run, Sim.report_agents())
     
     if num_runs > 1:
         for node in social_network.nodes():
             node.re_initialise()
-    else:
-        d = Sim.report_rs_sent_received()
+#    else:
 #        uncomment below code to record Euclidean distance data after
 #        a simulation run
 #        network_analysis(social_network, "after")
 
+if record_trajectories:
+    Trajectories.close()
+
 # Saving the parameters of the current scenario
 with open("scenario_parameters.txt", "w") as outfile:
     outfile.write("num_nodes: %s" % num_nodes + '\n')
@@ -118,4 +191,13 @@ with open("scenario_parameters.txt", "w") as outfile:
     outfile.write("MediaMultiplier: %s" % MediaMultiplier + '\n')
     outfile.write("MediaDelay: %s" % MediaDelay +  '\n')
     outfile.write("MediaReportingIntensity: %s" % MediaReportingIntensity + '\n')
+    outfile.write("converge: %s" % converge + '\n')
+    outfile.write("ConvergenceTolerance: %s" % ConvergenceTolerance + '\n')
+    outfile.write("ConvergenceTicks: %s" % ConvergenceTicks + '\n')
+    outfile.write("record_distribution: %s" % record_distribution + '\n')
+    outfile.write("num_rp_bins: %s" % num_rp_bins + '\n')
+    outfile.write("record_network_metrics: %s" % record_network_metrics + '\n')
+    outfile.write("export_agents: %s" % export_agents + '\n')
+    outfile.write("record_trajectories: %s" % record_trajectories + '\n')
+    outfile.write("TrajectoryResolution: %s" % TrajectoryResolution + '\n')
     
\ No newline at end of file
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import numpy as np
+from replicate_runner import *
+
+#==============================================================================
+# Parameter space and outputs
+#==============================================================================
+
+def default_parameter_ranges(num_nodes):
+    """
+    Returns dictionary mapping the scenario parameters that are varied to
+    (lower bound, upper bound, integer) tuples; integer parameters take
+    every value from lower to upper bound with equal probability
+    """
+    return {"HazardMultiplier": (.7, 1.3, False),
+            "GovernmentMultiplier": (.1, 2., False),
+            "GovernmentDelay": (1, 20, True),
+            "GovernmentStop": (1, 60, True),
+            "MediaMultiplier": (.1, 2., False),
+            "MediaDelay": (0, 10, True),
+            "MediaReportingIntensity": (0., 1., False),
+            "num_affected": (0, num_nodes, True)}
+
+# scalar outputs computed from the data recorded in a single run
+output_functions = {"final_avg_rp": lambda data: data["avg_rp"][-1],
+                    "peak_red": lambda data: max(data["red"])}
+
+#==============================================================================
+# Space-filling designs
+#==============================================================================
+
+# direction numbers (s, a, m_1 ... m_s) of dimensions 2 to 16 of the Sobol
+# sequence, from S. Joe and F. Y. Kuo (2008), new-joe-kuo-6.21201
+sobol_directions = [(1, 0, [1]),
+                    (2, 1, [1, 3]),
+                    (3, 1, [1, 3, 1]),
+                    (3, 2, [1, 1, 1]),
+                    (4, 1, [1, 1, 3, 3]),
+                    (4, 4, [1, 3, 5, 13]),
+                    (5, 2, [1, 1, 5, 5, 17]),
+                    (5, 4, [1, 1, 5, 5, 5]),
+                    (5, 7, [1, 1, 7, 11, 19]),
+                    (5, 11, [1, 1, 5, 1, 1]),
+                    (5, 13, [1, 1, 1, 3, 11]),
+                    (5, 14, [1, 3, 5, 5, 31]),
+                    (6, 1, [1, 3, 3, 9, 7, 49]),
+                    (6, 13, [1, 1, 1, 15, 21, 21]),
+                    (6, 16, [1, 3, 1, 13, 27, 49])]
+
+def latin_hypercube(num_samples, num_dims, seed = None):
+    """
+    Returns a num_samples x num_dims Latin hypercube sample on the unit
+    cube: every dimension has exactly one point in each of the num_samples
+    equally sized strata
+    """
+    random_state = np.random.RandomState(seed)
+    strata = np.array([random_state.permutation(num_samples)
+                       for dim in range(num_dims)]).T
+    return (strata + random_state.random_sample((num_samples, num_dims))) \
+           / float(num_samples)
+
+def sobol_sequence(num_samples, num_dims, skip = 1):
+    """
+    Overview
+    ---------------
+    Returns the first num_samples points of the Sobol low-discrepancy
+    sequence on the unit cube, generated in Gray code order
+
+    Input
+    ---------------
+    num_samples: number of points
+    num_dims: number of dimensions, at most 16
+    skip: number of initial points left out; the first point is the
+          origin and usually skipped
+    """
+    if num_dims > len(sobol_directions) + 1:
+        raise ValueError("Sobol sequence only available for up to %s "
+                         "dimensions" % (len(sobol_directions) + 1))
+    bits = 32
+    V = [[1 << (bits - 1 - k) for k in range(bits)]]
+    for s, a, m in sobol_directions[:num_dims - 1]:
+        v = [m[k] << (bits - 1 - k) for k in range(s)]
+        for k in range(s, bits):
+            value = v[k - s] ^ (v[k - s] >> s)
+            for l in range(1, s):
+                value ^= ((a >> (s - 1 - l)) & 1) * v[k - l]
+            v.append(value)
+        V.append(v)
+    V = np.array(V, dtype = np.uint64)
+
+    points = np.zeros((num_samples + skip, num_dims))
+    X = np.zeros(num_dims, dtype = np.uint64)
+    for i in range(1, num_samples + skip):
+        # index of the rightmost zero bit of i - 1
+        c = 0
+        value = i - 1
+        while value & 1:
+            value >>= 1
+            c += 1
+        X = X ^ V[:, c]
+        points[i] = X / float(2**bits)
+    return points[skip:]
+
+def saltelli_design(num_samples, num_dims, method = "sobol", seed = None):
+    """
+    Overview
+    ---------------
+    Creates the design of the Saltelli scheme to estimate Sobol indices:
+    two independent base matrices A and B and, for every dimension i, the
+    matrix AB_i that equals A except for column i which is taken from B
+
+    Input
+    ---------------
+    num_samples: number of rows of A and B
+    num_dims: number of parameters
+    method: "sobol" for a quasi-random design, "lhs" for Latin hypercubes
+
+    Output
+    ---------------
+    Array with num_samples * (num_dims + 2) rows, stacked as
+    A, B, AB_1, ..., AB_d
+    """
+    if method == "sobol":
+        base = sobol_sequence(num_samples, 2 * num_dims)
+    elif method == "lhs":
+        base = latin_hypercube(num_samples, 2 * num_dims, seed)
+    else:
+        raise ValueError("unknown design method: %s" % method)
+    A = base[:, :num_dims]
+    B = base[:, num_dims:]
+    design = [A, B]
+    for i in range(num_dims):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        design.append(AB)
+    return np.vstack(design)
+
+def scale_design(design, parameter_ranges, base_parameters):
+    """
+    Turns rows of a design on the unit cube into scenario parameter
+    dictionaries; parameters are varied in the sorted order of the keys
+    of parameter_ranges, all others are taken from base_parameters
+    """
+    names = sorted(parameter_ranges)
+    scenarios = []
+    for row in design:
+        parameters = dict(base_parameters)
+        for name, value in zip(names, row):
+            low, high, integer = parameter_ranges[name]
+            if integer:
+                # every integer in [low, high] gets the same share of [0, 1)
+                parameters[name] = int(min(np.floor(low + value *
+                                          (high - low + 1)), high))
+            else:
+                parameters[name] = low + value * (high - low)
+        scenarios.append(parameters)
+    return scenarios
+
+#==============================================================================
+# Running designs and computing indices
+#==============================================================================
+
+def run_design(scenarios, seeds, processes = 1,
+               common_random_numbers = False):
+    """
+    Overview
+    ---------------
+    Runs one replicate per scenario in parallel and computes the scalar
+    outputs defined in output_functions
+
+    Input
+    ---------------
+    scenarios: list of parameter dictionaries, see scale_design()
+    seeds: list with one seed per scenario
+    processes: number of worker processes
+    common_random_numbers: see run_replicate()
+
+    Output
+    ---------------
+    Dictionary mapping output names to arrays with one value per scenario
+    """
+    runs = run_jobs([(scenario, seed, common_random_numbers) for
+                     scenario, seed in zip(scenarios, seeds)], processes)
+    return dict((name, np.array([function(data) for data in runs],
+                                dtype = float))
+                for name, function in output_functions.items())
+
+def sobol_indices(Y, num_samples, num_dims):
+    """
+    Overview
+    ---------------
+    Estimates first-order (Saltelli 2010) and total (Jansen 1999) Sobol
+    indices from model outputs evaluated on a saltelli_design()
+
+    Input
+    ---------------
+    Y: array of outputs in the row order of saltelli_design()
+    num_samples: number of rows of the base matrices
+    num_dims: number of parameters
+
+    Output
+    ---------------
+    Tuple of arrays (first order indices, total indices)
+    """
+    Y = np.asarray(Y, dtype = float)
+    fA = Y[:num_samples]
+    fB = Y[num_samples:2 * num_samples]
+    variance = np.var(np.concatenate([fA, fB]))
+    first = np.zeros(num_dims)
+    total = np.zeros(num_dims)
+    if variance == 0:
+        return first, total
+    for i in range(num_dims):
+        fAB = Y[(2 + i) * num_samples:(3 + i) * num_samples]
+        first[i] = np.mean(fB * (fAB - fA)) / variance
+        total[i] = .5 * np.mean((fA - fAB)**2) / variance
+    return first, total
+
+def rank_correlations(design, Y):
+    """
+    Spearman rank correlation of every column of a design with the output
+    Y; a cheap screening measure for Latin hypercube designs
+    """
+    def ranks(x):
+        return np.argsort(np.argsort(x)).astype(float)
+    ranked_Y = ranks(Y)
+    correlations = np.zeros(design.shape[1])
+    for i in range(design.shape[1]):
+        ranked_X = ranks(design[:, i])
+        if np.std(ranked_Y) > 0 and np.std(ranked_X) > 0:
+            correlations[i] = np.corrcoef(ranked_X, ranked_Y)[0, 1]
+    return correlations
+
+def sensitivity_analysis(num_samples, base_parameters = None,
+                         parameter_ranges = None, method = "sobol",
+                         processes = 1, seed = None,
+                         common_random_numbers = True,
+                         outfile_name = "sobol_indices.csv"):
+    """
+    Overview
+    ---------------
+    Variance-based sensitivity analysis of the scenario parameters:
+    creates a Saltelli design, runs the simulation on all its
+    num_samples * (num_parameters + 2) points and estimates first-order
+    and total Sobol indices for every output in output_functions
+
+    Input
+    ---------------
+    num_samples: number of rows of the base matrices, preferably a power
+                 of 2 for Sobol designs
+    base_parameters: parameters that are not varied, defaults to
+                 default_parameters()
+    parameter_ranges: defaults to default_parameter_ranges()
+    method: "sobol" or "lhs", see saltelli_design()
+    processes: number of worker processes
+    seed: seed for the design (lhs) and the simulation runs; rows j of
+          A, B and all AB_i share one seed to reduce noise in the
+          differences between them: with every engine they share network
+          and population, and with common_random_numbers also the random
+          decisions within the ticks (hazard targets, activation order,
+          media draws and neighbour samples, see run_replicate()).
+          Without common random numbers these diverge as soon as the
+          parameters change the number of random numbers drawn
+    common_random_numbers: runs the design with common random numbers
+    outfile_name: csv file the indices are written to, None for no file
+
+    Output
+    ---------------
+    Dictionary mapping output names to dictionaries mapping parameter
+    names to (first order index, total index) tuples
+    """
+    if base_parameters is None:
+        base_parameters = default_parameters()
+    if parameter_ranges is None:
+        parameter_ranges = default_parameter_ranges(
+                               base_parameters["num_nodes"])
+    names = sorted(parameter_ranges)
+    num_dims = len(names)
+
+    design = saltelli_design(num_samples, num_dims, method, seed)
+    scenarios = scale_design(design, parameter_ranges, base_parameters)
+    seeds = draw_seeds(num_samples, seed) * (num_dims + 2)
+    outputs = run_design(scenarios, seeds, processes, common_random_numbers)
+
+    results = {}
+    for output in sorted(outputs):
+        first, total = sobol_indices(outputs[output], num_samples, num_dims)
+        results[output] = dict((name, (first[i], total[i]))
+                               for i, name in enumerate(names))
+
+    if outfile_name is not None:
+        outfile = open(outfile_name, "w")
+        outfile.write("output, parameter, first_order, total\n")
+        for output in sorted(results):
+            for name in names:
+                outfile.write("%s, %s, %s, %s\n" % ((output, name) +
+                                                    results[output][name]))
+        outfile.close()
+
+    return results
+
+def lhs_analysis(num_samples, base_parameters = None,
+                 parameter_ranges = None, processes = 1, seed = None,
+                 outfile_name = "lhs_results.csv"):
+    """
+    Overview
+    ---------------
+    Runs the simulation on a Latin hypercube design of num_samples points
+    and saves every point with its outputs, e.g. for fitting metamodels
+
+    Output
+    ---------------
+    Dictionary mapping output names to dictionaries mapping parameter
+    names to Spearman rank correlations with the output
+    """
+    if base_parameters is None:
+        base_parameters = default_parameters()
+    if parameter_ranges is None:
+        parameter_ranges = default_parameter_ranges(
+                               base_parameters["num_nodes"])
+    names = sorted(parameter_ranges)
+
+    design = latin_hypercube(num_samples, len(names), seed)
+    scenarios = scale_design(design, parameter_ranges, base_parameters)
+    outputs = run_design(scenarios, draw_seeds(num_samples, seed),
+                         processes)
+
+    values = np.array([[scenario[name] for name in names]
+                       for scenario in scenarios], dtype = float)
+    results = {}
+    for output in sorted(outputs):
+        correlations = rank_correlations(values, outputs[output])
+        results[output] = dict(zip(names, correlations))
+
+    if outfile_name is not None:
+        outfile = open(outfile_name, "w")
+        outfile.write(', '.join(names + sorted(outputs)) + '\n')
+        for j in range(num_samples):
+            outfile.write(', '.join([str(values[j, i]) for i in
+                                     range(len(names))] +
+                                    [str(outputs[output][j]) for output in
+                                     sorted(outputs)]) + '\n')
+        outfile.close()
+
+    return results
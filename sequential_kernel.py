@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    # optional, the kernel runs as plain Python without it
+    numba = None
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def jit_available():
+    """
+    True if the sequential kernel is compiled with Numba
+    """
+    return numba is not None
+
+def _jit(function):
+    """
+    Compiles function with Numba if it is installed, returns it unchanged
+    otherwise
+    """
+    if numba is None:
+        return function
+    return numba.njit(nogil = True)(function)
+
+@_jit
+def sequential_tick(order, indptr, indices, risk_perception,
+                    benefit_multiplier, techn_fear_multiplier,
+                    media_consumption, other_rs_sum, other_rs_count,
+                    neighbour_rs_sum, neighbour_rs_count, rs_sent,
+                    rs_received, agent_random, sample_random, scratch,
+                    media_reports, media_intensity, media_magnitude,
+                    hazard_multiplier):
+    """
+    Overview
+    ---------------
+    Activates the agents one after the other in the given order and runs
+    Agent.tick_behaviour() for each of them on the arrays of a
+    CompactNetwork and an AgentPopulation: media draw, processing of the
+    received risk signals, adaptation of the risk perception and sharing
+    with a random subset of the neighbours. Risk signals sent to agents
+    activated later in the tick are processed by them in the same tick,
+    like in Simulation.tick()
+
+    Input
+    ---------------
+    order: activation order, a permutation of the agent indices
+    indptr, indices: adjacency arrays of the CompactNetwork
+    risk_perception ... rs_received: state arrays of the AgentPopulation,
+                    updated in place
+    agent_random: array of shape (4, num_agents) of uniform random numbers
+                  per activated agent (column = position in order): two
+                  for the media draw, one for the decision to share and
+                  one for the number of neighbours
+    sample_random: array of indptr[-1] uniform random numbers, those from
+                   indptr[agent] on are used to sample the agent's
+                   neighbours
+    scratch: integer array with at least as many elements as the largest
+             degree
+    media_reports, media_intensity: state of the Media in this tick
+    media_magnitude: clipped magnitude of media risk signals
+    hazard_multiplier: rp multiplier of the Hazard
+
+    Output
+    ---------------
+    Number of media risk signals sent
+    """
+    media_sent = 0
+    for position in range(len(order)):
+        agent = order[position]
+
+        if agent_random[0, position] < media_consumption[agent] and \
+           agent_random[1, position] < media_intensity and media_reports:
+            other_rs_sum[agent] += media_magnitude
+            other_rs_count[agent] += 1
+            media_sent += 1
+
+        # only agents that received a risk signal adapt their risk
+        # perception; risk signals from neighbours count as one signal
+        # with their mean magnitude
+        num_other = other_rs_count[agent]
+        num_neighbour = neighbour_rs_count[agent]
+        if num_other == 0 and num_neighbour == 0:
+            continue
+        magnitude_sum = float(other_rs_sum[agent])
+        num_magnitudes = float(num_other)
+        if num_neighbour > 0:
+            magnitude_sum += neighbour_rs_sum[agent] / float(num_neighbour)
+            num_magnitudes += 1.
+            rs_received[agent] += num_neighbour
+        rp = risk_perception[agent] * (magnitude_sum / num_magnitudes +
+                                       benefit_multiplier[agent] +
+                                       techn_fear_multiplier[agent]) / 3.
+        if rp > 5.:
+            rp = 5.
+        elif rp < 1.:
+            rp = 1.
+        risk_perception[agent] = rp
+        other_rs_sum[agent] = 0
+        other_rs_count[agent] = 0
+        neighbour_rs_sum[agent] = 0
+        neighbour_rs_count[agent] = 0
+
+        # the higher the agent's own risk perception, the higher the
+        # chance that it shares it with a random subset of its neighbours
+        if agent_random[2, position] * 4. + 1. > rp:
+            continue
+        rp_to_pass_on = ((rp - 1.) / 4. * (2. - .1) + .1) * hazard_multiplier
+        if rp_to_pass_on > 2.:
+            rp_to_pass_on = 2.
+        elif rp_to_pass_on < .1:
+            rp_to_pass_on = .1
+
+        # agents with fewer than two neighbours send nothing, see
+        # Agent.tick_behaviour()
+        start = indptr[agent]
+        degree = indptr[agent + 1] - start
+        half = degree // 2
+        if half < 1:
+            continue
+        size = 1 + int(agent_random[3, position] * half)
+        # partial Fisher-Yates shuffle of the neighbours
+        for slot in range(degree):
+            scratch[slot] = indices[start + slot]
+        for slot in range(size):
+            swap = slot + int(sample_random[start + slot] * (degree - slot))
+            target = scratch[swap]
+            scratch[swap] = scratch[slot]
+            scratch[slot] = target
+            neighbour_rs_sum[target] += rp_to_pass_on
+            neighbour_rs_count[target] += 1
+        rs_sent[agent] += size
+    return media_sent
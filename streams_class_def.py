@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import hashlib
+import random as rnd
+import numpy as np
+
+#==============================================================================
+# Classes
+#==============================================================================
+
+class RandomStreams:
+    """
+    Overview
+    ---------------
+    Separate, seeded random number streams for every class of random
+    decisions of a run, used for common random numbers: two scenarios
+    run with the same seed get the same network, the same population and
+    the same hazard targets, activation order, media draws and neighbour
+    samples as far as their dynamics allow, so that differences between
+    them are not swamped by replicate noise. The streams used within
+    ticks are reseeded at the start of every tick, so that a scenario
+    drawing more numbers in one tick does not shift the draws of all
+    later ticks; the array engines draw from numpy random states seeded
+    the same way, see tick_random_state()
+    """
+    # classes of random decisions, each with its own stream
+    decision_classes = ["network", "population", "hazard", "activation",
+                        "media", "neighbour"]
+
+    # streams that are reseeded at the start of every tick
+    tick_classes = ["hazard", "activation", "media", "neighbour"]
+
+    def __init__(self, seed, scenario = None, shared = None):
+        """
+        seed: seed from which the seeds of all streams are derived
+        scenario: name of the scenario, only used for the streams that
+                  are not shared
+        shared: decision classes whose streams are common to all
+                scenarios run with seed, defaults to all of them; the
+                other streams depend on scenario as well
+        """
+        if shared is None:
+            shared = self.decision_classes
+        self.seeds = {}
+        for name in self.decision_classes:
+            if name in shared:
+                key = "%s:%s" % (seed, name)
+            else:
+                key = "%s:%s:%s" % (seed, scenario, name)
+            self.seeds[name] = derive_seed(key)
+
+        self.network = rnd.Random(self.seeds["network"])
+        for name in self.tick_classes:
+            setattr(self, name, rnd.Random(self.seeds[name]))
+
+    def seed_population(self):
+        """
+        Seeds random and numpy.random, from which Agent objects draw
+        their attributes, with the seed of the population stream
+        """
+        rnd.seed(self.seeds["population"])
+        np.random.seed(self.seeds["population"])
+
+    def start_tick(self, tick):
+        """
+        Reseeds the streams used within ticks with seeds depending on tick
+        """
+        for name in self.tick_classes:
+            getattr(self, name).seed(self.seeds[name] + (tick + 1) * 2**31)
+
+    def tick_random_state(self, name, tick):
+        """
+        Returns a numpy RandomState for the decisions of class name in
+        tick, e.g. for ArraySimulation
+        """
+        return np.random.RandomState([self.seeds[name], tick + 1])
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def derive_seed(key):
+    """
+    Returns a seed between 0 and 2**31 - 1 derived from a string; unlike
+    hash() the same in every process and Python version
+    """
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % 2**31
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import sys
+import time
+import socket
+import threading
+import traceback
+import random as rnd
+import multiprocessing as mp
+from replicate_runner import *
+from queue_class_def import *
+
+#==============================================================================
+# Sweeps distributed over a shared work queue
+#==============================================================================
+
+def job_name(scenario, replicate):
+    return "%s_%04d" % (scenario, replicate)
+
+def split_job_name(job_id):
+    """
+    Returns (scenario, replicate) of a job named by job_name()
+    """
+    scenario, replicate = job_id.rsplit("_", 1)
+    return scenario, int(replicate)
+
+def submit_sweep(queue_dir, scenarios, num_replicates, seed = None):
+    """
+    Overview
+    ---------------
+    Writes one job per replicate of every scenario to the work queue in
+    queue_dir; jobs that have already been submitted or completed are
+    skipped, so a sweep can be extended by submitting it again with more
+    replicates and the same seed
+
+    Input
+    ---------------
+    queue_dir: directory of the queue, e.g. on a shared file system
+    scenarios: dictionary mapping scenario names to parameter dictionaries
+               (no underscore followed by digits at the end of the name)
+    num_replicates: number of replicates per scenario
+    seed: makes the seeds of the replicates reproducible
+
+    Output
+    ---------------
+    Number of jobs added
+    """
+    queue = WorkQueue(queue_dir)
+    added = 0
+    for index, name in enumerate(sorted(scenarios)):
+        scenario_seed = None if seed is None else seed + index
+        for replicate, replicate_seed in \
+            enumerate(draw_seeds(num_replicates, scenario_seed)):
+            added += queue.submit(job_name(name, replicate), scenarios[name],
+                                  replicate_seed)
+    return added
+
+def run_worker(queue_dir, lease_seconds = 600, heartbeat = None, poll = 5.,
+               max_jobs = None, verbose = False):
+    """
+    Overview
+    ---------------
+    Worker of a distributed sweep, can run on any host that sees
+    queue_dir: claims jobs, runs them with run_replicate() and saves
+    their results until no job is waiting or running. A background thread
+    renews the lease of the current job every heartbeat seconds; leases
+    of crashed workers are recovered whenever the worker looks for a new
+    job, and while other workers still hold leases the worker polls the
+    queue in case they crash
+
+    Input
+    ---------------
+    queue_dir: directory of the queue
+    lease_seconds: see WorkQueue, must be the same for all workers and
+                   well above heartbeat
+    heartbeat: seconds between two renewals of the lease, defaults to a
+               quarter of lease_seconds
+    poll: seconds between two looks at the queue while it is empty
+    max_jobs: number of jobs after which the worker stops, None for no
+              limit
+
+    Output
+    ---------------
+    Number of jobs completed by this worker
+    """
+    queue = WorkQueue(queue_dir, lease_seconds)
+    if heartbeat is None:
+        heartbeat = lease_seconds / 4.
+    # separate generator, run_replicate() seeds the global one
+    random_state = rnd.Random()
+    worker = "%s-%s-%06d" % (socket.gethostname().replace("@", "_"),
+                             os.getpid(), random_state.randint(0, 10**6 - 1))
+    completed = 0
+
+    while max_jobs is None or completed < max_jobs:
+        queue.recover()
+        job = queue.claim(worker, random_state)
+        if job is None:
+            if queue.done():
+                break
+            time.sleep(poll)
+            continue
+
+        stop = threading.Event()
+        def renew_lease():
+            while not stop.wait(heartbeat):
+                if not queue.heartbeat(job):
+                    break
+        thread = threading.Thread(target = renew_lease)
+        thread.daemon = True
+        thread.start()
+        try:
+            start = time.time()
+            result = run_replicate(job["parameters"], job["seed"])
+        except Exception:
+            stop.set()
+            thread.join()
+            queue.fail(job, traceback.format_exc())
+            if verbose:
+                print "%s: job %s failed" % (worker, job["id"])
+            continue
+        stop.set()
+        thread.join()
+        queue.complete(job, result)
+        completed += 1
+        if verbose:
+            print "%s: job %s done in %.1f s" % (worker, job["id"],
+                                                  time.time() - start)
+    return completed
+
+def _run_worker_args(args):
+    """
+    Unpacks a tuple of run_worker() arguments, needed by
+    multiprocessing.Process
+    """
+    run_worker(*args)
+
+def run_local(queue_dir, processes = 2, lease_seconds = 600,
+              heartbeat = None, poll = 1.):
+    """
+    Overview
+    ---------------
+    Runs processes workers on this host until the queue is empty; they
+    use the same protocol as workers on different hosts, so this can
+    stand in for a cluster
+
+    Output
+    ---------------
+    Dictionary with the number of jobs in each state of the queue, see
+    WorkQueue.status()
+    """
+    workers = [mp.Process(target = _run_worker_args,
+                          args = ((queue_dir, lease_seconds, heartbeat,
+                                   poll),))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return WorkQueue(queue_dir, lease_seconds).status()
+
+def collect_sweep(queue_dir, sweep_dir = None):
+    """
+    Overview
+    ---------------
+    Collects the results of a sweep from the queue; if sweep_dir is
+    given, the per-tick means of every scenario are saved to
+    sweep_dir/<scenario>/mean_results.npz, where plot_sweep_results.py
+    looks for them
+
+    Output
+    ---------------
+    Dictionary mapping scenario names to lists of completed runs, ordered
+    by replicate
+    """
+    queue = WorkQueue(queue_dir)
+    results = {}
+    for job_id in queue.job_ids("results"):
+        scenario, replicate = split_job_name(job_id)
+        results.setdefault(scenario, []).append(queue.result(job_id))
+
+    if sweep_dir is not None:
+        for scenario in results:
+            scenario_dir = os.path.join(sweep_dir, scenario)
+            if not os.path.isdir(scenario_dir):
+                os.makedirs(scenario_dir)
+            save_mean_results(mean_results(results[scenario]),
+                              os.path.join(scenario_dir,
+                                           "mean_results.npz"))
+    return results
+
+if __name__ == "__main__":
+    # usage: python sweep_worker.py queue_dir [lease_seconds]
+    completed = run_worker(sys.argv[1],
+                           float(sys.argv[2]) if len(sys.argv) > 2 else 600,
+                           verbose = True)
+    print "%s jobs completed" % completed
@@ -9,6 +9,8 @@ import matplotlib as mpl
 import random as rnd
 from function_def import *
 from agent_class_def import *
+from sequential_kernel import *
+from streams_class_def import *
 
 #==============================================================================
 # Simulation class
@@ -31,12 +33,37 @@ class Simulation:
         self.grid_risk_signals = 0
         self.HazardHappened = False
         self.MediaIntensity = 0
+        
+        # steady state detection is switched off unless init_convergence()
+        # is called
+        self.converge = False
+        self.converged_tick = None
+        
+        # random module is used unless init_streams() is called
+        self.streams = None
+        
+        # individual risk perceptions are left out of report_state() 
+        # unless init_rp_report() is called
+        self.report_rp = False
                 
     def init_network(self, network):
         """
         network can be any kind of (social) network graph
         """
         self.network = network
+        # the order of a networkx graph depends on the memory addresses of
+        # the agents, so nodes are ordered by name to make runs with the
+        # same seed reproducible
+        self.nodes = sorted(network.nodes(), 
+                            key = lambda node: node.get_name())
+        
+    def init_rp_report(self):
+        """
+        Includes the risk perceptions of all agents (rp_array) in 
+        report_state(), e.g. if SystemState.needs_rp_array() or for a 
+        TrajectoryWriter; otherwise they are not copied every tick
+        """
+        self.report_rp = True
         
     def init_institutions(self, 
                           MediaClass, 
@@ -103,12 +130,74 @@ class Simulation:
             print "GovernmentStop:", self.GovernmentStop
             print "GovernmentDelay:", self.GovernmentDelay
               
+    def init_convergence(self, tolerance = 1e-4, stable_ticks = 5,
+                         media_tolerance = 1e-3, signal_tolerance = 0,
+                         verbose = False):
+        """
+        Overview
+        ---------------
+        Switches on early termination of a run once the simulation has 
+        reached a steady state, see check_convergence()
+        
+        Input
+        ---------------
+        tolerance: largest per-tick change in average risk perception that
+                   still counts as unchanged
+        stable_ticks: number of consecutive ticks the steady state conditions
+                   have to hold before the run is considered converged
+        media_tolerance: media intensity below which the media is regarded
+                   as no longer active
+        signal_tolerance: largest number of risk signals sent by neighbours
+                   per tick that still counts as no communication
+        """
+        self.converge = True
+        self.ConvergenceTolerance = tolerance
+        self.ConvergenceTicks = stable_ticks
+        self.ConvergenceMediaTolerance = media_tolerance
+        self.ConvergenceSignalTolerance = signal_tolerance
+        self.stable_ticks = 0
+        self.prev_avg_rp = None
+        
+        if verbose:
+            print "ConvergenceTolerance:", self.ConvergenceTolerance
+            print "ConvergenceTicks:", self.ConvergenceTicks
+            print "ConvergenceMediaTolerance:", self.ConvergenceMediaTolerance
+            print "ConvergenceSignalTolerance:", self.ConvergenceSignalTolerance
+              
+    def init_streams(self, streams):
+        """
+        Overview
+        ---------------
+        Switches on common random numbers: hazard targets, activation 
+        order, media draws and neighbour samples are drawn from the 
+        streams of a RandomStreams instance instead of the random module
+        
+        Input
+        ---------------
+        streams: RandomStreams instance, also used to create the network
+                 and population, see replicate_runner.run_replicate()
+        """
+        self.streams = streams
+              
     def return_network(self):
         """
         Returns the current network state to make it available for plotting
         """        
         return self.network              
               
+    def network_edges(self):
+        """
+        Returns arrays (sources, targets) with every edge of the network
+        once, as positions of the nodes in the rp_array reported by
+        report_state(); used by SystemState.init_network_metrics()
+        """
+        position = dict((node, i) for i, node in enumerate(self.nodes))
+        # sorted by position, independently of the order of the graph
+        edges = np.array(sorted(sorted([position[edge[0]], position[edge[1]]])
+                                for edge in self.network.edges()),
+                         dtype = np.intp).reshape(-1, 2)
+        return edges[:, 0].copy(), edges[:, 1].copy()
+              
     def report_state(self):
         """
         Overview
@@ -118,12 +207,14 @@ class Simulation:
         Output
         ---------------
         Dictionary with data summarizing current Simulation state, assumed
-        to be passed to SystemState object instance's record_data() function
+        to be passed to SystemState object instance's record_data() function;
+        the risk perceptions of all agents (rp_array) only after 
+        init_rp_report()
         """
         tmp_status_dict = {}
         tmp_rp_lst = []         # risk perceptions
         num_rs_sent = []        # risk signals sent
-        for node in self.network:
+        for node in self.nodes:
             # get color of node
             tmp_status_dict[node.get_name()] = node.get_color()
             
@@ -155,27 +246,133 @@ class Simulation:
         # internally as well for later access in tick()
         self.curr_avg_rp = np.mean(tmp_rp_lst)                    
                     
-        return dict([("curr_green", curr_green),
-                     ("curr_yellow", curr_yellow),
-                     ("curr_orange", curr_orange),
-                     ("curr_red", curr_red),
-                     ("curr_avg_rp", self.curr_avg_rp),
-                     ("gov_rs_sent", gov_num_rs_sent), 
-                     ("media_rs_sent", media_num_rs_sent),
-                     ("neighbour_rs_sent", neighbour_num_rs_sent),
-                     ("grid_rs_sent", grid_num_rs_sent)])
+        state = dict([("curr_green", curr_green),
+                      ("curr_yellow", curr_yellow),
+                      ("curr_orange", curr_orange),
+                      ("curr_red", curr_red),
+                      ("curr_avg_rp", self.curr_avg_rp),
+                      ("gov_rs_sent", gov_num_rs_sent), 
+                      ("media_rs_sent", media_num_rs_sent),
+                      ("neighbour_rs_sent", neighbour_num_rs_sent),
+                      ("grid_rs_sent", grid_num_rs_sent)])
+        if self.report_rp:
+            state["rp_array"] = np.array(tmp_rp_lst)
+        return state
+    
+    def check_convergence(self, tick, data_dict):
+        """
+        Overview
+        ---------------
+        Checks whether the run has reached a steady state, i.e. whether for
+        the last ConvergenceTicks ticks the average risk perception has
+        changed by less than ConvergenceTolerance, no institution is still
+        active (hazard event and government communications are over, media
+        intensity is negligible) and neighbours have (almost) stopped 
+        sending risk signals. Always False if init_convergence() has not 
+        been called
+        
+        Input
+        ---------------
+        tick: the tick/time step that has just been executed
+        data_dict: dictionary returned by report_state() after that tick
+        
+        Output
+        ---------------
+        True if the remaining ticks would not change the state any further
+        """
+        if not self.converge:
+            return False
+        
+        prev_avg_rp = self.prev_avg_rp
+        self.prev_avg_rp = data_dict["curr_avg_rp"]
+        
+        # the government still communicates in the next tick if 
+        # GovernmentStop > tick + 1; the media has to have started 
+        # reporting, otherwise its risk signals are still to come
+        institutions_active = (not self.HazardHappened or 
+                               not self.Media.reports or
+                               tick + 1 < self.GovernmentStop or
+                               self.Media.get_intensity() > 
+                               self.ConvergenceMediaTolerance)
+        
+        if prev_avg_rp is None or institutions_active or \
+           abs(data_dict["curr_avg_rp"] - prev_avg_rp) >= \
+           self.ConvergenceTolerance or \
+           data_dict["neighbour_rs_sent"] > self.ConvergenceSignalTolerance:
+            self.stable_ticks = 0
+            return False
+        
+        self.stable_ticks += 1
+        if self.stable_ticks >= self.ConvergenceTicks:
+            self.converged_tick = tick
+            return True
+        return False
+    
+    def run(self, publisher = None):
+        """
+        Overview
+        ---------------
+        Runs the simulation for num_ticks ticks and yields the report of 
+        the initial state and of every tick as soon as it is produced.
+        Stops early if check_convergence() detects a steady state, in 
+        which case SystemState.carry_forward() fills the remaining ticks
+        
+        Input
+        ---------------
+        publisher: optional MetricPublisher that receives every report,
+                   e.g. to monitor long runs from another process
+        
+        Output
+        ---------------
+        Dictionaries as returned by report_state()
+        """
+        state = self.report_state()
+        if publisher is not None:
+            publisher.publish(-1, state)
+        yield state
+        
+        for tick in range(self.num_ticks):
+            self.tick(tick)
+            state = self.report_state()
+            if publisher is not None:
+                publisher.publish(tick, state)
+            yield state
+            if self.check_convergence(tick, state):
+                break
+    
+    def report_agents(self):
+        """
+        Overview
+        ---------------
+        Reports the end-of-run state of all agents in one pass over the
+        network, e.g. to be saved with append_agent_records()
+        
+        Output
+        ---------------
+        Dictionary of arrays with one entry per agent: name (agent), 
+        degree, risk signals sent (rs_sent_overall) and received 
+        (rs_received), original and final risk perception (original_rp, 
+        rp) and media_consumption
+        """
+        degree = self.network.degree()
+        records = np.array([(node.get_name(), degree[node], 
+                             node.rs_sent_overall, node.rs_received,
+                             node.original_rp, node.risk_perception,
+                             node.media_consumption)
+                            for node in self.nodes],
+                           dtype = agent_record_dtype.descr[1:])
+        return dict((name, records[name]) for name in records.dtype.names)
     
     def report_rs_sent_received(self):
         """
         Reports the number of risk signals sent and received by all nodes
         after a simulation run. Output is a dictionary
         """
-        outdict = {}        
-        for node in self.network:
-            outdict[node.get_name()] = (self.network.degree(node), 
-                                        node.get_rs_end_state()[0], # sent
-                                        node.get_rs_end_state()[1]) # received
-        return outdict
+        agents = self.report_agents()
+        return dict(zip(agents["agent"].tolist(), 
+                        zip(agents["degree"].tolist(), 
+                            agents["rs_sent_overall"].tolist(),   # sent
+                            agents["rs_received"].tolist())))     # received
     
     def tick(self, tick):
         """
@@ -189,12 +386,19 @@ class Simulation:
         """
         # local copy of nodes so that they don't get deleted (see below)
         # from the actual graph
-        self.local_nodes = self.network.nodes()
+        self.local_nodes = list(self.nodes)
+        
+        if self.streams is None:
+            hazard_random = activation_random = rnd
+        else:
+            self.streams.start_tick(tick)
+            hazard_random = self.streams.hazard
+            activation_random = self.streams.activation
     
         # tick/time step at which the hazard event is triggered
         if tick == self.hazard_triggered:
             self.HazardHappened = True
-            self.affected_by_hazard = rnd.sample(self.local_nodes, 
+            self.affected_by_hazard = hazard_random.sample(self.local_nodes, 
                                                  self.num_affected)
             for agent in self.affected_by_hazard:
                 agent.add_risk_signal(RiskSignal("grid",
@@ -211,9 +415,8 @@ class Simulation:
         if self.GovernmentStop > tick >= self.GovernmentDelay:
 #        if tick >= self.GovernmentDelay:
 #            if (tick - self.GovernmentDelay)%4 == 0:
-                self.Government.send_risk_signal(self.network.nodes(), 
-                                                 self.Hazard)
-                self.gov_risk_signals += len(self.network.nodes())
+                self.Government.send_risk_signal(self.nodes, self.Hazard)
+                self.gov_risk_signals += len(self.nodes)
             
         # Media behaviour for each tick/time step
         if self.Media.reports:
@@ -222,13 +425,364 @@ class Simulation:
         
         # activates each node in turn and triggers tick behaviour,
         # no set order exists to eliminate first-mover biases
-        for index in range(len(self.network.nodes())):
-            self.active_node = rnd.choice(self.local_nodes)
+        for index in range(len(self.nodes)):
+            self.active_node = activation_random.choice(self.local_nodes)
             self.active_node.tick_behaviour(self.Media, self.Government,
-                                       self.Hazard)
+                                       self.Hazard, self.streams)
             self.local_nodes.remove(self.active_node)
         
         
+#==============================================================================
+# ArraySimulation class
+#==============================================================================
+
+class ArraySimulation(Simulation):
+    """
+    Overview
+    ---------------
+    Runs the simulation on a CompactNetwork and an AgentPopulation instead
+    of a networkx graph of Agent objects, for networks too large for the
+    object-based Simulation. All agents are updated at once in every tick
+    (synchronous update): risk signals agents send to their neighbours
+    are processed by the neighbours in the next tick, whereas in 
+    Simulation agents activated later in a tick already process them in
+    the same tick (see SequentialSimulation). Otherwise follows
+    Agent.tick_behaviour() and Simulation.tick(); institutions,
+    parameters and convergence checks are the same as in Simulation.
+    
+    The synchronous update changes the dynamics, so results are not 
+    comparable with those of Simulation: in the default scenario the mean
+    risk perception at tick 10 is about 2.29 instead of 2.69, and 
+    compare_engines() reports the array engine as not equivalent. Use
+    SequentialSimulation for results comparable with Simulation
+    """
+    def __init__(self, seed = None):
+        """
+        seed: seed of the random numbers used during the simulation
+        """
+        Simulation.__init__(self)
+        self.random_state = np.random.RandomState(seed)
+        self.start_tick(0)
+        
+    def init_network(self, network, population):
+        """
+        network: CompactNetwork
+        population: AgentPopulation with one agent per node of network
+        """
+        self.network = network
+        self.population = population
+        self.degree = network.degree()
+        
+    def network_edges(self):
+        """
+        Same as Simulation.network_edges()
+        """
+        return self.network.edges()
+        
+    def init_streams(self, streams):
+        """
+        Overview
+        ---------------
+        Switches on common random numbers: hazard targets, activation 
+        order, media draws and neighbour samples are drawn from numpy
+        random states derived from the streams of a RandomStreams instance
+        in every tick instead of from random_state. Paired scenarios draw
+        the same hazard targets, activation order, media draws and sharing
+        decisions per agent; SequentialSimulation draws the neighbour
+        samples per agent as well, whereas the synchronous ArraySimulation
+        draws them for the senders only, so that they are aligned up to
+        the first sender that differs within a tick
+        
+        Input
+        ---------------
+        streams: RandomStreams instance, also used to seed the network
+                 and population, see replicate_runner.run_replicate()
+        """
+        self.streams = streams
+        
+    def start_tick(self, tick):
+        """
+        Sets the random states of the classes of random decisions of a
+        tick: all are random_state unless init_streams() was called
+        """
+        for name in RandomStreams.tick_classes:
+            setattr(self, name + "_random", self.random_state 
+                    if self.streams is None else
+                    self.streams.tick_random_state(name, tick))
+        
+    def run(self, publisher = None):
+        """
+        Same as Simulation.run(); first narrows the counters of the 
+        population to the largest numbers of risk signals possible in 
+        this run, see AgentPopulation.fit_counters()
+        """
+        self.population.fit_counters(int(self.degree.max()), self.num_ticks)
+        return Simulation.run(self, publisher)
+        
+    def clip(self, magnitude):
+        """
+        Risk signals with magnitude above 2 or below .1 are impossible
+        """
+        return np.minimum(np.maximum(magnitude, .1), 2)
+    
+    def report_state(self):
+        """
+        Same as Simulation.report_state()
+        """
+        agents = self.population
+        counts = np.bincount(agents.color_codes(), minlength = 4)
+        
+        # also resets counters, see Agent.get_rs_sent()
+        neighbour_num_rs_sent = int(agents.rs_sent.sum())
+        agents.rs_sent_overall += agents.rs_sent
+        agents.rs_sent[:] = 0
+        
+        gov_num_rs_sent = self.gov_risk_signals
+        media_num_rs_sent = self.Media.get_rs_sent()
+        grid_num_rs_sent = self.grid_risk_signals
+        self.gov_risk_signals = 0
+        self.grid_risk_signals = 0
+        
+        self.curr_avg_rp = np.mean(agents.risk_perception)
+        
+        state = dict([("curr_green", int(counts[0])),
+                      ("curr_yellow", int(counts[1])),
+                      ("curr_orange", int(counts[2])),
+                      ("curr_red", int(counts[3])),
+                      ("curr_avg_rp", self.curr_avg_rp),
+                      ("gov_rs_sent", gov_num_rs_sent), 
+                      ("media_rs_sent", media_num_rs_sent),
+                      ("neighbour_rs_sent", neighbour_num_rs_sent),
+                      ("grid_rs_sent", grid_num_rs_sent)])
+        if self.report_rp:
+            state["rp_array"] = agents.risk_perception.copy()
+        return state
+        
+    def report_agents(self):
+        """
+        Same as Simulation.report_agents(), with node indices as names
+        """
+        agents = self.population
+        return {"agent": np.arange(agents.num_agents),
+                "degree": self.degree,
+                "rs_sent_overall": agents.rs_sent_overall.copy(),
+                "rs_received": agents.rs_received.copy(),
+                "original_rp": agents.original_rp.copy(),
+                "rp": agents.risk_perception.copy(),
+                "media_consumption": agents.media_consumption.copy()}
+        
+    def institutions_tick(self, tick):
+        """
+        Overview
+        ---------------
+        Risk signals of the grid, the media and the government at the
+        beginning of each tick/time step, before the agents are activated
+        
+        Input
+        ---------------
+        tick: current tick/time step being executed
+        """
+        agents = self.population
+        num_agents = agents.num_agents
+        
+        # tick/time step at which the hazard event is triggered
+        if tick == self.hazard_triggered:
+            self.HazardHappened = True
+            self.affected_by_hazard = self.hazard_random.choice(num_agents, 
+                                                self.num_affected,
+                                                replace = False)
+            agents.other_rs_sum[self.affected_by_hazard] += \
+                self.Hazard.get_rp_multiplier()
+            agents.other_rs_count[self.affected_by_hazard] += 1
+            self.grid_risk_signals += len(self.affected_by_hazard)
+        
+        # Media starts reporting on the hazard event
+        if tick == self.hazard_triggered + self.MediaDelay:
+            self.Media.start_reporting(self.MediaMultiplier)
+            self.Media.set_intensity(self.MediaReportingIntensity)
+            
+        # period in which Government communicates about hazard event
+        if self.GovernmentStop > tick >= self.GovernmentDelay:
+            agents.other_rs_sum += self.clip(
+                self.Government.get_risk_signal_magnitude() * 
+                self.Hazard.get_rp_multiplier())
+            agents.other_rs_count += 1
+            self.gov_risk_signals += num_agents
+            
+        # Media behaviour for each tick/time step
+        if self.Media.reports:
+            self.Media.tick_behaviour(self.curr_avg_rp)
+            self.MediaIntensity = self.Media.get_intensity()
+        
+    def tick(self, tick):
+        """
+        Overview
+        ---------------
+        Behaviour for the whole simulation at each tick/time step
+        
+        Input
+        ---------------
+        tick: current tick/time step being executed
+        """
+        self.start_tick(tick)
+        self.institutions_tick(tick)
+        agents = self.population
+        num_agents = agents.num_agents
+        media_random = self.media_random
+        
+        # agents receive media risk signals according to their media 
+        # consumption
+        reached = (media_random.random_sample(num_agents) < 
+                   agents.media_consumption) & \
+                  (media_random.random_sample(num_agents) < 
+                   self.Media.get_intensity())
+        if self.Media.reports:
+            agents.other_rs_sum[reached] += self.clip(
+                self.Media.get_rp_multiplier() * 
+                self.Hazard.get_rp_multiplier())
+            agents.other_rs_count[reached] += 1
+            self.Media.rs_sent += int(np.count_nonzero(reached))
+        
+        # only agents that received a risk signal adapt their risk 
+        # perception; risk signals from neighbours count as one signal
+        # with their mean magnitude
+        active = np.flatnonzero((agents.other_rs_count > 0) | 
+                                (agents.neighbour_rs_count > 0))
+        other_sum = agents.other_rs_sum[active]
+        num_magnitudes = agents.other_rs_count[active].astype(float)
+        neighbour_count = agents.neighbour_rs_count[active]
+        from_neighbours = neighbour_count > 0
+        other_sum[from_neighbours] += \
+            agents.neighbour_rs_sum[active][from_neighbours] / \
+            neighbour_count[from_neighbours]
+        num_magnitudes[from_neighbours] += 1
+        agents.rs_received[active] += neighbour_count
+        
+        rp = agents.risk_perception[active] * \
+             (other_sum / num_magnitudes + 
+              agents.benefit_multiplier[active] + 
+              agents.techn_fear_multiplier[active]) / 3.
+        np.clip(rp, 1, 5, out = rp)
+        agents.risk_perception[active] = rp
+        
+        # reset risk signals of the agents that processed them
+        agents.other_rs_sum[active] = 0
+        agents.other_rs_count[active] = 0
+        agents.neighbour_rs_sum[active] = 0
+        agents.neighbour_rs_count[active] = 0
+        
+        # the higher the agent's own risk perception, the higher the
+        # chance that it shares it with a random subset of its neighbours;
+        # one number per agent, so that paired scenarios stay aligned
+        shares = self.neighbour_random.random_sample(num_agents)[active] * \
+                 4 + 1 <= rp
+        rp_to_pass_on = self.clip(agents.rescale(rp[shares], 1, 5, 2, .1) *
+                                  self.Hazard.get_rp_multiplier())
+        self.send_to_neighbours(active[shares], rp_to_pass_on)
+    
+    def send_to_neighbours(self, senders, magnitudes):
+        """
+        Overview
+        ---------------
+        Every sender sends a risk signal to a random subset of between 1
+        and degree / 2 of its neighbours; senders with fewer than two
+        neighbours send nothing, see Agent.tick_behaviour(). The subsets
+        of all senders are drawn at once, see
+        CompactNetwork.random_neighbour_subsets(), and the risk signals
+        are added to the neighbours' counters with np.bincount, since a
+        neighbour can receive risk signals from several senders
+        
+        Input
+        ---------------
+        senders: array of agent indices
+        magnitudes: magnitude of the risk signal of each sender
+        """
+        agents = self.population
+        sizes, targets = self.network.random_neighbour_subsets(
+            senders, self.neighbour_random)
+        num_agents = agents.num_agents
+        agents.neighbour_rs_sum += np.bincount(
+            targets, weights = np.repeat(magnitudes, sizes),
+            minlength = num_agents).astype(agents.neighbour_rs_sum.dtype)
+        agents.neighbour_rs_count += np.bincount(
+            targets, minlength = num_agents).astype(
+                agents.neighbour_rs_count.dtype)
+        agents.rs_sent[senders] += sizes.astype(agents.rs_sent.dtype)
+        
+#==============================================================================
+# SequentialSimulation class
+#==============================================================================
+
+class SequentialSimulation(ArraySimulation):
+    """
+    Overview
+    ---------------
+    Runs the simulation on a CompactNetwork and an AgentPopulation like
+    ArraySimulation, but with the random sequential update of Simulation:
+    in every tick the agents are activated one after the other in random
+    order, and agents activated later already process the risk signals
+    sent by agents activated earlier in the same tick. The agents are
+    updated by sequential_tick(), which is compiled with Numba if it is
+    installed and runs as plain Python otherwise; both draw the same
+    random numbers, so runs with the same seed agree
+    """
+    def init_network(self, network, population):
+        """
+        Same as ArraySimulation.init_network()
+        """
+        ArraySimulation.init_network(self, network, population)
+        # neighbours of the activated agent, shuffled while sampling
+        self.scratch = np.empty(max(int(self.degree.max()), 1),
+                                dtype = network.indices.dtype)
+        
+    def run(self, publisher = None):
+        """
+        Same as ArraySimulation.run(); an agent can receive risk signals
+        from every neighbour in two ticks before it processes them, once
+        after and once before its activation
+        """
+        self.population.fit_counters(2 * int(self.degree.max()),
+                                     self.num_ticks)
+        return Simulation.run(self, publisher)
+        
+    def tick(self, tick):
+        """
+        Overview
+        ---------------
+        Behaviour for the whole simulation at each tick/time step
+        
+        Input
+        ---------------
+        tick: current tick/time step being executed
+        """
+        self.start_tick(tick)
+        self.institutions_tick(tick)
+        agents = self.population
+        num_agents = agents.num_agents
+        
+        # activates each agent in turn, no set order exists to eliminate
+        # first-mover biases; all random numbers of the tick are drawn
+        # beforehand, as many in every tick so that paired scenarios
+        # with common random numbers stay aligned
+        order = self.activation_random.permutation(num_agents)
+        agent_random = np.vstack(
+            [self.media_random.random_sample((2, num_agents)),
+             self.neighbour_random.random_sample((2, num_agents))])
+        sample_random = self.neighbour_random.random_sample(
+                            len(self.network.indices))
+        media_magnitude = float(self.clip(self.Media.get_rp_multiplier() *
+                                          self.Hazard.get_rp_multiplier()))
+        self.Media.rs_sent += sequential_tick(
+            order, self.network.indptr, self.network.indices,
+            agents.risk_perception, agents.benefit_multiplier,
+            agents.techn_fear_multiplier, agents.media_consumption,
+            agents.other_rs_sum, agents.other_rs_count,
+            agents.neighbour_rs_sum, agents.neighbour_rs_count,
+            agents.rs_sent, agents.rs_received, agent_random,
+            sample_random, self.scratch, bool(self.Media.reports),
+            float(self.Media.get_intensity()), media_magnitude,
+            float(self.Hazard.get_rp_multiplier()))
+        
 #==============================================================================
 # SystemState class    
 #==============================================================================
@@ -259,6 +813,133 @@ class SystemState:
         self.neighbour_rs = []
         self.avg_rp = []
         
+        # distribution of risk perceptions, only recorded if 
+        # init_distribution() is called
+        self.rp_bin_edges = None
+        self.rp_histogram = []
+        self.rp_quantiles = []
+        self.rp_var = []
+        
+        # neighbourhood metrics, only recorded if init_network_metrics()
+        # is called
+        self.edge_sources = None
+        self.mean_neighbour_rp = []
+        self.edge_rp_diff = []
+        self.edge_agreement = []
+        self.color_assortativity = []
+        
+    def init_distribution(self, num_bins = 40, 
+                          quantiles = [.05, .25, .5, .75, .95]):
+        """
+        Overview
+        ---------------
+        Switches on recording of the distribution of risk perceptions at
+        every time step: a histogram with num_bins equally wide bins
+        between 1 and 5, the given quantiles and the variance
+        
+        Input
+        ---------------
+        num_bins: number of histogram bins; the last bin includes 5
+        quantiles: list of probabilities between 0 and 1
+        """
+        self.rp_bin_edges = np.linspace(1, 5, num_bins + 1)
+        self.quantile_probs = list(quantiles)
+        
+    def needs_rp_array(self):
+        """
+        True if the distribution or the network metrics are recorded, 
+        which need the rp_array reported after Simulation.init_rp_report()
+        """
+        return self.rp_bin_edges is not None or \
+               self.edge_sources is not None
+        
+    def record_distribution(self, rp_array):
+        """
+        Overview
+        ---------------
+        Records histogram, quantiles and variance of an array of risk 
+        perceptions; the histogram is computed with a single bincount over
+        the bin indices and stored as the smallest sufficient integer type
+        """
+        num_bins = len(self.rp_bin_edges) - 1
+        bin_width = 4. / num_bins
+        index = ((rp_array - 1) / bin_width).astype(np.intp)
+        np.clip(index, 0, num_bins - 1, out = index)
+        counts = np.bincount(index, minlength = num_bins)
+        if len(rp_array) < 2**16:
+            counts = counts.astype(np.uint16)
+        else:
+            counts = counts.astype(np.uint32)
+        self.rp_histogram.append(counts)
+        self.rp_quantiles.append(np.percentile(rp_array, 
+                                 [100 * q for q in self.quantile_probs]))
+        self.rp_var.append(np.var(rp_array))
+
+    def init_network_metrics(self, sources, targets, num_nodes):
+        """
+        Overview
+        ---------------
+        Switches on recording of neighbourhood metrics at every time step:
+        the mean over all agents of the average risk perception of their
+        neighbours, the mean absolute difference in risk perception along
+        edges, the fraction of edges between agents of the same color and
+        the assortativity coefficient of colors (Newman 2003)
+        
+        Input
+        ---------------
+        sources, targets: arrays with every edge once, as returned by
+                   Simulation.network_edges()
+        num_nodes: number of nodes of the network
+        """
+        self.edge_sources = np.asarray(sources)
+        self.edge_targets = np.asarray(targets)
+        self.node_degree = np.bincount(self.edge_sources, 
+                                       minlength = num_nodes) + \
+                           np.bincount(self.edge_targets, 
+                                       minlength = num_nodes)
+        self.has_neighbours = self.node_degree > 0
+        
+    def record_network_metrics(self, rp_array):
+        """
+        Overview
+        ---------------
+        Records the neighbourhood metrics of an array of risk perceptions;
+        the sums over the neighbours of every agent are sparse products of
+        the adjacency matrix and the risk perceptions computed with 
+        bincount, so that each time step costs O(num_edges)
+        """
+        sources = self.edge_sources
+        targets = self.edge_targets
+        num_nodes = len(self.node_degree)
+        rp_sources = rp_array[sources]
+        rp_targets = rp_array[targets]
+        
+        neighbour_sum = np.bincount(sources, rp_targets, num_nodes) + \
+                        np.bincount(targets, rp_sources, num_nodes)
+        self.mean_neighbour_rp.append(np.mean(
+            neighbour_sum[self.has_neighbours] / 
+            self.node_degree[self.has_neighbours]))
+        self.edge_rp_diff.append(np.mean(np.abs(rp_sources - rp_targets)))
+        
+        # color categories as in Agent.update_color()
+        colors_sources = np.searchsorted([2., 3., 4.], rp_sources, 
+                                         side = "right")
+        colors_targets = np.searchsorted([2., 3., 4.], rp_targets, 
+                                         side = "right")
+        self.edge_agreement.append(np.mean(colors_sources == colors_targets))
+        
+        # symmetric mixing matrix of colors along edges, normalised to 1
+        mixing = np.bincount(colors_sources * 4 + colors_targets, 
+                             minlength = 16).reshape(4, 4).astype(float)
+        mixing = (mixing + mixing.T) / (2. * len(sources))
+        expected = np.sum(mixing.sum(axis = 1) ** 2)
+        if expected < 1:
+            self.color_assortativity.append((np.trace(mixing) - expected) /
+                                            (1 - expected))
+        else:
+            # all agents have the same color
+            self.color_assortativity.append(np.nan)
+
     def record_data(self, data_dict):
         """
         Overview
@@ -280,6 +961,88 @@ class SystemState:
         self.grid_rs.append(data_dict["grid_rs_sent"])
         self.neighbour_rs.append(data_dict["neighbour_rs_sent"])
         self.avg_rp.append(data_dict["curr_avg_rp"])
+        if self.rp_bin_edges is not None and "rp_array" in data_dict:
+            self.record_distribution(data_dict["rp_array"])
+        if self.edge_sources is not None and "rp_array" in data_dict:
+            self.record_network_metrics(data_dict["rp_array"])
+
+    def carry_forward(self, length):
+        """
+        Overview
+        ---------------
+        Fills up the recorded lists to the given length by carrying the
+        last recorded (steady) state forward; used after a run has been 
+        terminated early because it converged. Numbers of agents per color
+        and average risk perception are repeated, the numbers of risk
+        signals sent are filled with 0 instead of being repeated: the
+        government and the hazard have stopped sending and neighbours
+        send at most ConvergenceSignalTolerance signals per tick (0 by
+        default). The filled media_rs values are an approximation: the 
+        media may still reach a few agents, as its intensity is only 
+        below ConvergenceMediaTolerance and not 0, see check_convergence()
+        
+        Input
+        ---------------
+        length: length all lists should have, usually num_ticks + 1
+        """
+        missing = length - len(self.avg_rp)
+        if missing <= 0 or len(self.avg_rp) == 0:
+            return
+        for lst in [self.green, self.yellow, self.orange, self.red, 
+                    self.avg_rp]:
+            lst.extend([lst[-1]] * missing)
+        for lst in [self.gov_rs, self.media_rs, self.grid_rs, 
+                    self.neighbour_rs]:
+            lst.extend([0] * missing)
+        if len(self.rp_histogram) > 0:
+            for lst in [self.rp_histogram, self.rp_quantiles, self.rp_var]:
+                lst.extend([lst[-1]] * missing)
+        if len(self.edge_agreement) > 0:
+            for lst in [self.mean_neighbour_rp, self.edge_rp_diff,
+                        self.edge_agreement, self.color_assortativity]:
+                lst.extend([lst[-1]] * missing)
+
+    def return_distribution(self):
+        """
+        Returns dictionary with the recorded distribution of risk 
+        perceptions as arrays with one row per time step
+        """
+        return {"rp_bin_edges": self.rp_bin_edges,
+                "rp_histogram": np.array(self.rp_histogram),
+                "rp_quantile_probs": np.array(self.quantile_probs),
+                "rp_quantiles": np.array(self.rp_quantiles),
+                "rp_var": np.array(self.rp_var)}
+    
+    def save_distribution(self, num_run):
+        """
+        Saves the recorded distribution of risk perceptions in a 
+        compressed numpy file named after the number of the current run
+        """
+        np.savez_compressed("%s_rp_distribution.npz" % num_run, 
+                            **self.return_distribution())
+
+    def return_network_metrics(self):
+        """
+        Returns dictionary with the recorded neighbourhood metrics
+        """
+        return {"mean_neighbour_rp": self.mean_neighbour_rp,
+                "edge_rp_diff": self.edge_rp_diff,
+                "edge_agreement": self.edge_agreement,
+                "color_assortativity": self.color_assortativity}
+    
+    def save_network_metrics(self, num_run):
+        """
+        Saves the recorded neighbourhood metrics in a file named after the
+        number of the current run, one line per metric starting with its
+        name
+        """
+        outfile = open("%s_network_metrics.csv" % num_run, "w")
+        metrics = self.return_network_metrics()
+        for name in ["mean_neighbour_rp", "edge_rp_diff", "edge_agreement",
+                     "color_assortativity"]:
+            outfile.write(', '.join([name] + [str(value) for value in 
+                                              metrics[name]]) + '\n')
+        outfile.close()
 
     def return_data(self):
         """
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import csv
+import unittest
+import numpy as np
+from engine_validation import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+def synthetic_runs(num_runs, shift = 0., seed = None, num_ticks = 11):
+    """
+    Runs whose variables are normally distributed around a per-tick mean,
+    with standard deviation .5 for avg_rp and 10 for all other variables
+    """
+    random_state = np.random.RandomState(seed)
+    ticks = np.arange(num_ticks)
+    runs = []
+    for run in range(num_runs):
+        data = {}
+        for var in compared_variables:
+            scale = .5 if var == "avg_rp" else 10.
+            data[var] = (ticks + shift +
+                         random_state.normal(0, 1, num_ticks)) * scale
+        runs.append(data)
+    return runs
+
+class StatisticsTest(unittest.TestCase):
+    def test_normal_quantile(self):
+        # reference values of scipy.stats.norm.ppf
+        self.assertAlmostEqual(normal_quantile(.975), 1.959963984540054, 9)
+        self.assertAlmostEqual(normal_quantile(1 - .01 / 51),
+                               3.5453064560394094, 9)
+        self.assertAlmostEqual(normal_quantile(.5), 0, 9)
+
+    def test_ks_2samp(self):
+        x = np.linspace(0, 1, 200)
+        statistic, p_value = ks_2samp(x, np.linspace(.1, 1.1, 150))
+        self.assertAlmostEqual(statistic, .105, 9)
+        # scipy.stats.ks_2samp gives .28 with a different approximation
+        self.assertTrue(.2 < p_value < .4)
+        self.assertEqual(ks_2samp(x, x)[1], 1.)
+        self.assertTrue(ks_2samp(x, x + .5)[1] < 1e-6)
+
+class EquivalenceTest(unittest.TestCase):
+    def setUp(self):
+        self.num_runs = equivalence_runs(11)
+
+    def compare(self, shift, seed):
+        reference = synthetic_runs(self.num_runs, seed = seed)
+        runs = synthetic_runs(self.num_runs, shift, seed = seed + 1)
+        tolerances = default_engine_tolerances(reference)
+        return compare_runs(reference, runs, tolerances = tolerances,
+                            power = 1 - .2 / len(tolerances))
+
+    def test_tolerances(self):
+        tolerances = default_engine_tolerances(synthetic_runs(1000, seed = 1))
+        self.assertAlmostEqual(tolerances["avg_rp"], .25, 1)
+        self.assertAlmostEqual(tolerances["green"], 5, 0)
+
+    def test_agreeing_runs_pass(self):
+        # the default run count passes for all variables with probability
+        # of at least .8, so most seeds must pass
+        passed = [all(result["passed"] for result in
+                      self.compare(0., seed).values())
+                  for seed in range(0, 20, 2)]
+        self.assertTrue(sum(passed) >= 7)
+
+    def test_differing_runs_fail(self):
+        results = self.compare(1., 0)
+        self.assertFalse(any(result["passed"] for result in
+                             results.values()))
+        self.assertTrue(all(result["ticks_rejected"] > 0 for result in
+                            results.values()))
+
+    def test_deterministic_variable(self):
+        reference = synthetic_runs(20, seed = 0)
+        runs = synthetic_runs(20, seed = 1)
+        for run in reference + runs:
+            run["gov_rs"] = np.arange(11.)
+        tolerances = default_engine_tolerances(reference)
+        self.assertEqual(tolerances["gov_rs"], 0)
+        result = compare_runs(reference, runs, tolerances = tolerances)
+        self.assertTrue(result["gov_rs"]["passed"])
+        self.assertEqual(result["gov_rs"]["runs_needed"], 2)
+        runs[0]["gov_rs"] = np.arange(1., 12.)
+        result = compare_runs(reference, runs, tolerances = tolerances)
+        self.assertFalse(result["gov_rs"]["passed"])
+        self.assertEqual(result["gov_rs"]["runs_needed"], None)
+
+    def test_runs_needed(self):
+        results = self.compare(0., 2)
+        for var in results:
+            self.assertTrue(.5 * self.num_runs < results[var]["runs_needed"]
+                            < 2 * self.num_runs)
+
+class ValidationReportTest(unittest.TestCase):
+    """
+    Checks the report of the default scenario in engine_validation.csv,
+    see readme.txt
+    """
+    def test_report(self):
+        infile = open(os.path.join(os.path.dirname(
+                          os.path.abspath(__file__)), "engine_validation.csv"))
+        rows = list(csv.DictReader(infile, skipinitialspace = True))
+        infile.close()
+        passed = {}
+        for row in rows:
+            passed.setdefault(row["engine"], {})[row["variable"]] = \
+                row["passed"] == "True"
+        self.assertEqual(sorted(passed), sorted(default_engines))
+        for name in passed:
+            self.assertEqual(sorted(passed[name]), sorted(compared_variables))
+        self.assertTrue(all(passed["sequential"].values()))
+        self.assertFalse(passed["array"]["avg_rp"])
+
+if __name__ == "__main__":
+    unittest.main()
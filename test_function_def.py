@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from function_def import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+class EdgeListTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        filename = os.path.join(self.directory, name)
+        outfile = open(filename, "w")
+        outfile.write(text)
+        outfile.close()
+        return filename
+
+    def neighbours(self, network):
+        # adjacency by original node id
+        return dict((network.node_ids[node],
+                     sorted(network.node_ids[neighbour] for neighbour
+                            in network.neighbors(node)))
+                    for node in range(network.num_nodes()))
+
+    def test_integer_ids(self):
+        # comments, a duplicate in the other direction, a self loop and
+        # ids that are not consecutive
+        filename = self.write("edges.txt", "# comment\n10 30 .5\n"
+                                           "30 10\n20 20\n30 20\n")
+        network, population = load_edge_list(AgentPopulation, filename,
+                                              chunk_size = 2, seed = 1)
+        self.assertEqual(list(network.node_ids), [10, 20, 30])
+        self.assertEqual(network.num_edges(), 2)
+        self.assertEqual(self.neighbours(network),
+                         {10: [30], 20: [30], 30: [10, 20]})
+
+    def test_csv_header(self):
+        # detected above integer ids, to be given above other ids
+        filename = self.write("edges.csv", "source,target\n2,1\n3,1\n")
+        network, seed = load_edge_list(None, filename, delimiter = ",",
+                                       seed = 3)
+        self.assertEqual(seed, 3)
+        self.assertEqual(self.neighbours(network),
+                         {1: [2, 3], 2: [1], 3: [1]})
+        filename = self.write("edges.csv", "source,target\nb,a\nc,a\n")
+        network, seed = load_edge_list(None, filename, delimiter = ",",
+                                       skip_header = True)
+        self.assertEqual(self.neighbours(network),
+                         {"a": ["b", "c"], "b": ["a"], "c": ["a"]})
+
+    def test_binary(self):
+        filename = os.path.join(self.directory, "edges.bin")
+        np.array([5, 7, 7, 9, 9, 5], dtype = np.int32).tofile(filename)
+        network, seed = load_edge_list(None, filename, chunk_size = 1,
+                                       binary_dtype = np.int32)
+        self.assertEqual(list(network.node_ids), [5, 7, 9])
+        self.assertEqual(network.num_edges(), 3)
+
+    def test_bad_integer_id(self):
+        filename = self.write("edges.txt", "1 2\n2 x\n")
+        self.assertRaises(ValueError, load_edge_list, None, filename,
+                          integer_ids = True)
+
+if __name__ == "__main__":
+    unittest.main()
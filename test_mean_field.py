@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import unittest
+import numpy as np
+from mean_field import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+class MeanFieldReproducibilityTest(unittest.TestCase):
+    def setUp(self):
+        self.parameters = default_parameters()
+        self.parameters.update(num_ticks = 20)
+
+    def test_same_seed(self):
+        result_a = run_mean_field(self.parameters, 100, seed = 3)
+        # the global random modules must not matter
+        rnd.seed(1)
+        np.random.seed(1)
+        result_b = run_mean_field(self.parameters, 100, seed = 3)
+        for var in result_a:
+            np.testing.assert_array_equal(result_a[var], result_b[var],
+                                          err_msg = var)
+
+    def test_different_seeds(self):
+        self.assertFalse(np.array_equal(
+            run_mean_field(self.parameters, 100, seed = 3)["avg_rp"],
+            run_mean_field(self.parameters, 100, seed = 4)["avg_rp"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from plot_sweep_results import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+def mean_results_data(num_ticks = 10, scale = 1.):
+    """
+    Per-tick means of a scenario with 100 agents
+    """
+    data = dict((var, np.linspace(0, scale, num_ticks + 1))
+                for var in variables)
+    data["green"] = np.full(num_ticks + 1, 100.)
+    for var in ["yellow", "orange", "red"]:
+        data[var] = np.zeros(num_ticks + 1)
+    return data
+
+class IncrementalPlotTest(unittest.TestCase):
+    """
+    Figures are rendered again only if the results have changed
+    """
+    def setUp(self):
+        self.scenario_dir = tempfile.mkdtemp()
+        self.results_file = os.path.join(self.scenario_dir,
+                                         "mean_results.npz")
+
+    def tearDown(self):
+        shutil.rmtree(self.scenario_dir)
+
+    def render(self):
+        return plot_scenario((self.scenario_dir, "mean_results.npz",
+                              False))[1]
+
+    def test_unchanged_results_are_skipped(self):
+        save_mean_results(mean_results_data(), self.results_file)
+        self.assertEqual(self.render(), len(figures))
+        # same arrays in a file with different bytes
+        np.savez_compressed(self.results_file, **mean_results_data())
+        self.assertEqual(self.render(), 0)
+
+    def test_changed_results_are_rendered(self):
+        save_mean_results(mean_results_data(), self.results_file)
+        self.render()
+        save_mean_results(mean_results_data(scale = 2.), self.results_file)
+        self.assertEqual(self.render(), len(figures))
+
+    def test_digest_depends_on_contents_only(self):
+        data = mean_results_data()
+        self.assertEqual(results_digest(data),
+                         results_digest(dict(data)))
+        data["avg_rp"] = data["avg_rp"].astype(np.float32)
+        self.assertNotEqual(results_digest(data),
+                            results_digest(mean_results_data()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import shutil
+import tempfile
+import unittest
+from queue_class_def import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue_dir = tempfile.mkdtemp()
+        self.queue = WorkQueue(self.queue_dir, lease_seconds = 600,
+                               max_attempts = 2)
+        self.queue.submit("job", {"num_nodes": 10}, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.queue_dir)
+
+    def expire(self, job):
+        # lease claimed and last renewed long ago
+        os.utime(job["lease"], (0, 0))
+        old_lease = self.queue.lease_path(job["id"], "worker", 0.)
+        os.rename(job["lease"], old_lease)
+
+    def test_claim_once(self):
+        self.assertFalse(self.queue.submit("job", {}, 1))
+        job = self.queue.claim("worker")
+        self.assertEqual(job["parameters"], {"num_nodes": 10})
+        self.assertEqual(self.queue.claim("other"), None)
+        self.assertFalse(self.queue.submit("job", {}, 1))
+        self.assertEqual(self.queue.status()["leases"], 1)
+
+    def test_complete(self):
+        job = self.queue.claim("worker")
+        self.queue.complete(job, {"avg_rp": [1, 2]})
+        self.assertTrue(self.queue.done())
+        self.assertEqual(self.queue.result("job"), {"avg_rp": [1, 2]})
+        # a second result of the same job is dropped
+        self.queue.complete(job, {"avg_rp": [3]})
+        self.assertEqual(self.queue.result("job"), {"avg_rp": [1, 2]})
+
+    def test_recover_expired_lease(self):
+        job = self.queue.claim("worker")
+        self.assertEqual(self.queue.recover(), [])
+        self.assertTrue(self.queue.heartbeat(job))
+        self.expire(job)
+        self.assertEqual(self.queue.recover(), ["job"])
+        self.assertEqual(self.queue.status()["jobs"], 1)
+        # the lease of the first worker is lost
+        self.assertFalse(self.queue.heartbeat(job))
+
+    def test_fail(self):
+        for attempt in range(2):
+            job = self.queue.claim("worker")
+            self.queue.fail(job, "error")
+        self.assertEqual(self.queue.status(), {"jobs": 0, "leases": 0,
+                                               "results": 0, "failed": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import unittest
+import numpy as np
+from replicate_runner import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+def small_parameters(**changes):
+    """
+    Scenario small enough to run in a fraction of a second
+    """
+    parameters = default_parameters()
+    parameters.update(num_nodes = 100, num_ticks = 15, num_rp_bins = 10,
+                      network_metrics = True)
+    parameters.update(changes)
+    return parameters
+
+class ReproducibilityTest(unittest.TestCase):
+    """
+    Replicates run with the same seed must return identical results,
+    since adaptive_replicates(), crn_comparison(), validate_precision()
+    and the sensitivity analysis rely on it
+    """
+    def assertSameResults(self, result_a, result_b):
+        self.assertEqual(sorted(result_a), sorted(result_b))
+        for key in result_a:
+            np.testing.assert_array_equal(np.asarray(result_a[key]),
+                                          np.asarray(result_b[key]),
+                                          err_msg = key)
+
+    def test_same_seed(self):
+        for engine in ["object", "array", "sequential"]:
+            parameters = small_parameters(engine = engine)
+            self.assertSameResults(run_replicate(parameters, 5),
+                                   run_replicate(parameters, 5))
+
+    def test_same_seed_common_random_numbers(self):
+        for engine in ["object", "array", "sequential"]:
+            parameters = small_parameters(engine = engine)
+            self.assertSameResults(run_replicate(parameters, 5, True),
+                                   run_replicate(parameters, 5, True))
+
+    def test_different_seeds(self):
+        parameters = small_parameters()
+        self.assertFalse(np.array_equal(run_replicate(parameters, 5)["avg_rp"],
+                                        run_replicate(parameters, 6)["avg_rp"]))
+
+if __name__ == "__main__":
+    unittest.main()
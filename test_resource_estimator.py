@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import unittest
+import warnings
+from resource_estimator import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+def synthetic_profile(parameters):
+    """
+    Profile of a replicate whose memory and times follow known costs:
+    .05 s plus 1e-5 s per agent outside the ticks, 1e-4 s plus 2e-6 s per
+    agent and 1e-9 s per squared agent in every tick, 30 MB plus 2 kB per
+    agent
+    """
+    n = parameters["num_nodes"]
+    per_tick = 1e-4 + 2e-6 * n + 1e-9 * n * n
+    return {"phases": [("network", {"seconds": .05 + 1e-5 * n}),
+                       ("ticks", {"seconds": .8 * per_tick *
+                                             parameters["num_ticks"]}),
+                       ("recording", {"seconds": .2 * per_tick *
+                                                 parameters["num_ticks"]})],
+            "peak": 30e6 + 2e3 * n}
+
+def small_calibration():
+    configurations = []
+    for num_nodes in [100, 200, 400]:
+        for num_edges in [2, 4]:
+            for num_ticks in [5, 10]:
+                parameters = default_parameters()
+                parameters.update(num_nodes = num_nodes,
+                                  num_edges = num_edges,
+                                  num_ticks = num_ticks,
+                                  num_affected = num_nodes // 5)
+                configurations.append(parameters)
+    return configurations
+
+class ResourceEstimatorTest(unittest.TestCase):
+    def setUp(self):
+        self.configurations = small_calibration()
+        self.model = fit_resource_model(self.configurations,
+                                        [synthetic_profile(p) for p
+                                         in self.configurations])
+
+    def scenario(self, **changes):
+        parameters = default_parameters()
+        parameters.update(num_nodes = 150, num_edges = 2, num_ticks = 8)
+        parameters.update(changes)
+        return parameters
+
+    def test_known_costs(self):
+        for num_ticks in [5, 8, 10]:
+            parameters = self.scenario(num_ticks = num_ticks)
+            profile = synthetic_profile(parameters)
+            estimate = estimate_resources(parameters, self.model)
+            seconds = sum(phase["seconds"] for name, phase
+                          in profile["phases"])
+            self.assertTrue(estimate["in_range"])
+            self.assertAlmostEqual(estimate["seconds"] / seconds, 1, 3)
+            self.assertAlmostEqual(estimate["memory"] / profile["peak"], 1,
+                                   3)
+
+    def test_time_grows_with_ticks(self):
+        estimates = [estimate_resources(self.scenario(num_ticks = t),
+                                        self.model)["seconds"]
+                     for t in [5, 6, 7]]
+        self.assertAlmostEqual(estimates[1] - estimates[0],
+                               estimates[2] - estimates[1])
+        self.assertTrue(estimates[1] > estimates[0])
+
+    def test_outside_calibration_range(self):
+        parameters = self.scenario(num_nodes = 10)
+        self.assertRaises(ValueError, estimate_resources, parameters,
+                          self.model, strict = True)
+        with warnings.catch_warnings(record = True) as caught:
+            warnings.simplefilter("always")
+            estimate = estimate_resources(parameters, self.model)
+        self.assertEqual(len(caught), 1)
+        self.assertFalse(estimate["in_range"])
+        # never below the smallest values seen in the calibration
+        self.assertTrue(estimate["memory"] >= self.model["object"]
+                                                        ["min_memory"])
+        self.assertTrue(estimate["seconds"] > 0)
+
+    def test_max_processes_floor(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            processes = max_processes(self.scenario(num_nodes = 1), 16e9,
+                                      self.model)
+        self.assertTrue(processes <= 16e9 //
+                        self.model["object"]["min_memory"])
+
+    def test_recorders_add_memory(self):
+        plain = estimate_resources(self.scenario(), self.model)["memory"]
+        for changes in [{"num_rp_bins": 40}, {"network_metrics": True},
+                        {"agent_records": True}]:
+            self.assertTrue(estimate_resources(self.scenario(**changes),
+                                               self.model)["memory"] > plain)
+        self.assertTrue(estimate_resources(self.scenario(), self.model,
+                                           trajectories = True)["memory"] >
+                        plain)
+
+    def test_calibration_runs(self):
+        configurations = self.configurations[::3]
+        model = calibrate_estimator(configurations, seed = 1,
+                                    model_file = None)
+        estimate = estimate_resources(configurations[0], model)
+        self.assertTrue(estimate["memory"] > 0)
+        self.assertTrue(estimate["seconds"] > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import unittest
+import numpy as np
+from sensitivity_analysis import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+class SobolIndicesTest(unittest.TestCase):
+    def test_additive_function(self):
+        # y = x_1 + 2 x_2 on the unit cube: first order and total indices
+        # are 1/5 and 4/5, x_3 has no influence
+        num_samples = 1024
+        design = saltelli_design(num_samples, 3)
+        Y = design[:, 0] + 2 * design[:, 1]
+        first, total = sobol_indices(Y, num_samples, 3)
+        np.testing.assert_allclose(first, [.2, .8, 0], atol = .02)
+        np.testing.assert_allclose(total, [.2, .8, 0], atol = .02)
+
+class PairedRunsTest(unittest.TestCase):
+    def test_parameter_without_influence(self):
+        # ConvergenceTolerance has no influence without convergence checks,
+        # so rows of A and AB_i that share a seed must give equal outputs
+        parameter_ranges = {"HazardMultiplier": (.7, 1.3, False),
+                            "ConvergenceTolerance": (.001, .1, False)}
+        for engine in ["object", "array", "sequential"]:
+            base_parameters = default_parameters()
+            base_parameters.update(num_nodes = 60, num_ticks = 10,
+                                   engine = engine)
+            results = sensitivity_analysis(4, base_parameters,
+                                           parameter_ranges, seed = 1,
+                                           outfile_name = None)
+            for output in results:
+                self.assertEqual(results[output]["ConvergenceTolerance"],
+                                 (0., 0.))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from trajectory_class_def import *
+
+#==============================================================================
+# Tests
+#==============================================================================
+
+class TrajectoryCodecTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "test.traj")
+        random_state = np.random.RandomState(1)
+        # risk perceptions of 10 agents over 20 ticks, most of them
+        # unchanged from tick to tick
+        steps = random_state.normal(0, .3, (20, 10)) * \
+                (random_state.random_sample((20, 10)) < .2)
+        self.rp = np.clip(3 + np.cumsum(steps, axis = 0), 1, 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, codec = "zlib", length = None):
+        writer = TrajectoryWriter(self.filename, codec = codec,
+                                  ticks_per_chunk = 4, agents_per_chunk = 3)
+        for run in [0, 1]:
+            writer.start_run(run, 10)
+            for rp_array in self.rp[:15] if length else self.rp:
+                writer.add(rp_array)
+            writer.end_run(length)
+        writer.close()
+        return writer
+
+    def test_round_trip(self):
+        for codec in available_codecs():
+            self.write(codec)
+            reader = TrajectoryReader(self.filename)
+            self.assertEqual(reader.run_numbers(), [0, 1])
+            np.testing.assert_allclose(reader.read(1), self.rp,
+                                       atol = .0005 + 1e-12)
+            np.testing.assert_allclose(reader.read(0, 5, 13, 2, 8),
+                                       self.rp[5:13, 2:8],
+                                       atol = .0005 + 1e-12)
+            reader.close()
+
+    def test_carry_forward(self):
+        self.write(length = 20)
+        reader = TrajectoryReader(self.filename)
+        data = reader.read(0)
+        self.assertEqual(data.shape, (20, 10))
+        for tick in range(15, 20):
+            np.testing.assert_array_equal(data[tick], data[14])
+        reader.close()
+
+    def test_ranges(self):
+        self.write()
+        reader = TrajectoryReader(self.filename)
+        self.assertRaises(KeyError, reader.read, 2)
+        self.assertRaises(ValueError, reader.read, 0, 0, 21)
+        self.assertRaises(ValueError, reader.read, 0, 0, None, 0, 11)
+        reader.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+#==============================================================================
+# Imports
+#==============================================================================
+
+import os
+import bz2
+import json
+import time
+import zlib
+import numpy as np
+
+try:
+    import lzma
+except ImportError:
+    # not part of the standard library before Python 3.3
+    lzma = None
+
+#==============================================================================
+# Compression codecs
+#==============================================================================
+
+def _compress(data, codec, level):
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    elif codec == "bz2":
+        return bz2.compress(data, max(level, 1))
+    elif codec == "lzma":
+        return lzma.compress(data, preset = level)
+    raise ValueError("unknown codec %s" % codec)
+
+def _decompress(data, codec):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    elif codec == "bz2":
+        return bz2.decompress(data)
+    elif codec == "lzma":
+        return lzma.decompress(data)
+    raise ValueError("unknown codec %s" % codec)
+
+def available_codecs():
+    """
+    Returns the codecs that can be used in this Python installation
+    """
+    codecs = ["zlib", "bz2"]
+    if lzma is not None:
+        codecs.append("lzma")
+    return codecs
+
+#==============================================================================
+# Classes
+#==============================================================================
+
+class TrajectoryWriter:
+    """
+    Overview
+    ---------------
+    Stores the risk perceptions of all agents at every tick of many runs
+    in a compressed file: risk perceptions are quantized to multiples of
+    resolution between 1 and 5, the ticks of a run are cut into chunks of
+    ticks_per_chunk ticks and agents_per_chunk agents, and every chunk is
+    delta-encoded along the ticks (most agents do not change their risk
+    perception in a tick, so most deltas are 0) and compressed separately.
+    The positions of the chunks are kept in an index file written by
+    close(), so that TrajectoryReader can read any run, range of ticks or
+    range of agents without decompressing the rest
+    """
+    def __init__(self, filename, resolution = .001, codec = "zlib",
+                 level = 6, ticks_per_chunk = 16, agents_per_chunk = 2**16):
+        """
+        filename: name of the data file; the index is written to
+                  filename + ".json"
+        resolution: step of the quantized risk perceptions
+        codec: "zlib", "bz2" or, from Python 3.3, "lzma"
+        level: compression level of the codec
+        ticks_per_chunk, agents_per_chunk: size of the chunks, i.e. of the
+                  smallest unit that is decompressed when reading
+        """
+        if codec not in available_codecs():
+            raise ValueError("codec %s is not available" % codec)
+        self.filename = filename
+        self.resolution = resolution
+        self.codec = codec
+        self.level = level
+        self.ticks_per_chunk = ticks_per_chunk
+        self.agents_per_chunk = agents_per_chunk
+
+        # smallest unsigned type that holds all quantized values; deltas
+        # are stored in the same type and wrap around
+        self.num_levels = int(round(4. / resolution))
+        for dtype in [np.uint8, np.uint16, np.uint32]:
+            if self.num_levels <= np.iinfo(dtype).max:
+                self.dtype = np.dtype(dtype)
+                break
+
+        self.outfile = open(filename, "wb")
+        self.offset = 0
+        self.chunks = []
+        self.runs = {}
+        self.run = None
+        self.raw_bytes = 0
+        self.write_time = 0.
+
+    def quantize(self, rp_array):
+        """
+        Returns the risk perceptions as multiples of resolution above 1
+        """
+        levels = np.rint((np.asarray(rp_array, dtype = np.float64) - 1) /
+                         self.resolution)
+        np.clip(levels, 0, self.num_levels, out = levels)
+        return levels.astype(self.dtype)
+
+    def start_run(self, run, num_agents):
+        """
+        Starts recording run number run with num_agents agents; ends the
+        previous run if necessary
+        """
+        if self.run is not None:
+            self.end_run()
+        self.run = run
+        self.num_agents = num_agents
+        self.tick = 0
+        self.buffer = []
+
+    def add(self, rp_array):
+        """
+        Records the risk perceptions of all agents at the next tick of
+        the current run, e.g. the rp_array reported by
+        Simulation.report_state() after Simulation.init_rp_report()
+        """
+        start = time.time()
+        self.buffer.append(self.quantize(rp_array))
+        self.raw_bytes += len(rp_array) * 8
+        self.write_time += time.time() - start
+        if len(self.buffer) == self.ticks_per_chunk:
+            self.flush()
+
+    def flush(self):
+        """
+        Compresses and writes the buffered ticks of the current run
+        """
+        if len(self.buffer) == 0:
+            return
+        start = time.time()
+        block = np.array(self.buffer)
+        deltas = block.copy()
+        deltas[1:] -= block[:-1]
+        for agent_start in range(0, self.num_agents, self.agents_per_chunk):
+            chunk = np.ascontiguousarray(deltas[:, agent_start:agent_start +
+                                                self.agents_per_chunk])
+            data = _compress(chunk.tobytes(), self.codec, self.level)
+            self.outfile.write(data)
+            self.chunks.append([self.run, self.tick, agent_start,
+                                chunk.shape[0], chunk.shape[1],
+                                self.offset, len(data)])
+            self.offset += len(data)
+        self.tick += len(self.buffer)
+        self.buffer = []
+        self.write_time += time.time() - start
+
+    def end_run(self, length = None):
+        """
+        Ends the current run; if length is given, the last recorded tick
+        is repeated until the run has length ticks, like in
+        SystemState.carry_forward()
+        """
+        if self.run is None:
+            return
+        if length is not None and len(self.buffer) + self.tick > 0:
+            last = self.buffer[-1] if len(self.buffer) > 0 else \
+                   self.read_last()
+            while self.tick + len(self.buffer) < length:
+                self.buffer.append(last)
+                self.raw_bytes += self.num_agents * 8
+                if len(self.buffer) == self.ticks_per_chunk:
+                    self.flush()
+        self.flush()
+        self.runs[str(self.run)] = {"num_agents": self.num_agents,
+                                    "num_ticks": self.tick}
+        self.run = None
+
+    def read_last(self):
+        """
+        Returns the quantized risk perceptions of the last tick already
+        written to file
+        """
+        self.outfile.flush()
+        index = self.index()
+        index["runs"] = dict(self.runs)
+        index["runs"][str(self.run)] = {"num_agents": self.num_agents,
+                                        "num_ticks": self.tick}
+        reader = TrajectoryReader(self.filename, index)
+        last = reader.read(self.run, self.tick - 1, self.tick, 0,
+                           self.num_agents)[0]
+        reader.close()
+        return self.quantize(last)
+
+    def index(self):
+        """
+        Returns the index of the file as a dictionary
+        """
+        return {"resolution": self.resolution,
+                "dtype": self.dtype.str,
+                "codec": self.codec,
+                "ticks_per_chunk": self.ticks_per_chunk,
+                "agents_per_chunk": self.agents_per_chunk,
+                "runs": self.runs,
+                "chunks": self.chunks}
+
+    def close(self):
+        """
+        Ends the current run and writes the index
+        """
+        self.end_run()
+        self.outfile.close()
+        outfile = open(self.filename + ".json", "w")
+        json.dump(self.index(), outfile)
+        outfile.close()
+
+    def report(self):
+        """
+        Returns the compression ratio (size of the risk perceptions as
+        float64 over size of the file) and the write throughput in
+        megabytes of float64 risk perceptions per second
+        """
+        return {"raw_bytes": self.raw_bytes,
+                "compressed_bytes": self.offset,
+                "ratio": self.raw_bytes / float(max(self.offset, 1)),
+                "write_mb_per_s": self.raw_bytes / 1e6 /
+                                  max(self.write_time, 1e-9)}
+
+
+class TrajectoryReader:
+    """
+    Overview
+    ---------------
+    Reads files written by TrajectoryWriter; only the chunks overlapping
+    the requested ticks and agents are decompressed
+    """
+    def __init__(self, filename, index = None):
+        """
+        filename: name of the data file
+        index: index dictionary, read from filename + ".json" if None
+        """
+        if index is None:
+            infile = open(filename + ".json", "r")
+            index = json.load(infile)
+            infile.close()
+        self.filename = filename
+        self.resolution = index["resolution"]
+        self.dtype = np.dtype(str(index["dtype"]))
+        self.codec = index["codec"]
+        self.runs = dict((int(run), meta) for run, meta
+                         in index["runs"].items())
+        self.chunks = {}
+        for chunk in index["chunks"]:
+            self.chunks.setdefault(chunk[0], []).append(chunk[1:])
+        self.infile = open(filename, "rb")
+        self.raw_bytes = 0
+        self.read_time = 0.
+
+    def run_numbers(self):
+        return sorted(self.runs)
+
+    def read(self, run, tick_start = 0, tick_stop = None,
+             agent_start = 0, agent_stop = None):
+        """
+        Overview
+        ---------------
+        Reads the risk perceptions of a range of agents over a range of
+        ticks of one run
+
+        Input
+        ---------------
+        run: number of the run
+        tick_start, tick_stop: range of ticks, tick_stop excluded; all
+                   ticks from tick_start if tick_stop is None
+        agent_start, agent_stop: range of agents, like the ticks
+
+        Output
+        ---------------
+        Array of risk perceptions with one row per tick and one column
+        per agent, accurate to resolution / 2; KeyError if the run was not
+        recorded, ValueError if the ranges exceed the recorded ticks or
+        agents of the run
+        """
+        start = time.time()
+        if run not in self.runs:
+            raise KeyError("run %s not in %s" % (run, self.filename))
+        num_ticks = self.runs[run]["num_ticks"]
+        num_agents = self.runs[run]["num_agents"]
+        if tick_stop is None:
+            tick_stop = num_ticks
+        if agent_stop is None:
+            agent_stop = num_agents
+        if not 0 <= tick_start <= tick_stop <= num_ticks:
+            raise ValueError("ticks %s to %s outside the %s ticks of run %s"
+                             % (tick_start, tick_stop, num_ticks, run))
+        if not 0 <= agent_start <= agent_stop <= num_agents:
+            raise ValueError("agents %s to %s outside the %s agents of run "
+                             "%s" % (agent_start, agent_stop, num_agents,
+                                     run))
+        out = np.empty((tick_stop - tick_start, agent_stop - agent_start))
+
+        for chunk_tick, chunk_agent, num_ticks, num_agents, offset, length \
+            in self.chunks.get(run, []):
+            if chunk_tick >= tick_stop or \
+               chunk_tick + num_ticks <= tick_start or \
+               chunk_agent >= agent_stop or \
+               chunk_agent + num_agents <= agent_start:
+                continue
+            self.infile.seek(offset)
+            deltas = np.frombuffer(_decompress(self.infile.read(length),
+                                               self.codec),
+                                   dtype = self.dtype)
+            levels = np.cumsum(deltas.reshape(num_ticks, num_agents),
+                               axis = 0, dtype = self.dtype)
+
+            t0 = max(tick_start, chunk_tick)
+            t1 = min(tick_stop, chunk_tick + num_ticks)
+            a0 = max(agent_start, chunk_agent)
+            a1 = min(agent_stop, chunk_agent + num_agents)
+            out[t0 - tick_start:t1 - tick_start,
+                a0 - agent_start:a1 - agent_start] = \
+                levels[t0 - chunk_tick:t1 - chunk_tick,
+                       a0 - chunk_agent:a1 - chunk_agent]
+
+        out *= self.resolution
+        out += 1
+        self.raw_bytes += out.nbytes
+        self.read_time += time.time() - start
+        return out
+
+    def close(self):
+        self.infile.close()
+
+    def report(self):
+        """
+        Returns the read throughput in megabytes of float64 risk
+        perceptions per second
+        """
+        return {"raw_bytes": self.raw_bytes,
+                "read_mb_per_s": self.raw_bytes / 1e6 /
+                                 max(self.read_time, 1e-9)}
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def benchmark_trajectories(runs, filename = "benchmark.traj",
+                           resolution = .001, codec = "zlib", level = 6,
+                           ticks_per_chunk = 16, agents_per_chunk = 2**16):
+    """
+    Overview
+    ---------------
+    Writes a list of trajectories (arrays with one row per tick and one
+    column per agent) with TrajectoryWriter, reads them back and reports
+    compression ratio, throughput and the largest quantization error
+
+    Output
+    ---------------
+    Dictionary with the reports of writer and reader and the largest
+    absolute difference between written and read risk perceptions
+    """
+    writer = TrajectoryWriter(filename, resolution, codec, level,
+                              ticks_per_chunk, agents_per_chunk)
+    for run, trajectory in enumerate(runs):
+        writer.start_run(run, trajectory.shape[1])
+        for rp_array in trajectory:
+            writer.add(rp_array)
+    writer.close()
+
+    reader = TrajectoryReader(filename)
+    max_error = max(np.max(np.abs(reader.read(run) - trajectory))
+                    for run, trajectory in enumerate(runs))
+    reader.close()
+
+    report = writer.report()
+    report.update(reader.report())
+    report["max_error"] = max_error
+    os.remove(filename)
+    os.remove(filename + ".json")
+    return report